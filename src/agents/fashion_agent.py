@@ -1,59 +1,33 @@
 import autogen
 from autogen_agentchat.agents import AssistantAgent
 from autogen_ext.models.openai import AzureOpenAIChatCompletionClient, OpenAIChatCompletionClient
-from typing import Dict, List, Optional, Tuple, Union
+from typing import AsyncIterator, Dict, List, Optional, Tuple, Union
 import json
+import time
 import os
+import threading
+from collections import defaultdict
+from contextlib import asynccontextmanager
 import pandas as pd
 from dotenv import load_dotenv
 import azure.identity
 import asyncio
-from autogen_agentchat.messages import TextMessage
+from autogen_agentchat.base import Response
+from autogen_agentchat.messages import ModelClientStreamingChunkEvent, TextMessage
 from autogen_core import CancellationToken
 
+try:
+    from .wardrobe_serializer import WardrobeSerializer
+except ImportError:
+    # 作为脚本直接运行时没有上级包
+    from wardrobe_serializer import WardrobeSerializer
+
 load_dotenv(override=True)
 
-class FashionAgent:
-    def __init__(self, input_data: Union[pd.DataFrame, str, List[Dict]]):
-        """初始化FashionAgent
-        
-        参数:
-            input_data: 可以是以下类型之一:
-                - pd.DataFrame: 直接的DataFrame数据
-                - str: CSV文件路径或者衣物文本描述
-                - List[Dict]: 已解析的服装列表
-        """
-        # 配置 LLM
-        API_HOST = os.getenv("API_HOST", "github")
-        print(f"使用API_HOST: {API_HOST}")
-        if API_HOST == "github":
-            self.client = OpenAIChatCompletionClient(
-                model=os.getenv("GITHUB_MODEL", "gpt-4o"), 
-                api_key=os.environ["GITHUB_TOKEN"],
-                base_url="https://models.inference.ai.azure.com"
-            )
-        elif API_HOST == "azure":
-            token_provider = azure.identity.get_bearer_token_provider(
-                azure.identity.DefaultAzureCredential(),
-                "https://cognitiveservices.azure.com/.default"
-            )
-            self.client = AzureOpenAIChatCompletionClient(
-                model=os.environ["AZURE_OPENAI_CHAT_MODEL"],
-                api_version=os.environ["AZURE_OPENAI_VERSION"],
-                azure_deployment=os.environ["AZURE_OPENAI_CHAT_DEPLOYMENT"],
-                azure_endpoint=os.environ["AZURE_OPENAI_ENDPOINT"],
-                azure_ad_token_provider=token_provider
-            )
-        
-        # 处理输入数据
-        self.input_type = self._determine_input_type(input_data)
-        self.clothing_data = self._process_input_data(input_data)
-        
-        # 创建智能体
-        self.fashion_agent = AssistantAgent(
-            "fashion_expert",
-            model_client=self.client,
-            system_message="""You are a professional fashion recommendation system. Your task is to recommend suitable clothing combinations based on user input.
+# data_processor.py 输出的列式衣橱存储，命令行模式的默认输入
+DEFAULT_WARDROBE_PATH = "data/processed_taobao_purchases.parquet"
+
+FASHION_SYSTEM_MESSAGE = """You are a professional fashion recommendation system. Your task is to recommend suitable clothing combinations based on user input.
 
             1. Data Constraints and Categories:
                 - Each item has a 'type' field that indicates its category:
@@ -165,7 +139,119 @@ class FashionAgent:
             4. Reason must explain why the combination suits user's needs
             5. Include color, style, and material details in descriptions
             6. ALWAYS use the 'type' field to determine item category"""
-        )
+
+class AgentPool:
+    def __init__(self):
+        """进程内共享的模型客户端和智能体池
+        
+        客户端按 (API_HOST, 模型) 缓存，HTTP 连接和 Azure 凭据在请求之间复用；
+        智能体用完后清空对话记录放回池中，同一时刻只被一个请求使用
+        """
+        self._lock = threading.Lock()
+        self._clients = {}
+        self._idle_agents = defaultdict(list)
+        self.stats = {'clients_created': 0, 'agents_created': 0, 'agents_reused': 0}
+
+    @staticmethod
+    def default_model(api_host: str) -> str:
+        if api_host == "azure":
+            return os.environ["AZURE_OPENAI_CHAT_MODEL"]
+        return os.getenv("GITHUB_MODEL", "gpt-4o")
+
+    @staticmethod
+    def _create_client(api_host: str, model: str):
+        if api_host == "github":
+            return OpenAIChatCompletionClient(
+                model=model, 
+                api_key=os.environ["GITHUB_TOKEN"],
+                base_url="https://models.inference.ai.azure.com"
+            )
+        elif api_host == "azure":
+            token_provider = azure.identity.get_bearer_token_provider(
+                azure.identity.DefaultAzureCredential(),
+                "https://cognitiveservices.azure.com/.default"
+            )
+            return AzureOpenAIChatCompletionClient(
+                model=model,
+                api_version=os.environ["AZURE_OPENAI_VERSION"],
+                azure_deployment=os.environ["AZURE_OPENAI_CHAT_DEPLOYMENT"],
+                azure_endpoint=os.environ["AZURE_OPENAI_ENDPOINT"],
+                azure_ad_token_provider=token_provider
+            )
+        raise ValueError(f"不支持的 API_HOST: {api_host}")
+
+    def client(self, api_host: str, model: str):
+        """取得 (api_host, model) 对应的模型客户端，第一次使用时创建"""
+        key = (api_host, model)
+        with self._lock:
+            if key not in self._clients:
+                print(f"创建模型客户端: {api_host} / {model}")
+                self._clients[key] = self._create_client(api_host, model)
+                self.stats['clients_created'] += 1
+            return self._clients[key]
+
+    @asynccontextmanager
+    async def agent(self, api_host: str, model: str, stream: bool = False):
+        """借出一个空闲的智能体，没有空闲的就新建一个；stream=True 时模型逐个 token 返回"""
+        key = (api_host, model, stream)
+        with self._lock:
+            agent = self._idle_agents[key].pop() if self._idle_agents[key] else None
+            self.stats['agents_reused' if agent else 'agents_created'] += 1
+        if agent is None:
+            agent = AssistantAgent(
+                "fashion_expert",
+                model_client=self.client(api_host, model),
+                system_message=FASHION_SYSTEM_MESSAGE,
+                model_client_stream=stream
+            )
+        try:
+            yield agent
+        finally:
+            # 清空本次请求的对话记录，避免影响下一个请求
+            await agent.on_reset(CancellationToken())
+            with self._lock:
+                self._idle_agents[key].append(agent)
+
+
+# 进程内唯一的池
+AGENT_POOL = AgentPool()
+
+
+class FashionAgent:
+    def __init__(self, input_data: Union[pd.DataFrame, str, List[Dict], None] = None,
+                 api_host: Optional[str] = None, model: Optional[str] = None,
+                 pool: Optional[AgentPool] = None):
+        """初始化FashionAgent
+        
+        参数:
+            input_data: 可以是以下类型之一，也可以之后用 attach_wardrobe 或 process_request 传入:
+                - pd.DataFrame: 直接的DataFrame数据
+                - str: CSV文件路径、Parquet衣橱存储路径或者衣物文本描述
+                - List[Dict]: 已解析的服装列表
+            api_host: github 或 azure，默认读取 API_HOST 环境变量
+            model: 模型名，默认读取 GITHUB_MODEL / AZURE_OPENAI_CHAT_MODEL 环境变量
+            pool: 模型客户端和智能体池，默认使用进程内共享的 AGENT_POOL
+        """
+        # 配置 LLM（客户端从池中取得，不会每次请求都重新建立连接）
+        self.api_host = api_host or os.getenv("API_HOST", "github")
+        self.pool = pool or AGENT_POOL
+        self.model = model or self.pool.default_model(self.api_host)
+        print(f"使用API_HOST: {self.api_host}")
+        self.client = self.pool.client(self.api_host, self.model)
+        
+        # 处理输入数据
+        self.serializer = WardrobeSerializer()
+        self.image_ids = {}
+        self.input_type = None
+        self.clothing_data = None
+        if input_data is not None:
+            self.attach_wardrobe(input_data)
+    
+    def attach_wardrobe(self, input_data: Union[pd.DataFrame, str, List[Dict]]):
+        """设置本次请求使用的衣物数据"""
+        self.input_type = self._determine_input_type(input_data)
+        self.clothing_data = self._process_input_data(input_data)
+        self.image_ids = {}
     
     def _determine_input_type(self, input_data):
         """确定输入数据类型"""
@@ -177,6 +263,8 @@ class FashionAgent:
             # 检查是否是文件路径
             if os.path.exists(input_data) and input_data.lower().endswith('.csv'):
                 return "csv_path"
+            elif os.path.exists(input_data) and input_data.lower().endswith('.parquet'):
+                return "parquet_path"
             else:
                 return "text_description"
         else:
@@ -200,6 +288,12 @@ class FashionAgent:
             print(data.head())
             return data
         
+        elif self.input_type == "parquet_path":
+            # 列式衣橱存储（目录或单个文件），按列读取，无需重新解析文本
+            data = pd.read_parquet(input_data)
+            print(f"成功加载衣橱数据，共 {len(data)} 条记录")
+            return data
+        
         elif self.input_type == "clothing_list":
             # 已经是格式化好的服装列表
             print(f"使用提供的服装列表，包含{len(input_data)}件服装")
@@ -217,8 +311,60 @@ class FashionAgent:
     
     async def process_request(self, style_preference: str, 
                              temperature: Optional[float] = None, 
-                             mood: Optional[str] = None) -> Dict:
-        """处理服装推荐请求"""
+                             mood: Optional[str] = None,
+                             wardrobe: Union[pd.DataFrame, str, List[Dict], None] = None) -> Dict:
+        """处理服装推荐请求，wardrobe 不为空时替换当前的衣物数据"""
+        initial_prompt = self._build_prompt(style_preference, temperature, mood, wardrobe)
+        
+        # 发送消息并获取响应
+        async with self.pool.agent(self.api_host, self.model) as agent:
+            response = await agent.on_messages(
+                [TextMessage(content=initial_prompt, source="user")],
+                cancellation_token=CancellationToken(),
+            )
+        
+        # 把回复中的编号换回图片链接
+        return self.serializer.restore_urls(response.chat_message.content, self.image_ids)
+
+    async def stream_request(self, style_preference: str, 
+                             temperature: Optional[float] = None, 
+                             mood: Optional[str] = None,
+                             wardrobe: Union[pd.DataFrame, str, List[Dict], None] = None) -> AsyncIterator[str]:
+        """流式处理服装推荐请求，参数同 process_request
+        
+        返回:
+            每收到一段 token 产出一次到目前为止的回复（已完整的编号换回图片链接），最后一次为完整回复
+        """
+        initial_prompt = self._build_prompt(style_preference, temperature, mood, wardrobe)
+        start = time.perf_counter()
+        first_token = None
+        reply = ""
+        
+        async with self.pool.agent(self.api_host, self.model, stream=True) as agent:
+            async for event in agent.on_messages_stream(
+                [TextMessage(content=initial_prompt, source="user")],
+                cancellation_token=CancellationToken(),
+            ):
+                if isinstance(event, ModelClientStreamingChunkEvent):
+                    if first_token is None:
+                        first_token = time.perf_counter() - start
+                        print(f"首个 token 用时 {first_token:.2f} 秒")
+                    reply += event.content
+                    yield self.serializer.restore_urls(reply, self.image_ids)
+                elif isinstance(event, Response):
+                    reply = event.chat_message.content
+        
+        print(f"流式回复完成：首个 token {first_token if first_token is not None else float('nan'):.2f} 秒，"
+              f"共 {time.perf_counter() - start:.2f} 秒")
+        yield self.serializer.restore_urls(reply, self.image_ids)
+
+    def _build_prompt(self, style_preference: str, temperature: Optional[float], mood: Optional[str],
+                      wardrobe: Union[pd.DataFrame, str, List[Dict], None]) -> str:
+        """生成推荐请求的提示词"""
+        if wardrobe is not None:
+            self.attach_wardrobe(wardrobe)
+        if self.clothing_data is None:
+            raise ValueError("没有衣物数据，请先调用 attach_wardrobe")
         
         # 检查是否是文本描述
         if self.input_type == "text_description":
@@ -256,22 +402,27 @@ class FashionAgent:
             - Temperature 15-25°C: Recommend materials of medium thickness
             """
         else:
-            # 获取服装数据 (CSV或DataFrame方式)
-            clothing_data = self.clothing_data.to_dict('records')
+            # 获取服装数据 (CSV或DataFrame方式)，压缩为衣物表，图片链接用编号代替
+            wardrobe_table, self.image_ids = self.serializer.serialize(self.clothing_data)
+            print(f"衣物表：原始 JSON 约 {self.serializer.estimate_json_tokens(self.clothing_data)} tokens -> "
+                  f"约 {self.serializer.estimate_tokens(wardrobe_table)} tokens，"
+                  f"{len(wardrobe_table)} 个字符（{len(self.image_ids)}/{len(self.clothing_data)} 件）")
             
             # 构建标准提示
             initial_prompt = f"""
             Please help me recommend clothing combinations:
             
-            1. Available clothing data:
-            {json.dumps(clothing_data, ensure_ascii=False, indent=2)}
+            1. Available clothing data (first line is the header, one item per line, fields separated by '|'):
+            {wardrobe_table}
+            
+            In your JSON output, put the item's id (e.g. c3) in the "image_url" field.
             
             2. User preferences:
             - Target style: {style_preference}
             - Current temperature: {temperature if temperature else 'Not specified'}
             - Current mood: {mood if mood else 'Not specified'}
             
-            3. Data source: {'Imported from Taobao purchase history CSV' if self.input_type in ['csv_path', 'dataframe'] else 'Imported from list'}
+            3. Data source: {'Imported from Taobao purchase history CSV' if self.input_type in ['csv_path', 'parquet_path', 'dataframe'] else 'Imported from list'}
             
             4. Recommendation rules:
             - Must select one top and one bottom combination, or one dress
@@ -287,14 +438,7 @@ class FashionAgent:
             - Ensure the recommended items truly match the requested style in function and appearance
             - Do NOT rely solely on the 'style' field in the data
             """
-        
-        # 发送消息并获取响应
-        response = await self.fashion_agent.on_messages(
-            [TextMessage(content=initial_prompt, source="user")],
-            cancellation_token=CancellationToken(),
-        )
-        
-        return response.chat_message.content
+        return initial_prompt
 
 async def main():
     try:
@@ -303,9 +447,13 @@ async def main():
         
         if input_mode == "1":
             # CSV模式
-            csv_path = input("请输入CSV文件路径 (默认: data/new_processed_taobao_purchases.csv): ")
+            csv_path = input(f"请输入CSV文件或Parquet衣橱路径 (默认: {DEFAULT_WARDROBE_PATH}): ")
             if not csv_path:
-                csv_path = "data/new_processed_taobao_purchases.csv"
+                csv_path = DEFAULT_WARDROBE_PATH
+            if not os.path.exists(csv_path):
+                # 不存在的路径会被当作衣物文本描述，这里直接提示
+                print(f"找不到衣橱数据: {csv_path}，请先运行 data_processor.py 生成")
+                return
             
             # 创建FashionAgent实例，传入CSV文件路径
             agent = FashionAgent(csv_path)
@@ -0,0 +1,114 @@
+import math
+import os
+import re
+from typing import Dict, List, Tuple
+
+import pandas as pd
+
+# 提示词衣物表的字段，超出预算时按 PROMPT_DROP_ORDER 依次删除
+PROMPT_COLUMNS = ['id', 'type', 'title', 'color', 'style', 'warmth', 'material', 'thickness',
+                  'season', 'size', 'exposure_level']
+PROMPT_DROP_ORDER = ['exposure_level', 'size', 'season', 'thickness', 'material', 'style', 'warmth', 'color']
+PROMPT_TOKEN_BUDGET = int(os.getenv("PROMPT_TOKEN_BUDGET", "3000"))
+CJK_PATTERN = re.compile(r'[\u3000-\u303f\u4e00-\u9fff\uff00-\uffef]')
+IMAGE_ID_PATTERN = re.compile(r'("image_url"\s*:\s*")(c\d+)(?=")')
+
+
+class WardrobeSerializer:
+    def __init__(self, token_budget: int = PROMPT_TOKEN_BUDGET, delimiter: str = "|",
+                 short_title: int = 24):
+        """把衣物表压缩为一行表头加每件一行，图片链接用短编号代替
+        
+        参数:
+            token_budget: 衣物表的 token 上限，超出时先删列，再截短标题，最后删行
+            delimiter: 字段分隔符
+            short_title: 截短标题时保留的字数
+        """
+        self.token_budget = token_budget
+        self.delimiter = delimiter
+        self.short_title = short_title
+
+    @staticmethod
+    def estimate_tokens(text: str) -> int:
+        """粗略估计 token 数：中文字符约一个 token，其它字符约四个一个 token"""
+        cjk = len(CJK_PATTERN.findall(text))
+        return cjk + math.ceil((len(text) - cjk) / 4)
+
+    @staticmethod
+    def estimate_json_tokens(df: pd.DataFrame) -> int:
+        """估计未压缩时（to_dict('records') 后 json.dumps(indent=2)）的 token 数，用于对比压缩效果
+        
+        按列统计字符数，不实际生成 JSON
+        """
+        total = 0
+        for column in df.columns:
+            text = ''.join(map(str, df[column].tolist()))
+            cjk = len(CJK_PATTERN.findall(text))
+            chars = len(text)
+            # 每个字段一行：缩进、带引号的键、冒号、值的引号、逗号和换行
+            overhead = (len(str(column)) + 12) * len(df)
+            total += cjk + math.ceil((chars - cjk + overhead) / 4)
+        # 每条记录的花括号和缩进
+        return total + math.ceil(8 * len(df) / 4)
+
+    def _format(self, value) -> str:
+        if value is None or (isinstance(value, float) and math.isnan(value)):
+            return ""
+        if isinstance(value, float):
+            return f"{value:g}"
+        return re.sub(r'\s+', ' ', str(value)).replace(self.delimiter, "/").strip()
+
+    def serialize(self, df: pd.DataFrame) -> Tuple[str, Dict[str, str]]:
+        """生成衣物表
+        
+        返回:
+            (衣物表文本, 编号 -> 图片链接)
+        """
+        df = df.reset_index(drop=True)
+        ids = [f"c{i + 1}" for i in range(len(df))]
+        id_map = dict(zip(ids, df['image_url'].fillna('').astype(str))) if 'image_url' in df.columns else {}
+        table = df.assign(id=ids)
+        columns = [column for column in PROMPT_COLUMNS if column in table.columns]
+        cells = {column: [self._format(value) for value in table[column]] for column in columns}
+
+        def line(i):
+            return self.delimiter.join(cells[column][i] for column in columns)
+
+        def render(rows):
+            return "\n".join([self.delimiter.join(columns)] + [line(i) for i in rows])
+
+        rows = list(range(len(df)))
+        text = render(rows)
+        for column in PROMPT_DROP_ORDER:
+            if self.estimate_tokens(text) <= self.token_budget:
+                break
+            if column in columns:
+                columns.remove(column)
+                text = render(rows)
+        if self.estimate_tokens(text) > self.token_budget and 'title' in cells:
+            cells['title'] = [title[:self.short_title] for title in cells['title']]
+            text = render(rows)
+
+        # 仍然超出时，从件数最多的类型里删掉排在最后的一件（候选已按相关度排序）
+        if self.estimate_tokens(text) > self.token_budget:
+            types = cells.get('type', [''] * len(df))
+            by_type: Dict[str, List[int]] = {}
+            for i in rows:
+                by_type.setdefault(types[i], []).append(i)
+            dropped = set()
+            total = self.estimate_tokens(render([])) + sum(self.estimate_tokens(line(i)) + 1 for i in rows)
+            while len(dropped) < len(rows) and total > self.token_budget:
+                largest = max(by_type, key=lambda t: len(by_type[t]))
+                drop = by_type[largest].pop()
+                dropped.add(drop)
+                total -= self.estimate_tokens(line(drop)) + 1
+            rows = [i for i in rows if i not in dropped]
+            text = render(rows)
+        return text, {ids[i]: id_map.get(ids[i], '') for i in rows}
+
+    @staticmethod
+    def restore_urls(text: str, id_map: Dict[str, str]) -> str:
+        """把模型回复里 image_url 字段中的编号换回图片链接"""
+        if not id_map:
+            return text
+        return IMAGE_ID_PATTERN.sub(lambda m: m.group(1) + (id_map.get(m.group(2)) or m.group(2)), text)
@@ -12,6 +12,11 @@ import gradio as gr
 import asyncio
 from utils.taobao_crawler import TaobaoCrawler
 from utils.data_processor import DataProcessor
+from utils.image_cache import ImageCache
+from utils.recommendation_cache import RecommendationCache
+from utils.request_limiter import QueueFullError, RequestLimiter
+from utils.streaming_reply import streamed_images, streamed_reason
+from utils.user_sessions import UserSession, UserSessionStore
 from agents.fashion_agent import FashionAgent
 import pandas as pd
 import json
@@ -32,12 +37,25 @@ from autogen_core import CancellationToken
 # Load environment variables
 load_dotenv(find_dotenv(), override=True)
 
-# Global variables
-crawler = None
-data_processor = None
-fashion_agent = None
-clothing_data = None
-current_mode = "taobao"  # Default recommendation mode
+# Shared, stateless resources; everything that belongs to one user lives in their session
+CANDIDATES_PER_TYPE = int(os.getenv("CANDIDATES_PER_TYPE", "10"))  # Items per category sent to the model
+image_cache = ImageCache(cache_dir="data/image_cache")  # Local thumbnails and full-size images
+recommendation_cache = RecommendationCache(
+    max_entries=int(os.getenv("RECOMMENDATION_CACHE_SIZE", "256")),
+    ttl=float(os.getenv("RECOMMENDATION_CACHE_TTL", "3600")),
+    path=os.getenv("RECOMMENDATION_CACHE_PATH") or None
+)  # Previous answers keyed by wardrobe hash, style, temperature bucket and mood
+RECOMMEND_CONCURRENCY = int(os.getenv("RECOMMEND_CONCURRENCY", "8"))  # Recommendations generated at once
+RECOMMEND_QUEUE_DEPTH = int(os.getenv("RECOMMEND_QUEUE_DEPTH", "32"))  # Waiting recommendations before rejecting
+CRAWLER_CONCURRENCY = int(os.getenv("CRAWLER_CONCURRENCY", "4"))  # Logins/crawls (Chrome instances) at once
+QUEUE_MAX_SIZE = int(os.getenv("QUEUE_MAX_SIZE", "128"))  # Gradio queue size across all events
+recommend_limiter = RequestLimiter(concurrency=RECOMMEND_CONCURRENCY, queue_depth=RECOMMEND_QUEUE_DEPTH)
+sessions = UserSessionStore(
+    max_sessions=int(os.getenv("SESSION_MAX_COUNT", "100")),
+    ttl=float(os.getenv("SESSION_TTL", "1800")),
+    max_bytes=int(os.getenv("SESSION_MAX_MB", "512")) * 2**20,
+    data_dir="data/sessions"
+)  # Crawler, wardrobe, mode and model per browser session
 
 MODEL_OPTIONS = [
     "gpt-4o",
@@ -53,9 +71,8 @@ MODEL_OPTIONS = [
     "Mistral-small"
 ]
 
-# Initialize OpenAI client
+# Initialize OpenAI client (shared by all sessions, each session picks its own model)
 openai_client = None
-openai_model = "gpt-4.1-mini"  # Default model
 
 def initialize_openai_client():
     """Initialize OpenAI client"""
@@ -68,70 +85,107 @@ def initialize_openai_client():
     openai_client = OpenAI(api_key=api_key)
     return True
 
-def set_openai_model(model_name):
+def session_id(request: gr.Request) -> str:
+    """Gradio's per-tab session hash ("default" when called outside a request)"""
+    return request.session_hash if request else "default"
+
+def get_session(request: gr.Request) -> UserSession:
+    """Get the state of the browser session that sent the request"""
+    return sessions.get(session_id(request))
+
+def set_openai_model(session: UserSession, model_name):
     """Set OpenAI model"""
-    global openai_model
-    openai_model = model_name
-    print(f"OpenAI model set to: {openai_model}")
+    session.openai_model = model_name
+    print(f"OpenAI model set to: {session.openai_model}")
 
-async def start_crawler():
+async def start_crawler(request: gr.Request):
     """Start crawler and return login page URL"""
-    global crawler
+    session = get_session(request)
     try:
-        crawler = TaobaoCrawler()
-        # Direct login
-        if crawler.login():
+        session.close_crawler()
+        # Own Chrome profile, cookie file and order index per session; TAOBAO_COOKIE is not shared with every visitor
+        session.crawler = TaobaoCrawler(cookie="", **session.crawler_paths())
+        # Selenium blocks (the QR code wait can take minutes), so keep it off the event loop;
+        # busy() stops the session store from evicting the session and deleting its profile meanwhile
+        with session.busy():
+            logged_in = await asyncio.to_thread(session.crawler.login)
+        if logged_in:
             return "Login successful!"
         return "Login failed, please try again."
     except Exception as e:
         print(f"Error in start_crawler: {str(e)}")
         return f"Error occurred: {str(e)}"
 
-async def check_login():
+async def check_login(request: gr.Request):
     """Check login status"""
-    if crawler:
+    if get_session(request).crawler:
         return "Logged in"
     return "Not logged in"
 
-async def process_data():
+async def process_data(request: gr.Request):
     """Process crawled data"""
-    global data_processor, clothing_data
-    if not crawler:
+    session = get_session(request)
+    if not session.crawler:
         return []
         
     # Initialize data processor
-    data_processor = DataProcessor(data_dir="data")
+    session.data_processor = DataProcessor(data_dir="data")
+    
+    def crawl():
+        # Process each page as soon as it is crawled
+        pages = []
+        for page_items in session.crawler.iter_purchase_history(days=30, mode="html"):
+            pages.append(session.data_processor.process_data(pd.DataFrame(page_items)))
+        # Close browser
+        session.close_crawler()
+        if not pages:
+            return None
+        # Merge repeat purchases and colour/size variants of the same item
+        return session.data_processor.consolidate(pd.concat(pages, ignore_index=True))
     
-    # Get data
-    items = crawler.get_purchase_history(days=30)
-    if items:
-        try:
-            # Convert items to DataFrame
-            items_df = pd.DataFrame(items)
-            # Process data
-            clothing_data = data_processor.process_data(items_df)
-            # Close browser
-            crawler.close()
-            # Return image URL list
-            return get_image_urls()
-        except Exception as e:
-            print(f"Error processing data: {str(e)}")
+    try:
+        # The Selenium crawl blocks, so run it in a worker thread instead of on the event loop
+        with session.busy():
+            clothing_data = await asyncio.to_thread(crawl)
+        if clothing_data is None:
             return []
-    return []
+        session.clothing_data = clothing_data
+        # The wardrobe counts towards the session memory cap
+        sessions.update(session_id(request))
+        # Return local thumbnails for the gallery
+        return await get_gallery_images(session)
+    except Exception as e:
+        print(f"Error processing data: {str(e)}")
+        return []
 
-def get_image_urls():
+def get_image_urls(session: UserSession):
     """Get all image URLs"""
-    if clothing_data is not None:
-        return list(clothing_data['image_url'].values)
+    if session.clothing_data is not None:
+        return list(session.clothing_data['image_url'].values)
     return []
 
-def update_model(selected_model):
+async def get_gallery_images(session: UserSession):
+    """Get local thumbnail paths, falling back to the remote URL when a thumbnail is unavailable"""
+    urls = get_image_urls(session)
+    thumbnails = await image_cache.thumbnails(urls)
+    return [thumbnail or url for thumbnail, url in zip(thumbnails, urls)]
+
+async def show_full_image(evt: gr.SelectData, request: gr.Request):
+    """Load the full-size image of the selected gallery item on demand"""
+    urls = get_image_urls(get_session(request))
+    if evt.index is None or evt.index >= len(urls):
+        return None
+    url = urls[evt.index]
+    return await image_cache.full_size(url) or url
+
+def update_model(selected_model, request: gr.Request):
+    session = get_session(request)
     # Set OpenAI model (for image analysis)
     if selected_model in ["gpt-4.1-mini", "gpt-4.1-turbo", "gpt-4.0-turbo", "gpt-4o", "gpt-4o-mini"]:
-        set_openai_model(selected_model)
+        set_openai_model(session, selected_model)
     
-    # Also keep the original GitHub model setting (for other functions)
-    os.environ["GITHUB_MODEL"] = selected_model
+    # Also keep the GitHub model setting (for recommendations) for this session only
+    session.github_model = selected_model
     return f"Current selected model: {selected_model}"
 
 def upload_to_imgbb(image_path):
@@ -171,53 +225,87 @@ def upload_to_imgbb(image_path):
         print(f"ImgBB upload error: {str(e)}")
         return f"Error during ImgBB upload process: {str(e)}"
 
-async def get_recommendation(style_preference: str, temperature: float = None, mood: str = None, tab: str = "taobao"):
-    """Get clothing recommendations
+async def get_recommendation(style_preference: str, temperature: float = None, mood: str = None, tab: str = "taobao",
+                             session: UserSession = None):
+    """Get clothing recommendations, yielding (images, text) as the model reply streams in
     
     Args:
         style_preference: Style preference
         temperature: Temperature
         mood: Mood
         tab: Tab type, 'taobao' uses CSV data, 'physical' uses TXT data
+        session: State of the requesting session (wardrobe, image analysis text, model)
     """
-    global clothing_data
+    session = session or UserSession()
+    clothing_data = session.clothing_data
     result_images = []
     
     try:
         # Initialize recommendation agent
         if tab == "taobao":
-            # In taobao mode, use global clothing_data (DataFrame)
+            # In taobao mode, use this session's clothing_data (DataFrame)
             if clothing_data is None:
-                return [], "Please process Taobao data first"
-            fashion_agent = FashionAgent(clothing_data)
-            print(f"Using Taobao CSV data with {len(clothing_data)} records")
+                yield [], "Please process Taobao data first"
+                return
+            # Drop items that break the temperature rule and keep the best style matches per category
+            candidates = (session.data_processor or DataProcessor(data_dir="data")).select_candidates(
+                clothing_data, style_preference, temperature, top_k=CANDIDATES_PER_TYPE
+            )
+            if candidates.empty:
+                yield [], "No tops, bottoms or dresses in your wardrobe suit this temperature"
+                return
+            wardrobe = candidates
+            print(f"Using {len(candidates)} of {len(clothing_data)} Taobao records")
         elif tab == "physical":
-            # In physical mode, read image analysis text result
-            txt_path = "data/upload_process_txt.txt"
-            
-            # Check if file exists
-            if not os.path.exists(txt_path):
-                return [], f"File does not exist: {txt_path}, please upload and analyze an image first"
+            # In physical mode, use this session's image analysis text result
+            text_description = session.text_description
+            if text_description is None:
+                yield [], "No image analysis yet, please upload and analyze an image first"
+                return
+            print(f"Using image analysis text, content length: {len(text_description)} characters")
+            if len(text_description.strip()) == 0:
+                yield [], "Image analysis text is empty, please upload and analyze an image again"
+                return
                 
-            try:
-                with open(txt_path, 'r', encoding='utf-8') as file:
-                    text_description = file.read()
-                print(f"Successfully read image analysis text, content length: {len(text_description)} characters")
-                if len(text_description.strip()) == 0:
-                    return [], "Image analysis text is empty, please upload and analyze an image again"
-                    
-                fashion_agent = FashionAgent(text_description)
-            except Exception as e:
-                return [], f"Failed to read image analysis text: {str(e)}"
+            wardrobe = text_description
         else:
-            return [], f"Invalid tab type: {tab}. Please use 'taobao' or 'physical'."
+            yield [], f"Invalid tab type: {tab}. Please use 'taobao' or 'physical'."
+            return
         
-        # Get recommendation results
-        result = await fashion_agent.process_request(
-            style_preference=style_preference,
-            temperature=temperature,
-            mood=mood
-        )
+        # Model clients and agents come from the process-wide pool; only the wardrobe is per request.
+        # The model picked in the dropdown only applies to GitHub Models
+        model = session.github_model if os.getenv("API_HOST", "github") == "github" else None
+        fashion_agent = FashionAgent(model=model)
+        
+        # Identical wardrobe, style, temperature bucket, mood and model reuse the previous answer
+        # and concurrent identical requests wait on a single model call
+        cache_key = recommendation_cache.make_key(wardrobe, style_preference, temperature, mood,
+                                                  api_host=fashion_agent.api_host, model=fashion_agent.model)
+        partials = asyncio.Queue()
+        
+        async def stream_from_model():
+            reply = ""
+            async for reply in fashion_agent.stream_request(
+                style_preference=style_preference,
+                temperature=temperature,
+                mood=mood,
+                wardrobe=wardrobe
+            ):
+                partials.put_nowait(reply)
+            return reply
+        
+        # Only the caller that starts the model call sees partial replies; the rest get the final one
+        call = asyncio.ensure_future(recommendation_cache.get_or_compute(cache_key, stream_from_model))
+        while not call.done():
+            next_partial = asyncio.ensure_future(partials.get())
+            await asyncio.wait({next_partial, call}, return_when=asyncio.FIRST_COMPLETED)
+            if next_partial.done():
+                reply = next_partial.result()
+                yield streamed_images(reply), streamed_reason(reply)
+            else:
+                next_partial.cancel()
+        result = call.result()
+        print(f"Recommendation cache: {recommendation_cache.stats['hits']} hits, {recommendation_cache.stats['misses']} misses")
         
         # Parse image URLs from the recommendation result
         recommended_images = re.findall(r'https?://[^\s]+\.jpg', result)
@@ -226,17 +314,17 @@ async def get_recommendation(style_preference: str, temperature: float = None, m
         print_result = re.sub(r'https?://[^\s]+\.jpg', '[IMAGE_URL]', result)
         print("LLM result:", print_result[:100] + "..." if len(print_result) > 100 else print_result)
         
-        return recommended_images, result
+        yield recommended_images, result
         
     except Exception as e:
         print(f"Error during recommendation process: {str(e)}")
         import traceback
         traceback.print_exc()
-        return [], f"Error getting recommendation: {str(e)}"
+        yield [], f"Error getting recommendation: {str(e)}"
+        return
 
-async def analyze_image_with_openai(image_url):
+async def analyze_image_with_openai(image_url, openai_model: str = "gpt-4.1-mini"):
     """Use OpenAI API to analyze image and generate detailed description"""
-    global openai_client, openai_model
     
     try:
         # Ensure OpenAI client is initialized
@@ -246,8 +334,9 @@ async def analyze_image_with_openai(image_url):
         
         print(f"Using OpenAI API ({openai_model}) to analyze image: {image_url}")
         
-        # Create API request
-        response = openai_client.responses.create(
+        # Create API request (the client is synchronous, so keep it off the server's event loop)
+        response = await asyncio.to_thread(
+            openai_client.responses.create,
             model=openai_model,
             input=[{
                 "role": "user",
@@ -271,33 +360,28 @@ async def analyze_image_with_openai(image_url):
         print(f"OpenAI image analysis error: {str(e)}")
         return f"Error during image analysis process: {str(e)}"
 
-async def process_uploaded_images(image_path):
+async def process_uploaded_images(image_path, request: gr.Request):
     """Process uploaded images and analyze clothing features"""
+    session = get_session(request)
     try:
         if not image_path:
             return "Please upload an image"
             
         print(f"Received image path: {image_path}")
         
-        # Use ImgBB to upload image
-        imgbb_url = upload_to_imgbb(image_path)
+        # Use ImgBB to upload image (blocking HTTP call, run in a worker thread)
+        imgbb_url = await asyncio.to_thread(upload_to_imgbb, image_path)
         
         # Check if ImgBB upload was successful - if the returned URL is a string and doesn't start with error message
         if isinstance(imgbb_url, str) and not imgbb_url.startswith("ImgBB upload failed") and not imgbb_url.startswith("Error during ImgBB upload process"):
             # Upload successful, use OpenAI API for image analysis
             print("Image upload successful, starting OpenAI analysis...")
-            result_message = await analyze_image_with_openai(imgbb_url)
-            
-            # Ensure data directory exists
-            os.makedirs("data", exist_ok=True)
+            result_message = await analyze_image_with_openai(imgbb_url, session.openai_model)
             
-            # Save analysis result to file for get_recommendation function to use
-            try:
-                with open("data/upload_process_txt.txt", "w", encoding="utf-8") as f:
-                    f.write(result_message)
-                print(f"Analysis result saved to file, length: {len(result_message)} characters")
-            except Exception as e:
-                print(f"Failed to save analysis result to file: {str(e)}")
+            # Keep the analysis result in the session for get_recommendation to use
+            session.text_description = result_message
+            sessions.update(session_id(request))
+            print(f"Analysis result saved to session, length: {len(result_message)} characters")
         else:
             result_message = f"ImgBB upload failed: {imgbb_url}"
         
@@ -307,23 +391,20 @@ async def process_uploaded_images(image_path):
         print(f"Error processing image: {str(e)}")
         return f"Error processing image: {str(e)}"
 
-# Non-async wrapper function for direct calling of async functions
-def sync_get_recommendation(style, temp, mood):
-    """Synchronous wrapper function for Gradio button click event"""
-    global current_mode
-    print(f"Using {current_mode} mode for clothing recommendation")
+async def recommend(style, temp, mood, request: gr.Request):
+    """Gradio handler for the recommend button, runs as a coroutine on the server's event loop"""
+    session = get_session(request)
+    print(f"Using {session.mode} mode for clothing recommendation")
     
     try:
-        # Use asyncio.new_event_loop().run_until_complete to run async function
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        images, text = loop.run_until_complete(get_recommendation(style, temp, mood, tab=current_mode))
-        loop.close()
-        
-        return images, text
+        async with recommend_limiter.slot():
+            async for images, text in get_recommendation(style, temp, mood, tab=session.mode, session=session):
+                yield images, text
+    except QueueFullError:
+        raise gr.Error("Too many recommendation requests right now, please try again shortly")
     except Exception as e:
         print(f"Recommendation process error: {str(e)}")
-        return [], f"Error during recommendation process: {str(e)}"
+        yield [], f"Error during recommendation process: {str(e)}"
 
 # Create Gradio interface
 with gr.Blocks() as demo:
@@ -344,6 +425,7 @@ with gr.Blocks() as demo:
                     # Display Taobao clothing images
                     gr.Markdown("## My Taobao Clothing")
                     taobao_gallery = gr.Gallery(label="Taobao Clothing", show_label=False)
+                    full_image = gr.Image(label="Full Size", interactive=False)
                 
                 # Tab 2: Offline Wardrobe (Image Upload)
                 with gr.Tab("Offline Wardrobe (Physical Clothes)") as physical_tab:
@@ -387,14 +469,24 @@ with gr.Blocks() as demo:
             recommendation_text = gr.Textbox(label="Recommendation Explanation", interactive=False, lines=10)
     
     # Bind events
+    # Each login/crawl holds a Chrome instance, so cap how many run at once
     start_button.click(
         fn=start_crawler,
-        outputs=login_status
+        outputs=login_status,
+        concurrency_limit=CRAWLER_CONCURRENCY,
+        concurrency_id="crawler"
     )
     
     process_button.click(
         fn=process_data,
-        outputs=taobao_gallery
+        outputs=taobao_gallery,
+        concurrency_limit=CRAWLER_CONCURRENCY,
+        concurrency_id="crawler"
+    )
+    
+    taobao_gallery.select(
+        fn=show_full_image,
+        outputs=full_image
     )
     
     upload_button.click(
@@ -404,10 +496,12 @@ with gr.Blocks() as demo:
     )
     
     # Use the selected mode for recommendations
+    # The handler is a coroutine, so requests only wait on model I/O; recommend_limiter bounds them
     recommend_button.click(
-        fn=sync_get_recommendation,
+        fn=recommend,
         inputs=[style_input, temperature_input, mood_input],
-        outputs=[recommendation_gallery, recommendation_text]
+        outputs=[recommendation_gallery, recommendation_text],
+        concurrency_limit=None
     )
     
     model_dropdown.change(
@@ -417,20 +511,25 @@ with gr.Blocks() as demo:
     )
     
     # Define function to update mode
-    def update_mode(mode):
-        global current_mode
-        current_mode = mode
+    def update_mode(mode, request: gr.Request):
+        get_session(request).mode = mode
         return f"**Current Mode: {mode.capitalize()}**"
     
     # Automatically update recommendation mode when tabs are switched
+    def select_taobao(request: gr.Request):
+        return update_mode("taobao", request)
+    
+    def select_physical(request: gr.Request):
+        return update_mode("physical", request)
+    
     taobao_tab.select(
-        fn=lambda: update_mode("taobao"),
+        fn=select_taobao,
         inputs=None,
         outputs=current_mode_text
     )
     
     physical_tab.select(
-        fn=lambda: update_mode("physical"),
+        fn=select_physical,
         inputs=None,
         outputs=current_mode_text
     )
@@ -443,7 +542,7 @@ if __name__ == "__main__":
     # Detect running environment
     if os.getenv('SPACE_ID'):
         # Hugging Face Spaces environment
-        demo.launch()
+        demo.queue(max_size=QUEUE_MAX_SIZE).launch(allowed_paths=[image_cache.cache_dir])
     else:
         # Local environment
         os.environ["HTTP_PROXY"] = "http://127.0.0.1:2802"
@@ -455,11 +554,13 @@ if __name__ == "__main__":
         server_name = "0.0.0.0" if is_share else "127.0.0.1"
         
         # Add a static file service to make uploads directory accessible via web
-        demo.queue().launch(
+        demo.queue(max_size=QUEUE_MAX_SIZE).launch(
             server_name=server_name,
             share=is_share,
             show_error=True,
             favicon_path=None,
             # Set static file directory
-            root_path="/"
+            root_path="/",
+            # Serve cached thumbnails and full-size images
+            allowed_paths=[image_cache.cache_dir]
         )
\ No newline at end of file
@@ -0,0 +1,147 @@
+import os
+import queue
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional
+
+from .taobao_crawler import OrderIndex, TaobaoCrawler
+
+
+class CrawlerPool:
+    def __init__(self, size: Optional[int] = None, recycle_after_pages: int = 50,
+                 data_dir: str = "data/accounts",
+                 crawler_factory: Optional[Callable[[int], TaobaoCrawler]] = None):
+        """
+        无头浏览器池，多个账号的抓取任务并行执行
+        :param size: 浏览器数量上限，默认等于 CPU 核数
+        :param recycle_after_pages: 每个浏览器抓取多少页后关闭重建
+        :param data_dir: 每个账号的会话文件和订单号索引存放目录
+        :param crawler_factory: 创建爬虫的函数，参数为浏览器编号
+        """
+        self.size = size or os.cpu_count() or 1
+        self.recycle_after_pages = recycle_after_pages
+        self.data_dir = data_dir
+        self.crawler_factory = crawler_factory or self._default_factory
+
+        # 空闲浏览器队列，None 表示该位置的浏览器尚未创建或已被回收
+        self._idle = queue.Queue()
+        for slot in range(self.size):
+            self._idle.put((slot, None))
+        self._executor = ThreadPoolExecutor(max_workers=self.size, thread_name_prefix="crawler")
+        self._lock = threading.Lock()
+        self.stats = {'jobs': 0, 'failed': 0, 'recycled': 0, 'restarted': 0}
+
+    def _default_factory(self, slot: int) -> TaobaoCrawler:
+        return TaobaoCrawler(
+            user_data_dir=os.path.join(self.data_dir, "_profiles", f"slot-{slot}"),
+            headless=True
+        )
+
+    def _account_path(self, account: str, filename: str) -> str:
+        return os.path.join(self.data_dir, account, filename)
+
+    def _acquire(self):
+        """
+        取出一个空闲浏览器，不健康的浏览器会被重建
+        """
+        slot, crawler = self._idle.get()
+        try:
+            if crawler is not None and not crawler.is_healthy():
+                print(f"浏览器 {slot} 无响应，重新创建")
+                crawler.close()
+                crawler = None
+                self._count('restarted')
+            if crawler is None:
+                crawler = self.crawler_factory(slot)
+        except Exception:
+            # 创建失败时归还空位，否则之后的任务会一直等待
+            self._idle.put((slot, None))
+            raise
+        return slot, crawler
+
+    def _release(self, slot: int, crawler: TaobaoCrawler):
+        """
+        归还浏览器，达到页数上限时关闭
+        """
+        if crawler.pages_crawled >= self.recycle_after_pages:
+            crawler.close()
+            crawler = None
+            self._count('recycled')
+        self._idle.put((slot, crawler))
+
+    def _count(self, key: str):
+        with self._lock:
+            self.stats[key] += 1
+
+    def _run(self, account: str, cookie: Optional[str], days: int, mode: str,
+             incremental: bool) -> List[Dict]:
+        slot, crawler = None, None
+        try:
+            slot, crawler = self._acquire()
+            crawler.start()
+            crawler.switch_account(
+                cookie=cookie,
+                session_path=self._account_path(account, "taobao_session.json"),
+                order_index_path=self._account_path(account, "seen_orders.json")
+            )
+            # 无头浏览器无法扫码，登录态失效时直接报错
+            if not crawler.restore_session():
+                raise RuntimeError(f"账号 {account} 的登录态已失效，请先扫码登录")
+            return crawler.get_purchase_history(days=days, mode=mode, incremental=incremental)
+        except Exception:
+            self._count('failed')
+            raise
+        finally:
+            self._count('jobs')
+            if crawler is not None:
+                self._release(slot, crawler)
+
+    def submit(self, account: str, cookie: Optional[str] = None, days: int = 30,
+               mode: str = "html", incremental: bool = False) -> Future:
+        """
+        提交一个账号的抓取任务
+        :param account: 账号标识，用于区分会话文件和订单号索引
+        :param cookie: 该账号的 Cookie 字符串，没有时使用保存的会话
+        :return: Future，结果为购买记录列表
+        """
+        return self._executor.submit(self._run, account, cookie, days, mode, incremental)
+
+    def mark_seen(self, account: str, items: List[Dict]):
+        """
+        增量抓取的结果保存好之后调用，把订单号写入该账号的索引
+        """
+        index = OrderIndex(self._account_path(account, "seen_orders.json"))
+        index.add(items)
+        index.save()
+
+    def crawl_accounts(self, accounts: Dict[str, Optional[str]], **kwargs) -> Dict[str, List[Dict]]:
+        """
+        并行抓取多个账号
+        :param accounts: {账号标识: Cookie 字符串}
+        :return: {账号标识: 购买记录列表}，失败的账号返回空列表
+        """
+        futures = {account: self.submit(account, cookie, **kwargs) for account, cookie in accounts.items()}
+        results = {}
+        for account, future in futures.items():
+            try:
+                results[account] = future.result()
+            except Exception as e:
+                print(f"抓取账号 {account} 时出错: {str(e)}")
+                results[account] = []
+        return results
+
+    def close(self):
+        """
+        等待任务结束并关闭所有浏览器
+        """
+        self._executor.shutdown(wait=True)
+        while not self._idle.empty():
+            _, crawler = self._idle.get_nowait()
+            if crawler is not None:
+                crawler.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
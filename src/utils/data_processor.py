@@ -3,67 +3,587 @@
 
 
 import pandas as pd
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
 import requests
 from PIL import Image
+import glob
 import os
-from typing import List, Dict
+import shutil
+import time
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from typing import List, Dict, Optional, Tuple
+import hashlib
 import json
 import re
+import sqlite3
+import threading
+import zlib
+from collections import defaultdict
+
+# 标题关键词规则表：字段 -> [(取值, 关键词列表)]，同一字段内越靠前优先级越高
+TITLE_RULES = {
+    'type': [
+        ('上衣', ['背心', '上衣', 'T恤', '抹胸', '吊带', '露脐', '短袖', '衬衫', '外套', '夹克', '卫衣']),
+        ('下装', ['短裤', '长裤', '裤子', '半身裙']),
+        ('连衣裙/裤', ['连衣裙', '连体裤', '套装', '长裙', '吊带裙', '背带裤']),
+        ('配饰', ['帽子', '项链', '耳环', '手链', '戒指', '发饰', '围巾', '手套', '袜子', '包', '腰带', '眼镜', '口罩', '鞋']),
+    ],
+    'exposure_level': [
+        ('high', ['抹胸', '露脐', '吊带']),
+        ('medium', ['短袖', '背心', '短裙', '短裤']),
+        ('low', ['长裙', '长裤', '毛呢']),
+    ],
+    'style': [(kw, [kw]) for kw in ['通勤', '辣妹', '运动', '学院', '复古', '法式']],
+    'material': [
+        ('羽绒', ['羽绒']),
+        ('羊毛', ['羊毛', '羊绒', '毛呢', '呢子']),
+        ('绒', ['绒']),
+        ('针织', ['针织', '毛衣', '毛线']),
+        ('皮革', ['皮衣', '皮革']),
+        ('牛仔', ['牛仔']),
+        ('麻', ['亚麻', '棉麻']),
+        ('冰丝', ['冰丝', '雪纺', '真丝', '天丝', '醋酸', '莫代尔']),
+        ('棉', ['棉']),
+        ('化纤', ['涤纶', '聚酯', '锦纶', '氨纶']),
+    ],
+    'thickness': [
+        ('medium', ['中厚']),
+        ('thick', ['加厚', '厚', '加绒', '保暖', '羽绒', '棉服', '棉衣', '大衣']),
+        ('thin', ['薄', '透气', '冰丝', '防晒']),
+    ],
+    'sleeve_length': [
+        ('sleeveless', ['无袖', '背心', '吊带', '抹胸']),
+        ('short', ['短袖', '半袖', '五分袖']),
+        ('long', ['长袖', '七分袖', '九分袖', '卫衣', '毛衣', '外套', '夹克', '大衣']),
+    ],
+    'leg_length': [
+        ('short', ['短裤', '短裙', '热裤']),
+        ('mid', ['五分裤', '七分裤', '中裙', '中长裙', '及膝']),
+        ('long', ['长裤', '长裙', '阔腿裤', '牛仔裤', '直筒裤', '喇叭裤', '休闲裤', '运动裤', '卫裤', '九分裤']),
+    ],
+    'season': [
+        ('winter', ['冬', '加绒', '羽绒']),
+        ('summer', ['夏']),
+        ('spring_autumn', ['春', '秋']),
+        ('all', ['四季']),
+    ],
+}
+
+# 没有命中任何关键词时的取值
+TITLE_DEFAULTS = {'type': '未知', 'exposure_level': 'unknown', 'style': 'unknown', 'material': 'unknown',
+                  'thickness': 'unknown', 'sleeve_length': 'unknown', 'leg_length': 'unknown',
+                  'season': 'unknown'}
+
+# 入库时从标题提取的服装属性
+ATTRIBUTE_COLUMNS = ['material', 'thickness', 'sleeve_length', 'leg_length', 'season']
+
+# 保暖分：各属性取值的分数相加，袖长已知时用袖长，否则用裤/裙长；未知取值按中间值计
+WARMTH_SCORES = {
+    'material': {'羽绒': 4, '羊毛': 3, '绒': 3, '针织': 2, '皮革': 2, '牛仔': 1.5,
+                 '棉': 1, '化纤': 1, '麻': 0, '冰丝': 0, 'unknown': 1},
+    'thickness': {'thick': 3, 'medium': 1.5, 'thin': 0, 'unknown': 1},
+    'sleeve_length': {'sleeveless': 0, 'short': 0.5, 'long': 2},
+    'leg_length': {'short': 0, 'mid': 1, 'long': 2},
+    'season': {'winter': 2, 'spring_autumn': 1, 'all': 1, 'summer': 0, 'unknown': 1},
+}
+
+# 温度规则：(高于该温度, 低于该温度, 禁止的属性取值)，与 FashionAgent 系统提示中的规则一致
+TEMPERATURE_RULES = [
+    (25, None, {'material': ['羽绒', '羊毛', '绒'], 'thickness': ['thick'], 'season': ['winter']}),
+    (None, 15, {'thickness': ['thin'], 'sleeve_length': ['sleeveless', 'short'], 'leg_length': ['short']}),
+]
+
+# 规格解析用的正则
+COLOR_SECTION_PATTERN = re.compile(r'(?:颜色分类|主要颜色)[:：]([^:：]+)')
+COLOR_SUFFIX_PATTERN = re.compile(r'([^\s,，]+色)')
+COLOR_SPLIT_PATTERN = re.compile(r'[,，\s\-]+')
+# 等价于 COLOR_SPLIT_PATTERN.split(text)[0]
+COLOR_FIRST_PATTERN = re.compile(r'^([^,，\s\-]*)')
+SIZE_SECTION_PATTERN = re.compile(r'尺码[:：]([^:：]+)')
+SIZE_CLEAN_PATTERN = re.compile(r'[\[\]【】\(\)]')
+
+# 读取购买记录CSV的参数：所有列按字符串读取，保证分块读取和一次读取的结果一致
+CSV_READ_OPTIONS = {'dtype': str, 'encoding': 'utf-8-sig'}
+
+# 取值较少的列，在衣橱存储中按字典编码
+CATEGORICAL_COLUMNS = ['type', 'style', 'exposure_level', 'color', 'size', 'status'] + ATTRIBUTE_COLUMNS
+
+# 推荐时的候选类型：上衣 + 下装，或者连衣裙/裤
+CANDIDATE_TYPES = ['上衣', '下装', '连衣裙/裤']
+
+# 风格 -> (用户输入中的叫法, 标题中体现该风格的关键词)，与 FashionAgent 系统提示中的风格说明一致
+STYLE_KEYWORDS = {
+    'sporty': (['sport', 'athletic', '运动'], ['运动', 'T恤', '短裤', '卫衣', '卫裤', '速干', '瑜伽', '跑步']),
+    'casual': (['casual', '休闲'], ['休闲', '牛仔', 'T恤', '卫衣', '宽松', '百搭']),
+    'formal': (['formal', '正式', '通勤', 'commut', 'office'], ['西装', '衬衫', '西裤', '正装', '职业', '通勤']),
+    'elegant': (['elegant', '优雅', '气质'], ['优雅', '气质', '法式', '真丝', '缎面', '收腰']),
+    'bohemian': (['bohemian', 'boho', '波西米亚'], ['波西米亚', '民族风', '碎花', '流苏', '长裙']),
+    'vintage': (['vintage', 'retro', '复古'], ['复古', '港风', '格纹', '碎花', '法式']),
+    'minimalist': (['minimal', '极简', '简约'], ['简约', '纯色', '基础款', '极简']),
+    'trendy': (['trendy', 'hot girl', '辣妹'], ['辣妹', '露脐', '吊带', '紧身', '短款']),
+    'academic': (['academic', 'preppy', '学院'], ['学院', '百褶', 'JK', '衬衫', '针织']),
+    'french': (['french', '法式'], ['法式', '碎花', '方领', '泡泡袖']),
+}
+
+# 合并后每个款式保留的规格字段
+VARIANT_COLUMNS = ['specification', 'color', 'size', 'image_url']
+
+# MinHash 取模用的素数（大于 2^32）
+MINHASH_PRIME = 4294967311
+
+class KeywordClassifier:
+    def __init__(self, rules: Dict[str, List[Tuple[str, List[str]]]], defaults: Dict[str, str]):
+        """
+        把规则表编译为一个正则，一次扫描标题即可得到所有字段
+        :param rules: 字段 -> [(取值, 关键词列表)]，越靠前优先级越高
+        :param defaults: 字段 -> 未命中时的取值
+        """
+        self.rules = rules
+        self.defaults = defaults
+
+        keywords = {kw for field_rules in rules.values() for _, kws in field_rules for kw in kws}
+        tokens = self._merge_overlaps(keywords)
+        # 长词优先，包含在长词里的关键词通过下面的命中表补齐（如"吊带裙"同时命中"吊带"）
+        alternation = '|'.join(re.escape(token) for token in sorted(tokens, key=len, reverse=True))
+        self.pattern = re.compile(alternation)
+
+        # 每个字段：匹配到的词 -> 它包含的关键词命中的最高优先级
+        self.token_ranks = {}
+        for field, field_rules in rules.items():
+            ranks = {}
+            for token in tokens:
+                hits = [rank for rank, (_, kws) in enumerate(field_rules)
+                        if any(kw in token for kw in kws)]
+                if hits:
+                    ranks[token] = min(hits)
+            self.token_ranks[field] = ranks
+
+    @staticmethod
+    def _merge_overlaps(keywords) -> set:
+        """
+        正则匹配不会重叠，把首尾相接的关键词合并成一个词（如"手套"+"套装"->"手套装"），
+        保证与逐个关键词 in 判断的结果一致
+        """
+        tokens = set(keywords)
+        pending = set(keywords)
+        while pending:
+            merged = set()
+            for token in pending:
+                for kw in keywords:
+                    for k in range(1, min(len(token), len(kw))):
+                        if token[-k:] == kw[:k]:
+                            merged.add(token + kw[k:])
+            pending = merged - tokens
+            tokens |= pending
+        return tokens
+
+    def classify(self, titles: pd.Series) -> pd.DataFrame:
+        """
+        对整列标题分类，重复的标题只扫描一次
+        :param titles: 标题列
+        :return: 与 titles 同索引、每个字段一列的 DataFrame
+        """
+        codes, uniques = pd.factorize(titles.astype(str))
+        matches = pd.Series(uniques).str.findall(self.pattern).explode().dropna()
+
+        result = {}
+        for field, field_rules in self.rules.items():
+            values = np.array([value for value, _ in field_rules] + [self.defaults[field]], dtype=object)
+            best = matches.map(self.token_ranks[field]).dropna().groupby(level=0).min()
+            ranks = np.full(len(uniques), len(field_rules))
+            ranks[best.index.to_numpy()] = best.to_numpy().astype(int)
+            result[field] = values[ranks][codes]
+        return pd.DataFrame(result, index=titles.index)
+
+    def match(self, field: str, name: str, fallback: str = None) -> str:
+        """
+        对单个标题取某个字段的值
+        """
+        for value, keywords in self.rules[field]:
+            if any(kw in name for kw in keywords):
+                return value
+        return fallback if fallback else self.defaults[field]
+
+
+class TitleDeduplicator:
+    def __init__(self, threshold: float = 0.7, num_perm: int = 64, bands: int = 16,
+                 shingle_size: int = 3, seed: int = 1):
+        """
+        用 MinHash 签名和 LSH 分桶找出相近的标题，只比较落在同一个桶里的标题
+        :param threshold: 标题字符片段的 Jaccard 相似度不低于该值才合并
+        :param num_perm: MinHash 签名长度
+        :param bands: LSH 分段数，每段 num_perm / bands 个值，段完全相同的标题进入同一个桶
+        :param shingle_size: 字符片段长度
+        :param seed: 生成哈希函数的随机种子
+        """
+        if num_perm % bands:
+            raise ValueError("num_perm 必须是 bands 的整数倍")
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.bands = bands
+        self.shingle_size = shingle_size
+        rng = np.random.RandomState(seed)
+        self.a = rng.randint(1, 2**31, size=num_perm).astype(np.uint64)
+        self.b = rng.randint(0, 2**31, size=num_perm).astype(np.uint64)
+
+    def shingles(self, title: str) -> set:
+        text = re.sub(r'\s+', '', title.lower())
+        k = self.shingle_size
+        if len(text) <= k:
+            return {text}
+        return {text[i:i + k] for i in range(len(text) - k + 1)}
+
+    def signatures(self, shingle_sets: List[set], chunk_rows: int = 50_000) -> np.ndarray:
+        """
+        计算 MinHash 签名（crc32 保证跨进程稳定），按块处理控制内存
+        :return: (标题数, num_perm) 的矩阵
+        """
+        hashes = [np.fromiter((zlib.crc32(s.encode('utf-8')) for s in shingles), dtype=np.uint64)
+                  for shingles in shingle_sets]
+        signatures = np.empty((len(hashes), self.num_perm), dtype=np.uint64)
+        start = 0
+        while start < len(hashes):
+            end, rows = start, 0
+            while end < len(hashes) and (rows == 0 or rows + len(hashes[end]) <= chunk_rows):
+                rows += len(hashes[end])
+                end += 1
+            chunk = np.concatenate(hashes[start:end])
+            offsets = np.cumsum([0] + [len(h) for h in hashes[start:end - 1]])
+            values = (chunk[:, None] * self.a + self.b) % MINHASH_PRIME
+            signatures[start:end] = np.minimum.reduceat(values, offsets, axis=0)
+            start = end
+        return signatures
+
+    @staticmethod
+    def jaccard(a: set, b: set) -> float:
+        return len(a & b) / len(a | b)
+
+    def group(self, titles: List[str]) -> np.ndarray:
+        """
+        对标题分组
+        :param titles: 标题列表（应先去重）
+        :return: 每个标题所在组的代表标题下标
+        """
+        shingle_sets = [self.shingles(title) for title in titles]
+        signatures = self.signatures(shingle_sets)
+        parent = list(range(len(titles)))
+
+        def find(i):
+            while parent[i] != i:
+                parent[i] = parent[parent[i]]
+                i = parent[i]
+            return i
+
+        rows = self.num_perm // self.bands
+        mix = np.random.RandomState(0).randint(1, 2**62, size=rows).astype(np.uint64)
+        for band in range(self.bands):
+            keys = (signatures[:, band * rows:(band + 1) * rows] * mix).sum(axis=1)
+            codes, _ = pd.factorize(keys)
+            first = np.unique(codes, return_index=True)[1][codes]
+            # 桶内每个标题只和桶里的第一个标题比较，分属不同桶的相似标题通过并查集传递
+            others = np.flatnonzero(first != np.arange(len(codes)))
+            for i, j in zip(first[others], others):
+                root_i, root_j = find(i), find(j)
+                if root_i != root_j and self.jaccard(shingle_sets[i], shingle_sets[j]) >= self.threshold:
+                    parent[max(root_i, root_j)] = min(root_i, root_j)
+        return np.array([find(i) for i in range(len(titles))], dtype=np.int64)
+
+
+# 子进程中复用的处理器，避免每个分区都重新编译规则
+_worker_processor = None
+
+
+def _process_partition(partition: pd.DataFrame) -> pd.DataFrame:
+    """
+    在子进程中处理一个分区
+    """
+    global _worker_processor
+    if _worker_processor is None:
+        _worker_processor = DataProcessor(data_dir="data")
+    return _worker_processor.process_data(partition)
+
+
+class WardrobeStore:
+    def __init__(self, path: str = "data/wardrobe.parquet"):
+        """
+        列式衣橱存储：一个目录下的若干 Parquet 文件，低基数列字典编码
+        :param path: 存储目录
+        """
+        self.path = path
+
+    def exists(self) -> bool:
+        return bool(self._parts())
+
+    def _parts(self) -> List[str]:
+        return sorted(glob.glob(os.path.join(self.path, 'part-*.parquet')))
+
+    def _write_part(self, df: pd.DataFrame, index: int):
+        df = df.copy()
+        for column in CATEGORICAL_COLUMNS:
+            if column in df.columns:
+                df[column] = df[column].astype('category')
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        pq.write_table(table, os.path.join(self.path, f'part-{index:05d}.parquet'))
+
+    def save(self, df: pd.DataFrame):
+        """
+        覆盖保存整个衣橱
+        """
+        if os.path.exists(self.path):
+            shutil.rmtree(self.path)
+        os.makedirs(self.path)
+        self._write_part(df, 0)
+
+    def append(self, df: pd.DataFrame):
+        """
+        追加记录（写入新的分片文件，不改动已有文件）
+        """
+        parts = self._parts()
+        if not parts:
+            self.save(df)
+            return
+        last_index = int(os.path.basename(parts[-1])[len('part-'):-len('.parquet')])
+        self._write_part(df, last_index + 1)
+
+    def load(self, columns: Optional[List[str]] = None, filters: Optional[List[Tuple]] = None) -> pd.DataFrame:
+        """
+        读取衣橱
+        :param columns: 只读取这些列
+        :param filters: 行过滤条件，在读取时下推，如 [('type', '==', '上衣')]
+        :return: 低基数列为 category 类型的 DataFrame
+        """
+        if not self.exists():
+            raise FileNotFoundError(f"衣橱存储不存在: {self.path}")
+        return pq.read_table(self.path, columns=columns, filters=filters).to_pandas()
+
+
+# SQLite 衣橱表的字段（item_key、user、analysis、updated_at 之外）
+WARDROBE_DB_COLUMNS = ['order_id', 'order_date', 'title', 'specification', 'image_url', 'price',
+                       'status', 'type', 'style', 'exposure_level', 'color', 'size', 'is_clothing'
+                       ] + ATTRIBUTE_COLUMNS + ['warmth']
+
+# 非 TEXT 类型的字段
+WARDROBE_DB_TYPES = {'is_clothing': 'INTEGER', 'warmth': 'REAL'}
+
+WARDROBE_DB_SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS items (
+    item_key TEXT PRIMARY KEY,
+    user TEXT NOT NULL,
+    {', '.join(f"{column} {WARDROBE_DB_TYPES.get(column, 'TEXT')}" for column in WARDROBE_DB_COLUMNS)},
+    analysis TEXT,
+    updated_at TEXT NOT NULL
+);
+"""
+
+WARDROBE_DB_INDEXES = """
+CREATE INDEX IF NOT EXISTS idx_items_user_type ON items (user, type);
+CREATE INDEX IF NOT EXISTS idx_items_user_style ON items (user, style);
+CREATE INDEX IF NOT EXISTS idx_items_user_color ON items (user, color);
+CREATE INDEX IF NOT EXISTS idx_items_user_order_date ON items (user, order_date);
+CREATE INDEX IF NOT EXISTS idx_items_user_warmth ON items (user, warmth);
+"""
+
+
+class WardrobeDB:
+    def __init__(self, path: str = "data/wardrobe.db"):
+        """
+        SQLite 衣橱元数据库（WAL 模式），按用户、类型、风格、颜色和购买日期建索引
+        :param path: 数据库文件路径
+        """
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # 每个线程复用一个连接；频繁开关连接会让 WAL 在每次关闭时都做检查点
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.executescript(WARDROBE_DB_SCHEMA)
+            # 旧版本创建的数据库补上新增的字段
+            existing = {row[1] for row in conn.execute('PRAGMA table_info(items)')}
+            for column in WARDROBE_DB_COLUMNS:
+                if column not in existing:
+                    conn.execute(f"ALTER TABLE items ADD COLUMN {column} {WARDROBE_DB_TYPES.get(column, 'TEXT')}")
+            conn.executescript(WARDROBE_DB_INDEXES)
+
+    @contextmanager
+    def _connect(self):
+        """
+        取得当前线程的连接，with 块正常结束时提交，出错时回滚
+        """
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute('PRAGMA cache_size=-65536')
+            self._local.conn = conn
+        with conn:
+            yield conn
+
+    def close(self):
+        """
+        关闭当前线程的连接
+        """
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+    @staticmethod
+    def item_keys(df: pd.DataFrame, user: str) -> List[str]:
+        """
+        条目的稳定主键：同一订单中的同款同规格视为同一件
+        """
+        columns = [df[column].fillna('').astype(str).tolist() if column in df.columns else [''] * len(df)
+                   for column in ('order_id', 'title', 'specification')]
+        return [hashlib.sha1('\x1f'.join((user,) + key).encode('utf-8')).hexdigest()
+                for key in zip(*columns)]
+
+    def upsert(self, df: pd.DataFrame, user: str = 'default') -> int:
+        """
+        批量写入或更新条目，整批在一个事务中完成
+        :param df: process_data 的结果，可带 analysis 列（图像分析结果字典）
+        :param user: 用户名
+        :return: 写入的条数
+        """
+        if df.empty:
+            return 0
+        n = len(df)
+        values = {'item_key': self.item_keys(df, user), 'user': [user] * n}
+        for column in WARDROBE_DB_COLUMNS:
+            if column in df.columns:
+                series = df[column].astype(object)
+                values[column] = series.where(series.notna(), None).tolist()
+            else:
+                values[column] = [None] * n
+        values['is_clothing'] = [None if value is None else int(value) for value in values['is_clothing']]
+        analysis = df['analysis'].tolist() if 'analysis' in df.columns else [None] * n
+        values['analysis'] = [json.dumps(value, ensure_ascii=False) if isinstance(value, (dict, list)) else None
+                              for value in analysis]
+        values['updated_at'] = [time.strftime('%Y-%m-%d %H:%M:%S')] * n
+
+        columns = list(values)
+        updates = ', '.join(f'{column} = excluded.{column}' for column in columns[1:] if column != 'analysis')
+        sql = (f"INSERT INTO items ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))}) "
+               f"ON CONFLICT(item_key) DO UPDATE SET {updates}, "
+               f"analysis = COALESCE(excluded.analysis, items.analysis)")
+        with self._connect() as conn:
+            conn.executemany(sql, zip(*values.values()))
+            self._refresh_stats(conn)
+        return n
+
+    @staticmethod
+    def _refresh_stats(conn: sqlite3.Connection):
+        """
+        条目数比上次统计时翻倍后重新抽样统计，让查询计划在多个索引间选出最合适的
+        """
+        try:
+            row = conn.execute("SELECT stat FROM sqlite_stat1 WHERE idx = 'idx_items_user_type'").fetchone()
+        except sqlite3.OperationalError:
+            row = None
+        analysed = int(row[0].split()[0]) if row else 0
+        total = conn.execute('SELECT MAX(rowid) FROM items').fetchone()[0] or 0
+        if total > 2 * analysed:
+            conn.execute('PRAGMA analysis_limit=1000')
+            conn.execute('ANALYZE items')
+
+    def set_analysis(self, item_key: str, analysis: Dict):
+        """
+        保存单个条目的分析结果
+        """
+        with self._connect() as conn:
+            conn.execute('UPDATE items SET analysis = ? WHERE item_key = ?',
+                         (json.dumps(analysis, ensure_ascii=False), item_key))
+
+    def query(self, user: str = 'default', type=None, style=None, color=None,
+              since: Optional[str] = None, until: Optional[str] = None,
+              min_warmth: Optional[float] = None, max_warmth: Optional[float] = None,
+              columns: Optional[List[str]] = None, limit: Optional[int] = None) -> pd.DataFrame:
+        """
+        按条件查询条目
+        :param type: 类型，字符串或列表，style、color 同理
+        :param since: 购买日期下限（含），如 '2024-05-01'
+        :param until: 购买日期上限（含）
+        :param min_warmth: 保暖分下限（含），max_warmth 为上限
+        :param columns: 只返回这些列，默认返回全部列
+        :param limit: 最多返回的条数，按购买日期从新到旧
+        :return: DataFrame，analysis 列已解析为字典
+        """
+        conditions, params = ['user = ?'], [user]
+        for column, value in (('type', type), ('style', style), ('color', color)):
+            if value is None:
+                continue
+            values = [value] if isinstance(value, str) else list(value)
+            conditions.append(f"{column} IN ({', '.join('?' * len(values))})")
+            params.extend(values)
+        if since:
+            conditions.append('order_date >= ?')
+            params.append(since)
+        if until:
+            conditions.append('order_date <= ?')
+            params.append(until)
+        if min_warmth is not None:
+            conditions.append('warmth >= ?')
+            params.append(float(min_warmth))
+        if max_warmth is not None:
+            conditions.append('warmth <= ?')
+            params.append(float(max_warmth))
+
+        sql = f"SELECT {', '.join(columns) if columns else '*'} FROM items WHERE {' AND '.join(conditions)}"
+        sql += ' ORDER BY order_date DESC'
+        if limit:
+            sql += f' LIMIT {int(limit)}'
+        with self._connect() as conn:
+            df = pd.read_sql_query(sql, conn, params=params)
+        if 'analysis' in df.columns:
+            df['analysis'] = df['analysis'].map(lambda value: json.loads(value) if isinstance(value, str) else None)
+        if 'is_clothing' in df.columns:
+            df['is_clothing'] = df['is_clothing'].astype('boolean')
+        return df
+
+    def count(self, user: str = 'default') -> int:
+        with self._connect() as conn:
+            return conn.execute('SELECT COUNT(*) FROM items WHERE user = ?', (user,)).fetchone()[0]
+
 
 class DataProcessor:
     def __init__(self, data_dir: str):
         self.data_dir = data_dir
-        self.metadata_file = os.path.join(data_dir, "metadata.json")
+        self.metadata_db = os.path.join(data_dir, "wardrobe.db")
+        self._wardrobe_db = None
+        self.classifier = KeywordClassifier(TITLE_RULES, TITLE_DEFAULTS)
+        self.deduplicator = TitleDeduplicator()
+
+    def _has_keyword(self, field: str, value: str, name: str) -> bool:
+        keywords = dict(TITLE_RULES[field])[value]
+        return any(kw in name for kw in keywords)
         
     def is_top(self, name: str) -> bool:
         """判断是否为上衣"""
-        keywords = ['背心', '上衣', 'T恤', '抹胸', '吊带', '露脐', '短袖', '衬衫', '外套', '夹克', '卫衣']
-        return any(kw in name for kw in keywords)
+        return self._has_keyword('type', '上衣', name)
     
     def is_bottom(self, name: str) -> bool:
         """判断是否为下装"""
-        keywords = ['短裤', '长裤', '裤子', '半身裙']
-        return any(kw in name for kw in keywords)
+        return self._has_keyword('type', '下装', name)
     
     def is_dress(self, name: str) -> bool:
         """判断是否为连衣裙/连体裤"""
-        keywords = ['连衣裙', '连体裤', '套装', '长裙', '吊带裙', '背带裤']
-        return any(kw in name for kw in keywords)
+        return self._has_keyword('type', '连衣裙/裤', name)
     
     def is_accessory(self, name: str) -> bool:
         """判断是否为配饰"""
-        keywords = ['帽子', '项链', '耳环', '手链', '戒指', '发饰', '围巾', '手套', '袜子', '包', '腰带', '眼镜', '口罩', '帽子', '鞋','袜子']
-        return any(kw in name for kw in keywords)
+        return self._has_keyword('type', '配饰', name)
     
     def estimate_exposure(self, name: str) -> str:
         """估算露肤度"""
-        high = ['抹胸', '露脐', '吊带']
-        medium = ['短袖', '背心', '短裙', '短裤']
-        low = ['长裙', '长裤', '毛呢']
-        
-        if any(kw in name for kw in high):
-            return 'high'
-        elif any(kw in name for kw in medium):
-            return 'medium'
-        elif any(kw in name for kw in low):
-            return 'low'
-        return 'unknown'
+        return self.classifier.match('exposure_level', name)
     
     def extract_style(self, name: str, fallback: str = None) -> str:
         """提取风格关键词"""
-        keywords = ['通勤', '辣妹', '运动', '学院', '复古', '法式']
-        style_map = {
-            '通勤': 'commuter',
-            '辣妹': 'trendy',
-            '运动': 'sports',
-            '学院': 'academic',
-            '复古': 'retro',
-            '法式': 'french'
-        }
-        for kw in keywords:
-            if kw in name:
-                return kw #style_map[kw]
-        return fallback if fallback else 'unknown'
+        return self.classifier.match('style', name, fallback)
 
     def extract_color_size(self, spec: str) -> tuple:
         """从规格中提取颜色和尺码"""
@@ -74,27 +594,51 @@ class DataProcessor:
             return color, size
             
         # 尝试提取颜色
-        color_section = re.search(r'(?:颜色分类|主要颜色)[:：]([^:：]+)', str(spec))
+        color_section = COLOR_SECTION_PATTERN.search(str(spec))
         if color_section:
             # 获取颜色部分的文本并清理
             color_text = color_section.group(1).strip()
             
             # 先尝试匹配 xxx色
-            color_match = re.search(r'([^\s,，]+色)', color_text)
+            color_match = COLOR_SUFFIX_PATTERN.search(color_text)
             if color_match:
                 color = color_match.group(1)
             else:
                 # 如果没找到xxx色，则保留第一段非空文本（处理类似"浆果玫红"这样的组合词）
-                color = re.split(r'[,，\s\-]+', color_text)[0].strip()
+                color = COLOR_SPLIT_PATTERN.split(color_text)[0].strip()
             
         # 尝试提取尺码
-        size_section = re.search(r'尺码[:：]([^:：]+)', str(spec))
+        size_section = SIZE_SECTION_PATTERN.search(str(spec))
         if size_section:
             size = size_section.group(1).strip()
             # 清理尺码中的特殊字符和乱码
-            size = re.sub(r'[\[\]【】\(\)]', '', size)
+            size = SIZE_CLEAN_PATTERN.sub('', size)
             
         return color, size
+
+    def extract_color_size_columns(self, specs: pd.Series) -> pd.DataFrame:
+        """整列提取颜色和尺码，结果与逐行调用 extract_color_size 一致"""
+        # 相同规格只解析一次
+        codes, uniques = pd.factorize(specs.astype(str).where(specs.notna(), ''))
+        uniques = pd.Series(uniques)
+
+        # 颜色：优先取 xxx色，否则取第一段文本
+        color_text = uniques.str.extract(COLOR_SECTION_PATTERN, expand=False).str.strip()
+        color = color_text.str.extract(COLOR_SUFFIX_PATTERN, expand=False)
+        no_suffix = color.isna() & color_text.notna()
+        color[no_suffix] = color_text[no_suffix].str.extract(COLOR_FIRST_PATTERN, expand=False)
+        color = color.fillna('')
+
+        # 尺码：去掉括号类字符
+        size = (uniques.str.extract(SIZE_SECTION_PATTERN, expand=False)
+                .str.strip()
+                .str.replace(SIZE_CLEAN_PATTERN, '', regex=True)
+                .fillna(''))
+
+        return pd.DataFrame({
+            'color': color.to_numpy()[codes],
+            'size': size.to_numpy()[codes]
+        }, index=specs.index)
         
     def process_data(self, df: pd.DataFrame) -> pd.DataFrame:
         """处理淘宝购买记录数据"""
@@ -113,24 +657,21 @@ class DataProcessor:
             df["exposure_level"] = ""  # 露肤度
                    
         # 从specification提取颜色和尺码
-        df[['color', 'size']] = pd.DataFrame(
-            df['specification'].apply(self.extract_color_size).tolist(),
-            index=df.index
-        )
+        df[['color', 'size']] = self.extract_color_size_columns(df['specification'])
         
-        # 添加新的处理逻辑
-        df['type'] = df['title'].apply(lambda x: 
-            '上衣' if self.is_top(x) 
-            else ('下装' if self.is_bottom(x) 
-            else ('连衣裙/裤' if self.is_dress(x)
-            else ('配饰' if self.is_accessory(x)
-            else '未知'))))
-            
-        df['exposure_level'] = df['title'].apply(self.estimate_exposure)
-        df['style'] = df.apply(lambda row: self.extract_style(str(row['title'])), axis=1)
+        # 一次扫描标题得到类型、露肤度和风格
+        labels = self.classifier.classify(df['title'])
+        df['type'] = labels['type']
+        df['exposure_level'] = labels['exposure_level']
+        df['style'] = labels['style']
+        
+        # 材质、厚薄、袖长/裤长、季节和保暖分，温度过滤不必再读标题
+        for column in ATTRIBUTE_COLUMNS:
+            df[column] = labels[column]
+        df['warmth'] = self.warmth_score(df)
         
         # 判断是否是服饰（类型不为未知，且颜色和尺码都不为空）
-        df['is_clothing'] = (df['type'].apply(lambda x: x != '未知') & 
+        df['is_clothing'] = (df['type'].ne('未知') & 
                            df['color'].str.len().gt(0) & 
                            df['size'].str.len().gt(0))
 
@@ -141,32 +682,203 @@ class DataProcessor:
         df = df[df['is_clothing'] == True]
             
         return df
+
+    def warmth_score(self, df: pd.DataFrame) -> pd.Series:
+        """
+        根据入库时提取的属性计算保暖分，0 最凉，11 最暖
+        """
+        score = sum(df[column].map(WARMTH_SCORES[column]).fillna(WARMTH_SCORES[column]['unknown']).astype(float)
+                    for column in ('material', 'thickness', 'season'))
+        sleeve = df['sleeve_length'].map(WARMTH_SCORES['sleeve_length'])
+        leg = df['leg_length'].map(WARMTH_SCORES['leg_length'])
+        return score + sleeve.fillna(leg).fillna(1).astype(float)
+
+    def filter_by_temperature(self, df: pd.DataFrame, temperature: Optional[float]) -> pd.DataFrame:
+        """
+        按 TEMPERATURE_RULES 剔除不适合当前温度的衣物
+        :param df: 衣橱数据，缺少属性列时（如旧的 CSV）先从标题提取
+        :param temperature: 温度（摄氏度），None 时不过滤
+        """
+        if temperature is None or pd.isna(temperature):
+            return df
+        if 'warmth' not in df.columns:
+            labels = self.classifier.classify(df['title'].fillna(''))
+            df = df.assign(**{column: labels[column] for column in ATTRIBUTE_COLUMNS})
+            df['warmth'] = self.warmth_score(df)
+        keep = pd.Series(True, index=df.index)
+        for above, below, forbidden in TEMPERATURE_RULES:
+            if (above is not None and temperature > above) or (below is not None and temperature < below):
+                for column, values in forbidden.items():
+                    keep &= ~df[column].isin(values)
+        return df[keep]
+
+    def style_keywords(self, style_preference: Optional[str]) -> List[str]:
+        """
+        把用户输入的风格转换为标题关键词，识别不出的风格直接用输入中的词
+        """
+        text = (style_preference or '').lower()
+        keywords = []
+        for aliases, title_keywords in STYLE_KEYWORDS.values():
+            if any(alias in text for alias in aliases):
+                keywords.extend(title_keywords)
+        if not keywords:
+            keywords = [word for word in re.split(r'[\s,，、/]+', text) if word]
+        return list(dict.fromkeys(keywords))
+
+    def select_candidates(self, df: pd.DataFrame, style_preference: Optional[str] = None,
+                          temperature: Optional[float] = None, top_k: int = 10) -> pd.DataFrame:
+        """
+        调用大模型前筛选候选衣物：按温度规则剔除，只保留上衣/下装/连衣裙，
+        再按风格关键词命中数排序，每个类型最多保留 top_k 件
+        :param df: 衣橱数据
+        :param style_preference: 用户想要的风格
+        :param temperature: 温度（摄氏度）
+        :param top_k: 每个类型保留的件数
+        :return: 按类型、风格相关度排序的候选衣物
+        """
+        candidates = self.filter_by_temperature(df, temperature)
+        candidates = candidates[candidates['type'].isin(CANDIDATE_TYPES)]
+
+        keywords = self.style_keywords(style_preference)
+        affinity = pd.Series(0, index=candidates.index)
+        if keywords:
+            pattern = '|'.join(re.escape(kw) for kw in sorted(keywords, key=len, reverse=True))
+            affinity = candidates['title'].fillna('').str.count(pattern, flags=re.IGNORECASE)
+            if 'style' in candidates.columns:
+                affinity += candidates['style'].isin(keywords).astype(int) * 2
+
+        # 相关度相同时保持原有顺序
+        ranked = candidates.assign(_affinity=affinity.to_numpy(), _order=np.arange(len(candidates)))
+        ranked = ranked.sort_values(['_affinity', '_order'], ascending=[False, True])
+        selected = pd.concat([ranked[ranked['type'] == t].head(top_k) for t in CANDIDATE_TYPES])
+        print(f"候选筛选：{len(df)} 件 -> {len(selected)} 件"
+              f"（温度 {temperature if temperature is not None else '未指定'}，风格关键词 {keywords[:5]}）")
+        return selected.drop(columns=['_affinity', '_order'])
+
+    def consolidate(self, df: pd.DataFrame) -> pd.DataFrame:
+        """
+        合并重复购买和同款不同规格的记录，每个款式保留一行
+        标题和规格完全相同的记录按哈希合并为一个规格；同类型、标题相近的记录视为同一款式
+        :param df: process_data 的结果
+        :return: 每组第一条记录，附加 variants（规格列表，含购买次数 count）和 purchase_count 列
+        """
+        df = df.reset_index(drop=True)
+        titles = df['title'].fillna('').astype(str)
+        codes, unique_titles = pd.factorize(titles)
+        title_group = self.deduplicator.group(list(unique_titles))[codes]
+        group = pd.factorize(pd.Series(title_group).astype(str) + '|' + df['type'].astype(str))[0]
+        exact = pd.util.hash_pandas_object(
+            pd.DataFrame({'title': titles, 'specification': df['specification'].fillna('')}), index=False
+        ).to_numpy()
+
+        keyed = df[VARIANT_COLUMNS].assign(_group=group, _exact=exact)
+        variants = keyed.groupby(['_group', '_exact'], sort=False).agg(
+            **{column: (column, 'first') for column in VARIANT_COLUMNS}, count=('_group', 'size')
+        ).reset_index()
+        variant_lists = defaultdict(list)
+        records = variants[VARIANT_COLUMNS + ['count']].to_dict('records')
+        for g, record in zip(variants['_group'], records):
+            variant_lists[g].append(record)
+
+        first = ~pd.Series(group).duplicated().to_numpy()
+        result = df[first].copy()
+        result['variants'] = [variant_lists[g] for g in group[first]]
+        result['purchase_count'] = np.bincount(group)[group[first]]
+        print(f"合并重复记录：{len(df)} 条 -> {len(result)} 款")
+        return result
+
+    def process_data_parallel(self, df: pd.DataFrame, workers: int = None,
+                              partition_by: str = None) -> pd.DataFrame:
+        """
+        多进程处理购买记录，结果与 process_data 一致（相同的行、顺序和索引）
+        :param df: 购买记录
+        :param workers: 进程数，默认等于 CPU 核数
+        :param partition_by: 按该列（如用户）分区，None 时按行范围平均切分
+        :return: 处理后的数据
+        """
+        workers = workers or os.cpu_count() or 1
+        original_index = df.index
+        df = df.reset_index(drop=True)
+
+        if partition_by is not None:
+            partitions = [group for _, group in df.groupby(partition_by, sort=False, dropna=False)]
+        else:
+            bounds = np.linspace(0, len(df), min(workers, max(len(df), 1)) + 1, dtype=int)
+            partitions = [df.iloc[start:end] for start, end in zip(bounds[:-1], bounds[1:])]
+
+        start = time.perf_counter()
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            # map 按提交顺序返回，合并顺序与分区方式无关
+            results = list(executor.map(_process_partition, partitions))
+        elapsed = time.perf_counter() - start
+
+        result = pd.concat(results).sort_index()
+        result.index = original_index[result.index]
+        print(f"{workers} 个进程处理 {len(df)} 条记录，用时 {elapsed:.3f} 秒，"
+              f"{len(df) / max(elapsed, 1e-9):,.0f} 条/秒")
+        return result
+
+    def process_csv(self, input_path: str, output_path: str, chunksize: int = None) -> int:
+        """
+        处理购买记录CSV并写入输出文件
+        :param input_path: 原始购买记录CSV
+        :param output_path: 处理后的CSV；以 .parquet 结尾时写入列式衣橱存储
+        :param chunksize: 每次读取的行数，None 表示一次读入；分块时内存占用只与块大小有关
+        :return: 写入的记录数
+        """
+        store = WardrobeStore(output_path) if output_path.endswith('.parquet') else None
+
+        if chunksize is None:
+            chunks = [pd.read_csv(input_path, **CSV_READ_OPTIONS)]
+        else:
+            chunks = pd.read_csv(input_path, chunksize=chunksize, **CSV_READ_OPTIONS)
+
+        rows = 0
+        for i, chunk in enumerate(chunks):
+            df = self.process_data(chunk)
+            if store is not None and i == 0:
+                store.save(df)
+            elif store is not None:
+                store.append(df)
+            elif i == 0:
+                df.to_csv(output_path, index=False, encoding='utf-8-sig')
+            else:
+                df.to_csv(output_path, mode='a', header=False, index=False, encoding='utf-8')
+            rows += len(df)
+        return rows
     
-    # def download_images(self, image_urls: List[str], output_dir: str):
-    #     """下载并保存图片"""
-    #     os.makedirs(output_dir, exist_ok=True)
-        
-    #     for url in image_urls:
-    #         try:
-    #             response = requests.get(url)
-    #             if response.status_code == 200:
-    #                 filename = os.path.join(output_dir, f"{hash(url)}.jpg")
-    #                 with open(filename, "wb") as f:
-    #                     f.write(response.content)
-    #         except Exception as e:
-    #             print(f"Error downloading {url}: {str(e)}")
+    def download_images(self, image_urls: List[str], output_dir: Optional[str] = None,
+                        **kwargs) -> Dict[str, Optional[str]]:
+        """
+        并发下载图片，已下载过的图片直接复用
+        :param image_urls: 图片链接列表
+        :param output_dir: 图片目录，默认为 data_dir/images
+        :return: 链接 -> 本地路径，下载失败的为 None
+        """
+        from .image_downloader import download_images
+        return download_images(image_urls, output_dir or os.path.join(self.data_dir, "images"), **kwargs)
     
-    # def save_metadata(self, metadata: Dict):
-    #     """保存元数据"""
-    #     with open(self.metadata_file, "w", encoding="utf-8") as f:
-    #         json.dump(metadata, f, ensure_ascii=False, indent=2)
+    def wardrobe_db(self) -> WardrobeDB:
+        """
+        元数据库，首次使用时打开
+        """
+        if self._wardrobe_db is None:
+            self._wardrobe_db = WardrobeDB(self.metadata_db)
+        return self._wardrobe_db
     
-    # def load_metadata(self) -> Dict:
-    #     """加载元数据"""
-    #     if os.path.exists(self.metadata_file):
-    #         with open(self.metadata_file, "r", encoding="utf-8") as f:
-    #             return json.load(f)
-    #     return {}
+    def save_metadata(self, items: pd.DataFrame, user: str = 'default') -> int:
+        """
+        保存衣橱条目和分析结果到 SQLite
+        :param items: process_data 的结果，可带 analysis 列
+        :return: 写入的条数
+        """
+        return self.wardrobe_db().upsert(items, user)
+    
+    def load_metadata(self, user: str = 'default', **filters) -> pd.DataFrame:
+        """
+        从 SQLite 读取衣橱条目，filters 同 WardrobeDB.query
+        """
+        return self.wardrobe_db().query(user, **filters)
     
     # def process_image(self, image_path: str) -> Dict:
     #     """处理单张图片，提取特征"""
@@ -189,14 +901,10 @@ def main():
     # 初始化数据处理器
     processor = DataProcessor(data_dir="data")
     
-    # 加载淘宝购买数据
-    raw_data = pd.read_csv("data/taobao_purchases.csv")
-    df = processor.process_data(raw_data)
-    
-    # 保存处理后的数据
-    output_path = "data/processed_taobao_purchases.csv"
-    df.to_csv(output_path, index=False, encoding='utf-8-sig')
-    print(f"\nProcessed data saved to: {output_path}")
+    # 分块处理淘宝购买数据并保存到列式衣橱存储
+    output_path = "data/processed_taobao_purchases.parquet"
+    rows = processor.process_csv("data/taobao_purchases.csv", output_path, chunksize=100_000)
+    print(f"\nProcessed {rows} records saved to: {output_path}")
 
 if __name__ == "__main__":
     main() 
\ No newline at end of file
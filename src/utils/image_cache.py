@@ -0,0 +1,162 @@
+import asyncio
+import hashlib
+import os
+import re
+import threading
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional
+
+from PIL import Image
+
+from .image_downloader import ImageDownloader, normalize_url
+
+# 淘宝图片 CDN 的尺寸后缀，如 xxx.jpg_640x640.jpg
+SIZE_SUFFIX_PATTERN = re.compile(r'_\d+x\d+\.jpg$')
+
+
+def variant_url(url: str, size: int) -> str:
+    """
+    把带尺寸后缀的淘宝图片链接改写为指定尺寸，没有后缀的链接原样返回
+    """
+    return SIZE_SUFFIX_PATTERN.sub(f'_{size}x{size}.jpg', normalize_url(url))
+
+
+class ImageCache:
+    def __init__(self, cache_dir: str = "data/image_cache", max_bytes: int = 512 * 2**20,
+                 thumbnail_size: int = 240, variant_size: int = 300, **download_kwargs):
+        """
+        本地图片缓存：画廊使用缩略图，原图按需下载，总大小超过上限时按 LRU 删除
+        :param cache_dir: 缓存目录，originals/ 存原图，thumbs/ 存缩略图
+        :param max_bytes: 缓存占用磁盘的上限（字节）
+        :param thumbnail_size: 缩略图最长边的像素数
+        :param variant_size: 生成缩略图时向 CDN 请求的图片尺寸
+        :param download_kwargs: 传给 ImageDownloader 的参数
+        """
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.thumbnail_size = thumbnail_size
+        self.variant_size = variant_size
+        self.thumb_dir = os.path.join(cache_dir, "thumbs")
+        os.makedirs(self.thumb_dir, exist_ok=True)
+        self.downloader = ImageDownloader(os.path.join(cache_dir, "originals"), **download_kwargs)
+
+        # 路径 -> 字节数，越靠后越近被访问；启动时按修改时间恢复顺序
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, int]" = OrderedDict()
+        self.total_bytes = 0
+        files = []
+        for directory in (self.thumb_dir, self.downloader.cache_dir):
+            if not os.path.isdir(directory):
+                continue
+            for name in os.listdir(directory):
+                if name.endswith(('.part', '.json', '.tmp')):
+                    continue
+                path = os.path.join(directory, name)
+                stat = os.stat(path)
+                files.append((stat.st_mtime, path, stat.st_size))
+        for _, path, size in sorted(files):
+            self._entries[path] = size
+            self.total_bytes += size
+        self.stats = {'hits': 0, 'misses': 0, 'evicted': 0}
+
+    def thumbnail_path(self, url: str) -> str:
+        key = hashlib.sha256(normalize_url(url).encode('utf-8')).hexdigest()
+        return os.path.join(self.thumb_dir, f"{key}_{self.thumbnail_size}.jpg")
+
+    def _touch(self, path: str):
+        """
+        标记为最近访问，修改时间用于下次启动时恢复 LRU 顺序
+        """
+        with self._lock:
+            if path in self._entries:
+                self._entries.move_to_end(path)
+        os.utime(path)
+
+    def _register(self, path: str):
+        size = os.path.getsize(path)
+        with self._lock:
+            self.total_bytes += size - self._entries.pop(path, 0)
+            self._entries[path] = size
+
+    def evict(self, keep: Iterable[str] = ()):
+        """
+        删除最久未访问的文件，直到总大小不超过上限
+        :param keep: 本次请求正在使用、不能删除的文件
+        """
+        keep = set(keep)
+        with self._lock:
+            for path in list(self._entries):
+                if self.total_bytes <= self.max_bytes:
+                    break
+                if path in keep:
+                    continue
+                self.total_bytes -= self._entries.pop(path)
+                self.stats['evicted'] += 1
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+
+    async def thumbnails(self, urls: List[str]) -> List[Optional[str]]:
+        """
+        返回与 urls 一一对应的本地缩略图路径，无法获取的为 None
+        """
+        paths: List[Optional[str]] = [None] * len(urls)
+        missing: Dict[str, List[int]] = {}
+        for i, url in enumerate(urls):
+            if not url:
+                continue
+            path = self.thumbnail_path(url)
+            if os.path.exists(path):
+                self._touch(path)
+                paths[i] = path
+                self.stats['hits'] += 1
+            else:
+                missing.setdefault(normalize_url(url), []).append(i)
+                self.stats['misses'] += 1
+
+        if missing:
+            sources = {url: variant_url(url, self.variant_size) for url in missing}
+            downloaded = await self.downloader.download(sources.values())
+            jobs = {url: downloaded.get(source) for url, source in sources.items()}
+            made = await asyncio.to_thread(self._make_thumbnails, jobs)
+            for url, path in made.items():
+                for i in missing[url]:
+                    paths[i] = path
+
+        self.evict(keep=[path for path in paths if path])
+        return paths
+
+    def _make_thumbnails(self, jobs: Dict[str, Optional[str]]) -> Dict[str, str]:
+        made = {}
+        for url, source in jobs.items():
+            if not source:
+                continue
+            self._register(source)
+            path = self.thumbnail_path(url)
+            try:
+                with Image.open(source) as img:
+                    img.thumbnail((self.thumbnail_size, self.thumbnail_size))
+                    img.convert('RGB').save(path, 'JPEG', quality=85)
+            except Exception as e:
+                print(f"Error creating thumbnail for {url}: {str(e)}")
+                continue
+            self._register(path)
+            made[url] = path
+        return made
+
+    async def full_size(self, url: str) -> Optional[str]:
+        """
+        返回原图的本地路径，不在缓存中时先下载
+        """
+        path = self.downloader.cached_path(url)
+        if path:
+            self._touch(path)
+            self.stats['hits'] += 1
+            return path
+        self.stats['misses'] += 1
+        path = (await self.downloader.download([url])).get(normalize_url(url))
+        if path:
+            self._register(path)
+            self.evict(keep=[path])
+        return path
@@ -0,0 +1,261 @@
+import asyncio
+import hashlib
+import json
+import os
+from typing import Dict, Iterable, List, Optional
+from urllib.parse import urlsplit
+
+import httpx
+
+# 这些状态码视为临时错误，退避后重试
+RETRY_STATUS = {408, 429, 500, 502, 503, 504}
+
+IMAGE_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.webp', '.gif'}
+
+DEFAULT_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 '
+                  '(KHTML, like Gecko) Chrome/120.0 Safari/537.36'
+}
+
+
+class DownloadError(Exception):
+    """不可重试的下载错误（如 404）"""
+
+
+class _RetryableError(Exception):
+    """可重试的下载错误（如 503）"""
+
+
+def normalize_url(url: str) -> str:
+    """
+    补全淘宝图片常见的 // 开头的协议相对链接
+    """
+    url = url.strip()
+    if url.startswith('//'):
+        return 'https:' + url
+    return url
+
+
+def _url_key(url: str) -> str:
+    """
+    URL 的稳定摘要（hash() 每个进程都不同，不能用于文件名）
+    """
+    return hashlib.sha256(url.encode('utf-8')).hexdigest()
+
+
+def _image_extension(url: str) -> str:
+    ext = os.path.splitext(urlsplit(url).path)[1].lower()
+    return ext if ext in IMAGE_EXTENSIONS else '.jpg'
+
+
+def _file_digest(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 16), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class ImageDownloader:
+    def __init__(self, cache_dir: str = "data/images", concurrency: int = 16,
+                 per_host: int = 4, host_rate: Optional[float] = None,
+                 retries: int = 3, backoff: float = 0.5, timeout: float = 10.0):
+        """
+        异步并发图片下载器，图片按内容的 sha256 存放，重复运行时跳过已有图片
+        :param cache_dir: 图片目录，目录下的 index.json 记录 URL 到文件名的映射
+        :param concurrency: 同时进行的下载数上限
+        :param per_host: 同一域名同时进行的下载数上限
+        :param host_rate: 同一域名每秒最多发起的请求数，None 表示不限
+        :param retries: 网络错误或临时状态码的重试次数
+        :param backoff: 第一次重试前的等待秒数，之后每次翻倍
+        :param timeout: 单个请求的超时秒数
+        """
+        self.cache_dir = cache_dir
+        self.concurrency = concurrency
+        self.per_host = per_host
+        self.host_rate = host_rate
+        self.retries = retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.index_path = os.path.join(cache_dir, "index.json")
+        self.index: Dict[str, str] = {}
+        if os.path.exists(self.index_path):
+            with open(self.index_path, 'r', encoding='utf-8') as f:
+                self.index = json.load(f)
+        self.stats = {'downloaded': 0, 'skipped': 0, 'resumed': 0, 'retried': 0, 'failed': 0, 'coalesced': 0}
+
+        # 并发上限、HTTP 客户端和进行中的下载在所有 download() 调用之间共享
+        self._loop = None
+        self._reset_limits()
+
+    def _reset_limits(self):
+        # 进行中的下载由所有调用者共用，客户端不能随某一次 download() 关闭，由 aclose() 关闭
+        self._http = self._client()
+        self._slots = asyncio.Semaphore(self.concurrency)
+        self._host_slots: Dict[str, asyncio.Semaphore] = {}
+        self._host_locks: Dict[str, asyncio.Lock] = {}
+        self._host_next: Dict[str, float] = {}
+        # URL -> 正在进行的下载，同时请求同一链接的调用者共用一次下载
+        self._in_flight: Dict[str, asyncio.Future] = {}
+
+    def cached_path(self, url: str) -> Optional[str]:
+        """
+        返回已下载图片的本地路径，没有则返回 None
+        """
+        filename = self.index.get(normalize_url(url))
+        if filename:
+            path = os.path.join(self.cache_dir, filename)
+            if os.path.exists(path):
+                return path
+        return None
+
+    def save_index(self):
+        """
+        写入索引文件（先写临时文件再替换，避免中断时损坏）
+        """
+        os.makedirs(self.cache_dir, exist_ok=True)
+        tmp_path = self.index_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.index, f, ensure_ascii=False)
+        os.replace(tmp_path, self.index_path)
+
+    def _client(self) -> httpx.AsyncClient:
+        limits = httpx.Limits(max_connections=self.concurrency,
+                              max_keepalive_connections=self.concurrency)
+        return httpx.AsyncClient(limits=limits, timeout=self.timeout,
+                                 headers=DEFAULT_HEADERS, follow_redirects=True)
+
+    async def download(self, urls: Iterable[str]) -> Dict[str, Optional[str]]:
+        """
+        并发下载图片
+        :param urls: 图片链接，重复的链接只下载一次
+        :return: 链接 -> 本地路径，下载失败的为 None
+        """
+        os.makedirs(self.cache_dir, exist_ok=True)
+        unique_urls = list(dict.fromkeys(normalize_url(url) for url in urls if url))
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            # 信号量和连接只能在一个事件循环中使用（如多次 asyncio.run 时），
+            # 旧循环已经结束，它的客户端无法再关闭，直接丢弃
+            self._loop = loop
+            self._reset_limits()
+
+        try:
+            tasks = []
+            for url in unique_urls:
+                task = self._in_flight.get(url)
+                if task is None:
+                    task = asyncio.ensure_future(self._fetch(self._http, url))
+                    self._in_flight[url] = task
+                    task.add_done_callback(lambda _, url=url: self._in_flight.pop(url, None))
+                else:
+                    self.stats['coalesced'] += 1
+                tasks.append(task)
+            # 某个调用者被取消时不影响共用同一下载的其他调用者
+            paths = await asyncio.gather(*(asyncio.shield(task) for task in tasks))
+        finally:
+            self.save_index()
+        return dict(zip(unique_urls, paths))
+
+    async def aclose(self):
+        """
+        等待进行中的下载结束并关闭 HTTP 客户端，需要在下载所用的事件循环中调用
+        """
+        if self._in_flight:
+            await asyncio.gather(*self._in_flight.values(), return_exceptions=True)
+        await self._http.aclose()
+        # 之后再调用 download() 时重新创建客户端
+        self._loop = None
+
+    async def _throttle(self, host: str):
+        """
+        按 host_rate 控制同一域名的请求间隔
+        """
+        if not self.host_rate:
+            return
+        loop = asyncio.get_running_loop()
+        lock = self._host_locks.setdefault(host, asyncio.Lock())
+        async with lock:
+            now = loop.time()
+            start = max(now, self._host_next.get(host, 0.0))
+            self._host_next[host] = start + 1.0 / self.host_rate
+            if start > now:
+                await asyncio.sleep(start - now)
+
+    async def _fetch(self, client: httpx.AsyncClient, url: str) -> Optional[str]:
+        path = self.cached_path(url)
+        if path:
+            self.stats['skipped'] += 1
+            return path
+
+        host = urlsplit(url).netloc
+        host_slots = self._host_slots.setdefault(host, asyncio.Semaphore(self.per_host))
+        part_path = os.path.join(self.cache_dir, _url_key(url) + '.part')
+        for attempt in range(self.retries + 1):
+            try:
+                async with self._slots, host_slots:
+                    await self._throttle(host)
+                    await self._stream(client, url, part_path)
+                break
+            except (httpx.TransportError, _RetryableError) as e:
+                if attempt == self.retries:
+                    print(f"Error downloading {url}: {str(e)}")
+                    self.stats['failed'] += 1
+                    return None
+                self.stats['retried'] += 1
+                await asyncio.sleep(self.backoff * 2 ** attempt)
+            except DownloadError as e:
+                print(f"Error downloading {url}: {str(e)}")
+                self.stats['failed'] += 1
+                return None
+
+        # 以内容摘要命名，不同链接的相同图片只保留一份
+        filename = _file_digest(part_path) + _image_extension(url)
+        path = os.path.join(self.cache_dir, filename)
+        if os.path.exists(path):
+            os.remove(part_path)
+        else:
+            os.replace(part_path, path)
+        self.index[url] = filename
+        self.stats['downloaded'] += 1
+        return path
+
+    async def _stream(self, client: httpx.AsyncClient, url: str, part_path: str):
+        """
+        下载到 .part 文件，已有部分内容时用 Range 请求续传
+        """
+        offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+        headers = {'Range': f'bytes={offset}-'} if offset else {}
+        async with client.stream('GET', url, headers=headers) as response:
+            if response.status_code == 416 and offset:
+                # 上次已经下载完整，只是没来得及改名
+                return
+            if response.status_code in RETRY_STATUS:
+                raise _RetryableError(f"HTTP {response.status_code}")
+            if response.status_code >= 400:
+                raise DownloadError(f"HTTP {response.status_code}")
+
+            # 服务器不支持 Range 时会返回 200 和完整内容，需要从头写
+            resume = offset and response.status_code == 206
+            if resume:
+                self.stats['resumed'] += 1
+            with open(part_path, 'ab' if resume else 'wb') as f:
+                async for chunk in response.aiter_bytes():
+                    f.write(chunk)
+
+
+def download_images(image_urls: List[str], cache_dir: str = "data/images",
+                    **kwargs) -> Dict[str, Optional[str]]:
+    """
+    同步调用入口，参数同 ImageDownloader
+    :return: 链接 -> 本地路径，下载失败的为 None
+    """
+    downloader = ImageDownloader(cache_dir=cache_dir, **kwargs)
+
+    async def run():
+        try:
+            return await downloader.download(image_urls)
+        finally:
+            await downloader.aclose()
+
+    return asyncio.run(run())
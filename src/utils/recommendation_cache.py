@@ -0,0 +1,218 @@
+import asyncio
+import hashlib
+import json
+import math
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple, Union
+
+import pandas as pd
+
+from .data_processor import STYLE_KEYWORDS, TEMPERATURE_RULES
+
+WHITESPACE_PATTERN = re.compile(r'[\s,，、/]+')
+
+RECOMMENDATION_CACHE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS recommendations (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL,
+    expires_at REAL NOT NULL
+)
+"""
+
+
+def wardrobe_fingerprint(wardrobe: Union[pd.DataFrame, str, List[Dict], None]) -> str:
+    """
+    衣物数据的内容摘要，内容有任何变化摘要都会不同
+    :param wardrobe: 传给 FashionAgent 的衣物数据（DataFrame、文本描述或服装列表）
+    """
+    if isinstance(wardrobe, pd.DataFrame):
+        # variants 等列是列表，不能用 hash_pandas_object，统一转成 JSON
+        text = wardrobe.to_json(orient='split', force_ascii=False, default_handler=str)
+    elif isinstance(wardrobe, str):
+        text = wardrobe
+    else:
+        text = json.dumps(wardrobe, ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+def normalize_style(style_preference: Optional[str]) -> str:
+    """
+    把风格输入归一化：能识别的风格换成 STYLE_KEYWORDS 中的名字，其余只去掉大小写和多余空白
+    """
+    text = (style_preference or '').strip().lower()
+    styles = sorted(name for name, (aliases, _) in STYLE_KEYWORDS.items()
+                    if any(alias in text for alias in aliases))
+    if styles:
+        return '+'.join(styles)
+    return ' '.join(word for word in WHITESPACE_PATTERN.split(text) if word)
+
+
+def temperature_bucket(temperature: Optional[float], step: float = 3.0) -> str:
+    """
+    温度分桶，同一个桶内的请求共用推荐结果；桶不会跨过 TEMPERATURE_RULES 的阈值
+    """
+    if temperature is None or pd.isna(temperature):
+        return 'any'
+    rules = ''.join(
+        str(i) for i, (above, below, _) in enumerate(TEMPERATURE_RULES)
+        if (above is not None and temperature > above) or (below is not None and temperature < below)
+    )
+    return f"{rules or '-'}:{math.floor(temperature / step)}"
+
+
+class SingleFlight:
+    def __init__(self):
+        """
+        合并并发的相同请求：同一个键同时只执行一次，其余调用者等待并共享结果
+        调用者需要在同一个事件循环中
+        """
+        self._calls: Dict[str, asyncio.Future] = {}
+        self.stats = {'calls': 0, 'coalesced': 0}
+
+    async def do(self, key: str, compute: Callable[[], Awaitable]):
+        """
+        :param key: 请求的键
+        :param compute: 没有进行中的相同请求时调用，返回要等待的协程
+        :return: compute 的结果，出错时所有等待者都收到同一个异常
+        """
+        task = self._calls.get(key)
+        if task is None:
+            task = asyncio.ensure_future(compute())
+            self._calls[key] = task
+            task.add_done_callback(lambda _: self._calls.pop(key, None))
+            self.stats['calls'] += 1
+        else:
+            self.stats['coalesced'] += 1
+        # 某个调用者被取消时不影响其他等待者
+        return await asyncio.shield(task)
+
+
+class RecommendationCache:
+    def __init__(self, max_entries: int = 256, ttl: float = 3600.0,
+                 temperature_step: float = 3.0, path: Optional[str] = None):
+        """
+        推荐结果缓存，键由衣物内容摘要、归一化的风格、温度桶、心情和所用模型组成；
+        衣物有变化时摘要不同，旧结果不会再被命中，随 LRU/TTL 淘汰
+        :param max_entries: 内存中最多保留的结果数，超过时删除最久未使用的
+        :param ttl: 结果的有效期（秒）
+        :param temperature_step: 温度桶的宽度（摄氏度）
+        :param path: 磁盘存储的 SQLite 文件路径，None 表示只用内存
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.temperature_step = temperature_step
+        self.path = path
+        self._lock = threading.Lock()
+        # 键 -> (过期时间, 结果)，越靠后越近被使用
+        self._entries: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+        self.stats = {'hits': 0, 'misses': 0, 'disk_hits': 0, 'evicted': 0, 'expired': 0}
+        self.flight = SingleFlight()
+        self._db = None
+        if path:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(RECOMMENDATION_CACHE_SCHEMA)
+            self._db.execute("DELETE FROM recommendations WHERE expires_at <= ?", (time.time(),))
+            self._db.commit()
+
+    def make_key(self, wardrobe: Union[pd.DataFrame, str, List[Dict], None], style_preference: Optional[str],
+                 temperature: Optional[float] = None, mood: Optional[str] = None,
+                 api_host: Optional[str] = None, model: Optional[str] = None) -> str:
+        """
+        :param api_host: 模型服务（github / azure），不同服务和模型的结果互不共用
+        :param model: 模型名
+        """
+        parts = [
+            api_host or '',
+            model or '',
+            wardrobe_fingerprint(wardrobe),
+            normalize_style(style_preference),
+            temperature_bucket(temperature, self.temperature_step),
+            ' '.join((mood or '').lower().split()),
+        ]
+        return hashlib.sha256('\x1f'.join(parts).encode('utf-8')).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        """
+        返回缓存的推荐结果，没有或已过期时返回 None
+        """
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry[0] <= now:
+                del self._entries[key]
+                self.stats['expired'] += 1
+                entry = None
+            if entry:
+                self._entries.move_to_end(key)
+                self.stats['hits'] += 1
+                return entry[1]
+
+            if self._db is not None:
+                row = self._db.execute(
+                    "SELECT value, expires_at FROM recommendations WHERE key = ? AND expires_at > ?",
+                    (key, now)
+                ).fetchone()
+                if row:
+                    self._store(key, row[0], row[1])
+                    self.stats['hits'] += 1
+                    self.stats['disk_hits'] += 1
+                    return row[0]
+            self.stats['misses'] += 1
+            return None
+
+    def put(self, key: str, value: str):
+        expires_at = time.time() + self.ttl
+        with self._lock:
+            self._store(key, value, expires_at)
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT INTO recommendations (key, value, expires_at) VALUES (?, ?, ?) "
+                    "ON CONFLICT(key) DO UPDATE SET value = excluded.value, expires_at = excluded.expires_at",
+                    (key, value, expires_at)
+                )
+                self._db.commit()
+
+    async def get_or_compute(self, key: str, compute: Callable[[], Awaitable[str]]) -> str:
+        """
+        命中缓存时直接返回，否则调用 compute 并写入缓存；
+        并发的相同请求只调用一次 compute
+        """
+        value = self.get(key)
+        if value is not None:
+            return value
+
+        async def compute_and_store():
+            value = await compute()
+            self.put(key, value)
+            return value
+
+        return await self.flight.do(key, compute_and_store)
+
+    def _store(self, key: str, value: str, expires_at: float):
+        self._entries[key] = (expires_at, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.stats['evicted'] += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM recommendations")
+                self._db.commit()
+
+    def close(self):
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+    def __len__(self) -> int:
+        return len(self._entries)
@@ -0,0 +1,42 @@
+import asyncio
+from contextlib import asynccontextmanager
+
+
+class QueueFullError(Exception):
+    """等待的请求数已达上限"""
+
+
+class RequestLimiter:
+    def __init__(self, concurrency: int = 8, queue_depth: int = 32):
+        """
+        限制一个事件（如推荐按钮）同时处理和排队的请求数，用于原生协程处理函数
+        :param concurrency: 同时处理的请求数上限
+        :param queue_depth: 排队等待的请求数上限，超过时直接拒绝而不是无限排队
+        """
+        self.concurrency = concurrency
+        self.queue_depth = queue_depth
+        self._slots = asyncio.Semaphore(concurrency)
+        self.waiting = 0
+        self.running = 0
+        self.stats = {'accepted': 0, 'rejected': 0}
+
+    @asynccontextmanager
+    async def slot(self):
+        """
+        等待一个处理名额，排队已满时抛出 QueueFullError
+        """
+        if self._slots.locked() and self.waiting >= self.queue_depth:
+            self.stats['rejected'] += 1
+            raise QueueFullError(f"已有 {self.waiting} 个请求在排队")
+        self.waiting += 1
+        try:
+            await self._slots.acquire()
+        finally:
+            self.waiting -= 1
+        self.stats['accepted'] += 1
+        self.running += 1
+        try:
+            yield
+        finally:
+            self.running -= 1
+            self._slots.release()
@@ -0,0 +1,35 @@
+import json
+import re
+from typing import List
+
+# 未完成的回复中 reason 字段已收到的部分
+REASON_PATTERN = re.compile(r'"reason"\s*:\s*"((?:[^"\\]|\\.)*)')
+# 只取右引号已经到达的图片链接，避免显示截断的链接
+STREAMED_IMAGE_PATTERN = re.compile(r'https?://[^\s"]+\.jpg(?=")')
+# 末尾只收到一半的转义序列：单个反斜杠，或 \u 后不足四位十六进制
+PARTIAL_ESCAPE_PATTERN = re.compile(r'(?<!\\)((?:\\\\)*)\\(?:u[0-9a-fA-F]{0,3})?$')
+
+PENDING_REASON = "Generating recommendation..."
+
+
+def streamed_reason(reply: str) -> str:
+    """
+    从流式收到的部分回复中取出（可能尚未结束的）reason 字段
+    :param reply: 到目前为止的回复文本
+    :return: 已解码的推荐理由，还没收到 reason 字段时返回 PENDING_REASON
+    """
+    match = REASON_PATTERN.search(reply)
+    if not match:
+        return PENDING_REASON
+    reason = PARTIAL_ESCAPE_PATTERN.sub(r'\1', match.group(1))
+    try:
+        return json.loads(f'"{reason}"')
+    except ValueError:
+        return reason
+
+
+def streamed_images(reply: str) -> List[str]:
+    """
+    部分回复中已经完整的图片链接
+    """
+    return STREAMED_IMAGE_PATTERN.findall(reply)
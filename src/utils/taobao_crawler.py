@@ -4,37 +4,454 @@ from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.common.exceptions import TimeoutException
-from typing import List, Dict
+from bs4 import BeautifulSoup, Comment, NavigableString
+from typing import List, Dict, Iterator, Optional
+import base64
 import json
 import os
+import re
+import sys
 from datetime import datetime, timedelta
 from dotenv import load_dotenv
 
 # 加载环境变量
 load_dotenv()
 
+# 订单容器的类名（淘宝页面的哈希类名）
+ORDER_CONTAINER_CLASS = 'index-mod__order-container___1ur4-'
+
+# 与 Selenium 路径一致的字段选择器
+TITLE_SELECTOR = 'p[data-reactid*="0.0.1.0"]'
+SPEC_SELECTOR = 'p[data-reactid*="0.0.1.1"]'
+IMAGE_SELECTOR = '.production-mod__pic___2Wuak img'
+PRICE_SELECTOR = 'p[data-reactid*="1.0.1"]'
+STATUS_SELECTOR = 'td[class*="sol-mod__no-br"] + td + td + td'
+ORDER_DATE_SELECTOR = '[class*="create-time"]'
+
+# 已买到的宝贝页面，也用于检查登录态是否有效
+BOUGHT_ITEMS_URL = 'https://buyertrade.taobao.com/trade/itemlist/list_bought_items.htm'
+
+# add_cookie 只接受这些字段
+_COOKIE_FIELDS = {'name', 'value', 'domain', 'path', 'expiry', 'secure', 'httpOnly'}
+
+# 订单列表数据接口：首页数据内嵌在页面中，翻页时通过 asyncBought 接口返回 JSON
+BOUGHT_ITEMS_API_PATTERN = re.compile(r'list_bought_items\.htm|asyncBought')
+EMBEDDED_DATA_PATTERN = re.compile(r"JSON\.parse\('((?:\\.|[^'\\])*)'\)")
+
+# 分页器的"下一页"按钮，最后一页时带 pagination-disabled 类
+NEXT_PAGE_SELECTOR = 'li.pagination-next'
+
+# 浏览器内一次性提取所有订单的脚本，字段与 Selenium 路径一致
+# arguments[0]: 订单容器类名，arguments[1]: 字段选择器
+EXTRACT_ORDERS_SCRIPT = """
+const selectors = arguments[1];
+const orders = [];
+for (const container of document.getElementsByClassName(arguments[0])) {
+    const tradeOrder = container.querySelector('[data-id]');
+    const orderId = tradeOrder ? tradeOrder.getAttribute('data-id') : '';
+    const orderDate = container.querySelector(selectors.date);
+    const items = container.getElementsByTagName('tbody');
+    // 跳过第一个tbody（它是订单头部）
+    for (let i = 1; i < items.length; i++) {
+        const title = items[i].querySelector(selectors.title);
+        const spec = items[i].querySelector(selectors.spec);
+        const image = items[i].querySelector(selectors.image);
+        const price = items[i].querySelector(selectors.price);
+        const status = items[i].querySelector(selectors.status);
+        if (!title || !spec || !image || !price || !status) {
+            continue;
+        }
+        orders.push({
+            title: title.innerText.trim(),
+            specification: spec.innerText.trim(),
+            image_url: image.src,
+            price: price.innerText.trim(),
+            status: status.innerText.trim(),
+            order_id: orderId,
+            order_date: orderDate ? orderDate.innerText.trim() : ''
+        });
+    }
+}
+return orders;
+"""
+
+# 渲染文本时会换行的块级标签，用于模拟 WebElement.text
+_BLOCK_TAGS = {'p', 'div', 'tr', 'li', 'br', 'table', 'tbody'}
+
+
+def _element_text(element) -> str:
+    """
+    按浏览器渲染规则近似提取元素文本（块级元素之间换行）
+    """
+    parts = []
+    for node in element.descendants:
+        if isinstance(node, Comment):
+            continue
+        if isinstance(node, NavigableString):
+            parts.append(str(node))
+        elif node.name in _BLOCK_TAGS:
+            parts.append('\n')
+    # 与浏览器一致，连续空白折叠为一个空格
+    lines = [re.sub(r'\s+', ' ', line).strip() for line in ''.join(parts).split('\n')]
+    return '\n'.join(line for line in lines if line)
+
+
+def _select_required(element, selector: str):
+    """
+    与 find_element 一致：找不到元素时抛出异常
+    """
+    found = element.select_one(selector)
+    if found is None:
+        raise ValueError(f"未找到元素: {selector}")
+    return found
+
+
+def parse_orders_html(html: str) -> List[Dict]:
+    """
+    单次解析已买到的宝贝页面HTML，不需要浏览器
+    :param html: driver.page_source 或保存的页面文件内容（如 element_sample.html）
+    :return: 购买记录列表，字段与 get_purchase_history 一致
+    """
+    soup = BeautifulSoup(html, 'lxml')
+    orders = []
+    for container in soup.find_all('div', class_=ORDER_CONTAINER_CLASS):
+        trade_order = container.find(attrs={'data-id': True})
+        order_id = trade_order['data-id'] if trade_order else ''
+        date_element = container.select_one(ORDER_DATE_SELECTOR)
+        order_date = _element_text(date_element) if date_element else ''
+
+        # 跳过第一个tbody（它是订单头部）
+        for item in container.find_all('tbody')[1:]:
+            try:
+                img_url = _select_required(item, IMAGE_SELECTOR).get('src', '')
+                # page_source 中是协议相对地址，WebElement 返回的是补全后的地址
+                if img_url.startswith('//'):
+                    img_url = 'https:' + img_url
+
+                orders.append({
+                    'title': _element_text(_select_required(item, TITLE_SELECTOR)),
+                    'specification': _element_text(_select_required(item, SPEC_SELECTOR)),
+                    'image_url': img_url,
+                    'price': _element_text(_select_required(item, PRICE_SELECTOR)),
+                    'status': _element_text(_select_required(item, STATUS_SELECTOR)),
+                    'order_id': order_id,
+                    'order_date': order_date
+                })
+            except Exception as e:
+                print(f"解析订单项时出错: {str(e)}")
+                continue
+    return orders
+
+
+def _is_before(order: Dict, cutoff) -> bool:
+    """
+    判断订单日期是否早于截止日期，日期缺失或无法解析时视为在范围内
+    """
+    try:
+        return datetime.strptime(order.get('order_date', ''), '%Y-%m-%d').date() < cutoff
+    except ValueError:
+        return False
+
+
+def parse_bought_items_response(body: str) -> List[Dict]:
+    """
+    把订单列表接口的响应（JSON 或内嵌数据的页面）转换为购买记录
+    :param body: 响应内容
+    :return: 购买记录列表，字段与 get_purchase_history 一致
+    """
+    try:
+        data = json.loads(body)
+    except ValueError:
+        # 首页把数据写在 var data = JSON.parse('...') 中
+        match = EMBEDDED_DATA_PATTERN.search(body)
+        if not match:
+            return []
+        data = json.loads(json.loads('"' + match.group(1).replace("\\'", "'") + '"'))
+
+    orders = []
+    for main_order in data.get('mainOrders', []):
+        order_id = str(main_order.get('id', ''))
+        order_date = main_order.get('orderInfo', {}).get('createDay', '')
+        for sub_order in main_order.get('subOrders', []):
+            try:
+                item_info = sub_order['itemInfo']
+                img_url = item_info.get('pic', '')
+                if img_url.startswith('//'):
+                    img_url = 'https:' + img_url
+                spec = ''.join(f"{sku['name']}：{sku['value']}" for sku in item_info.get('skuText', []))
+                # 与页面解析一致，status 取商品行的操作列文字
+                status = '\n'.join(op.get('text', '') for op in sub_order.get('operations', []) if op.get('text'))
+
+                orders.append({
+                    'title': item_info['title'],
+                    'specification': spec,
+                    'image_url': img_url,
+                    'price': f"￥{sub_order.get('priceInfo', {}).get('realTotal', '')}",
+                    'status': status,
+                    'order_id': order_id,
+                    'order_date': order_date
+                })
+            except Exception as e:
+                print(f"解析订单项时出错: {str(e)}")
+                continue
+    return orders
+
+
+def parse_orders_file(html_path: str) -> List[Dict]:
+    """
+    离线解析保存的订单页面文件
+    """
+    with open(html_path, 'r', encoding='utf-8') as f:
+        return parse_orders_html(f.read())
+
+class OrderIndex:
+    def __init__(self, index_path: str = "data/seen_orders.json"):
+        """
+        已抓取订单号的本地索引，用于增量抓取
+        :param index_path: 索引文件路径
+        """
+        self.index_path = index_path
+        self.order_ids = set()
+        if os.path.exists(index_path):
+            with open(index_path, 'r', encoding='utf-8') as f:
+                self.order_ids = set(json.load(f))
+
+    def __contains__(self, order_id: str) -> bool:
+        return bool(order_id) and order_id in self.order_ids
+
+    def __len__(self) -> int:
+        return len(self.order_ids)
+
+    def add(self, orders: List[Dict]):
+        """
+        记录订单号
+        """
+        self.order_ids.update(order['order_id'] for order in orders if order.get('order_id'))
+
+    def save(self):
+        """
+        写入索引文件（先写临时文件再替换，避免中断时损坏）
+        """
+        directory = os.path.dirname(self.index_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = self.index_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(sorted(self.order_ids), f)
+        os.replace(tmp_path, self.index_path)
+
+
+def parse_cookie_string(cookie: str, domain: str = '.taobao.com') -> List[Dict]:
+    """
+    把浏览器复制的 Cookie 字符串（如 TAOBAO_COOKIE）转换为 add_cookie 使用的格式
+    """
+    cookies = []
+    for part in cookie.split(';'):
+        name, sep, value = part.strip().partition('=')
+        if sep and name:
+            cookies.append({'name': name, 'value': value.strip('"'), 'domain': domain, 'path': '/'})
+    return cookies
+
+
+class SessionStore:
+    def __init__(self, session_path: str = "data/taobao_session.json"):
+        """
+        登录态的本地存储，保存登录成功后的 cookies
+        :param session_path: 会话文件路径
+        """
+        self.session_path = session_path
+
+    def load(self) -> List[Dict]:
+        """
+        读取保存的 cookies，文件不存在或损坏时返回空列表
+        """
+        if not os.path.exists(self.session_path):
+            return []
+        try:
+            with open(self.session_path, 'r', encoding='utf-8') as f:
+                return json.load(f).get('cookies', [])
+        except (OSError, ValueError) as e:
+            print(f"读取会话文件时出错: {str(e)}")
+            return []
+
+    def save(self, cookies: List[Dict]):
+        """
+        保存 cookies
+        """
+        directory = os.path.dirname(self.session_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = self.session_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'saved_at': datetime.now().isoformat(), 'cookies': cookies}, f, ensure_ascii=False)
+        os.replace(tmp_path, self.session_path)
+
+    def clear(self):
+        """
+        删除失效的会话
+        """
+        if os.path.exists(self.session_path):
+            os.remove(self.session_path)
+
+
 class TaobaoCrawler:
-    def __init__(self):
+    def __init__(self, cookie: Optional[str] = None,
+                 user_data_dir: Optional[str] = None,
+                 session_path: str = "data/taobao_session.json",
+                 order_index_path: str = "data/seen_orders.json",
+                 headless: bool = False, capture_network: bool = False):
         """
         初始化爬虫
+        :param cookie: 浏览器复制的 Cookie 字符串，默认读取环境变量 TAOBAO_COOKIE
+        :param user_data_dir: Chrome 用户数据目录，保留登录态；默认读取环境变量
+            TAOBAO_USER_DATA_DIR，未设置时为 data/chrome_profile
+        :param session_path: 登录成功后保存 cookies 的文件
+        :param order_index_path: 增量抓取使用的订单号索引文件
+        :param headless: 是否使用无头模式（不显示浏览器窗口）
+        :param capture_network: 是否记录网络日志，使用 network 解析方式时必须开启
         """
         self.options = webdriver.ChromeOptions()
         # 添加一些选项来避免被检测
         self.options.add_argument('--disable-blink-features=AutomationControlled')
         self.options.add_experimental_option('excludeSwitches', ['enable-automation'])
         self.options.add_experimental_option('useAutomationExtension', False)
+
+        # 记录网络日志，network 模式从中读取订单接口的响应；其它模式不开启，避免日志在浏览器中不断累积
+        self.capture_network = capture_network
+        if capture_network:
+            self.options.set_capability('goog:loggingPrefs', {'performance': 'ALL'})
         
-        # 如果需要无头模式（不显示浏览器窗口）
-        # self.options.add_argument('--headless')
+        # 无头模式（不显示浏览器窗口）
+        if headless:
+            self.options.add_argument('--headless=new')
+
+        # 复用 Chrome 用户数据目录，重启后仍保持登录
+        user_data_dir = user_data_dir or os.getenv("TAOBAO_USER_DATA_DIR", "data/chrome_profile")
+        os.makedirs(user_data_dir, exist_ok=True)
+        self.options.add_argument(f'--user-data-dir={os.path.abspath(user_data_dir)}')
+
+        self.cookie = cookie if cookie is not None else os.getenv("TAOBAO_COOKIE")
+        self.session_store = SessionStore(session_path)
         
         self.driver = None
+
+        # 每页提取耗时记录：[{'mode', 'orders', 'seconds'}]
+        self.extraction_stats = []
+
+        # 当前浏览器已抓取的页数，浏览器池据此回收
+        self.pages_crawled = 0
+
+        # 已抓取过的订单号
+        self.order_index = OrderIndex(order_index_path)
         
-    def login(self):
+    def start(self):
         """
-        使用二维码登录淘宝，并导航到已买到的宝贝页面
+        启动浏览器（已启动时不做任何事）
         """
         if self.driver is None:
             self.driver = webdriver.Chrome(options=self.options)
+            self.pages_crawled = 0
+
+    def is_healthy(self) -> bool:
+        """
+        检查浏览器是否仍可响应
+        """
+        if self.driver is None:
+            return False
+        try:
+            self.driver.current_url
+            return True
+        except Exception:
+            return False
+
+    def switch_account(self, cookie: Optional[str] = None,
+                       session_path: str = "data/taobao_session.json",
+                       order_index_path: str = "data/seen_orders.json"):
+        """
+        切换到另一个账号的登录态，复用同一个浏览器
+        :param cookie: 该账号的 Cookie 字符串
+        :param session_path: 该账号的会话文件
+        :param order_index_path: 该账号的订单号索引文件
+        """
+        self.cookie = cookie
+        self.session_store = SessionStore(session_path)
+        self.order_index = OrderIndex(order_index_path)
+        if self.driver is not None:
+            # delete_all_cookies 只清除当前域名，这里清除浏览器全部 cookies
+            self.driver.execute_cdp_cmd('Network.clearBrowserCookies', {})
+
+    def login(self):
+        """
+        登录淘宝并导航到已买到的宝贝页面
+        优先复用已保存的登录态，失效时再使用二维码登录
+        """
+        self.start()
+
+        if self.restore_session():
+            print("已恢复登录态，跳过扫码登录")
+            return True
+        return self.login_with_qr_code()
+
+    def restore_session(self) -> bool:
+        """
+        依次尝试浏览器用户数据目录、保存的 cookies、TAOBAO_COOKIE 恢复登录态
+        :return: 登录态是否有效（有效时已位于已买到的宝贝页面）
+        """
+        self.start()
+        if self._is_logged_in():
+            return True
+
+        candidates = [('会话文件', self.session_store.load())]
+        if self.cookie:
+            candidates.append(('TAOBAO_COOKIE', parse_cookie_string(self.cookie)))
+
+        for source, cookies in candidates:
+            if not cookies:
+                continue
+            self._add_cookies(cookies)
+            if self._is_logged_in():
+                print(f"使用{source}恢复登录态")
+                self.session_store.save(self.driver.get_cookies())
+                return True
+            print(f"{source}中的登录态已失效")
+            if source == '会话文件':
+                self.session_store.clear()
+        return False
+
+    def _add_cookies(self, cookies: List[Dict]):
+        """
+        写入 cookies（需要先打开对应域名的页面）
+        """
+        self.driver.get('https://www.taobao.com')
+        for cookie in cookies:
+            cookie = {key: value for key, value in cookie.items() if key in _COOKIE_FIELDS}
+            if 'expiry' in cookie:
+                cookie['expiry'] = int(cookie['expiry'])
+            try:
+                self.driver.add_cookie(cookie)
+            except Exception:
+                # 其它域名（如 login.taobao.com）的 cookie 无法在当前页面写入
+                continue
+
+    def _is_logged_in(self) -> bool:
+        """
+        打开已买到的宝贝页面，未被重定向到登录页即视为登录态有效
+        """
+        self.driver.get(BOUGHT_ITEMS_URL)
+        try:
+            WebDriverWait(self.driver, 10).until(EC.any_of(
+                EC.presence_of_element_located((By.CLASS_NAME, ORDER_CONTAINER_CLASS)),
+                EC.url_contains('login')
+            ))
+        except TimeoutException:
+            return False
+        return 'login' not in self.driver.current_url
+
+    def login_with_qr_code(self):
+        """
+        使用二维码登录淘宝，并导航到已买到的宝贝页面
+        """
+        self.start()
             
         # 清除所有 cookies
         self.driver.delete_all_cookies()
@@ -48,6 +465,9 @@ class TaobaoCrawler:
                 lambda driver: not ('login' in driver.current_url or 'verify' in driver.current_url or 'validate' in driver.current_url)
             )
             print("登录和验证成功！")
+
+            # 保存登录态，下次启动时复用
+            self.session_store.save(self.driver.get_cookies())
             
             # 等待页面加载完成
             time.sleep(3)  # 给页面一些加载时间
@@ -69,58 +489,230 @@ class TaobaoCrawler:
             return False
                 
             
-    def get_purchase_history(self, days: int = 30) -> List[Dict]:
+    def get_purchase_history(self, days: int = 30, mode: str = "selenium",
+                             incremental: bool = False) -> List[Dict]:
         """
-        获取指定天数内的购买记录
+        获取指定天数内的购买记录（自动翻页）
         :param days: 要获取的天数
+        :param mode: 解析方式，见 iter_purchase_history
+        :param incremental: 是否只抓取上次之后的新订单
         :return: 购买记录列表
         """
+        orders = []
+        for page_orders in self.iter_purchase_history(days=days, mode=mode, incremental=incremental):
+            orders.extend(page_orders)
+        return orders
+
+    def iter_purchase_history(self, days: int = 30, mode: str = "selenium",
+                              max_pages: Optional[int] = None,
+                              incremental: bool = False) -> Iterator[List[Dict]]:
+        """
+        按页流式获取购买记录，遇到早于 days 天前的订单即停止
+        :param days: 要获取的天数
+        :param mode: 解析方式
+            - "selenium": 逐个元素调用 find_element
+            - "html": 读取 page_source 后单次解析，解析当前页时浏览器已在加载下一页
+            - "script": 注入一段 JavaScript，一次往返取回整页订单
+            - "network": 通过 DevTools 协议读取订单列表接口的响应，不依赖页面结构（需要 capture_network=True）
+        :param max_pages: 最多翻页数，None 表示不限制
+        :param incremental: 遇到索引中已有的订单号即停止；新订单号不会自动写入索引，
+            调用方保存好记录后再调用 mark_seen，避免中途失败时订单被跳过
+        :return: 每次产出一页的购买记录列表
+        """
         if self.driver is None:
             print("请先调用 login() 方法完成登录")
+            return
+
+        extractors = {
+            "selenium": self._extract_orders_selenium,
+            "html": self._extract_orders_html,
+            "script": self._extract_orders_script,
+            "network": self._extract_orders_network,
+        }
+        if mode not in extractors:
+            raise ValueError(f"不支持的解析方式: {mode}")
+        if mode == "network" and not self.capture_network:
+            raise ValueError("network 解析方式需要在创建爬虫时传入 capture_network=True")
+
+        cutoff = (datetime.now() - timedelta(days=days)).date()
+        page = 0
+        while True:
+            last_page = max_pages is not None and page + 1 >= max_pages
+            # 等待页面加载完成
+            try:
+                # 等待订单容器加载
+                first_container = WebDriverWait(self.driver, 10).until(
+                    EC.presence_of_element_located((By.CLASS_NAME, ORDER_CONTAINER_CLASS))
+                )
+            except TimeoutException:
+                print("页面加载超时")
+                return
+
+            # 记录单页提取耗时，便于比较不同解析方式（不含点击翻页）
+            start = time.perf_counter()
+            has_next = None
+            if mode == "html":
+                # 先保存当前页快照再翻页，浏览器加载下一页与本页解析并行；
+                # 代价是本页触发停止条件时已多加载了一页
+                page_source = self.driver.page_source
+                elapsed = time.perf_counter() - start
+                has_next = not last_page and self._go_to_next_page()
+                start = time.perf_counter()
+                orders = parse_orders_html(page_source)
+                elapsed += time.perf_counter() - start
+            else:
+                orders = extractors[mode]()
+                elapsed = time.perf_counter() - start
+            self.extraction_stats.append({'mode': mode, 'orders': len(orders), 'seconds': elapsed})
+            page += 1
+            self.pages_crawled += 1
+            print(f"[{mode}] 第 {page} 页提取 {len(orders)} 条记录，用时 {elapsed:.3f} 秒")
+
+            # 订单按时间倒序排列，出现超出范围的订单后即可停止
+            recent_orders = [order for order in orders if not _is_before(order, cutoff)]
+            reached_end = len(recent_orders) < len(orders)
+
+            # 增量模式：第一个已抓取过的订单之后都是旧数据
+            if incremental:
+                for i, order in enumerate(recent_orders):
+                    if order.get('order_id') in self.order_index:
+                        recent_orders = recent_orders[:i]
+                        reached_end = True
+                        break
+
+            # 先判断本页是否已到停止条件，避免多加载一页；翻页在产出之前，调用方处理本页时浏览器加载下一页
+            if has_next is None and not (reached_end or last_page):
+                has_next = self._go_to_next_page()
+            if recent_orders:
+                yield recent_orders
+            if reached_end or last_page or not has_next:
+                return
+
+            # 等待旧页面的订单容器被替换
+            try:
+                WebDriverWait(self.driver, 10).until(EC.staleness_of(first_container))
+            except TimeoutException:
+                print("翻页超时")
+                return
+
+    def mark_seen(self, orders: List[Dict]):
+        """
+        把已保存的订单号写入索引，下次增量抓取时跳过
+        """
+        self.order_index.add(orders)
+        self.order_index.save()
+
+    def _go_to_next_page(self) -> bool:
+        """
+        点击"下一页"，已是最后一页时返回 False
+        """
+        try:
+            next_button = self.driver.find_element(By.CSS_SELECTOR, NEXT_PAGE_SELECTOR)
+        except Exception:
+            return False
+        if 'pagination-disabled' in (next_button.get_attribute('class') or ''):
+            return False
+        try:
+            next_button.click()
+            return True
+        except Exception as e:
+            print(f"翻页时出错: {str(e)}")
+            return False
+
+    def _extract_orders_html(self) -> List[Dict]:
+        """
+        读取 page_source 后离线解析
+        """
+        return parse_orders_html(self.driver.page_source)
+
+    def _extract_orders_network(self) -> List[Dict]:
+        """
+        从上次读取之后的网络日志中找到最新的订单列表响应并解析
+        """
+        request_id = None
+        for entry in self.driver.get_log('performance'):
+            try:
+                message = json.loads(entry['message'])['message']
+            except (KeyError, ValueError):
+                continue
+            if message.get('method') != 'Network.responseReceived':
+                continue
+            params = message.get('params', {})
+            if BOUGHT_ITEMS_API_PATTERN.search(params.get('response', {}).get('url', '')):
+                request_id = params.get('requestId')
+
+        if request_id is None:
+            print("网络日志中没有订单列表响应")
             return []
-            
-        # 等待页面加载完成
         try:
-            # 等待订单容器加载
-            WebDriverWait(self.driver, 10).until(
-                EC.presence_of_element_located((By.CLASS_NAME, 'index-mod__order-container___1ur4-'))
-            )
-        except TimeoutException:
-            print("页面加载超时")
+            response = self.driver.execute_cdp_cmd('Network.getResponseBody', {'requestId': request_id})
+        except Exception as e:
+            print(f"读取订单列表响应时出错: {str(e)}")
             return []
-            
+        body = response.get('body', '')
+        if response.get('base64Encoded'):
+            body = base64.b64decode(body).decode('utf-8')
+        return parse_bought_items_response(body)
+
+    def _extract_orders_script(self) -> List[Dict]:
+        """
+        在浏览器内执行脚本，一次往返返回整页订单
+        """
+        try:
+            return self.driver.execute_script(EXTRACT_ORDERS_SCRIPT, ORDER_CONTAINER_CLASS, {
+                'title': TITLE_SELECTOR,
+                'spec': SPEC_SELECTOR,
+                'image': IMAGE_SELECTOR,
+                'price': PRICE_SELECTOR,
+                'status': STATUS_SELECTOR,
+                'date': ORDER_DATE_SELECTOR,
+            }) or []
+        except Exception as e:
+            print(f"执行提取脚本时出错: {str(e)}")
+            return []
+
+    def _extract_orders_selenium(self) -> List[Dict]:
+        """
+        逐个元素查找订单字段（每次 find_element 都是一次 WebDriver 往返）
+        """
         # 获取订单数据
         orders = []
         try:
             # 获取所有订单容器
-            order_containers = self.driver.find_elements(By.CLASS_NAME, 'index-mod__order-container___1ur4-')
+            order_containers = self.driver.find_elements(By.CLASS_NAME, ORDER_CONTAINER_CLASS)
             print(f"找到 {len(order_containers)} 个订单日期组")
             
             for container in order_containers:
                 try:
+                    # 获取订单号和下单日期，缺失时与 parse_orders_html 一样留空
+                    id_elements = container.find_elements(By.CSS_SELECTOR, '[data-id]')
+                    order_id = (id_elements[0].get_attribute('data-id') or '') if id_elements else ''
+                    date_elements = container.find_elements(By.CSS_SELECTOR, ORDER_DATE_SELECTOR)
+                    order_date = date_elements[0].text.strip() if date_elements else ''
+
                     # 获取每个订单项
                     order_items = container.find_elements(By.TAG_NAME, 'tbody')
                     
                     for item in order_items[1:]:  # 跳过第一个tbody（它是订单头部）
                         try:
                             # 获取商品标题和规格
-                            title_element = item.find_element(By.CSS_SELECTOR, 'p[data-reactid*="0.0.1.0"]')
+                            title_element = item.find_element(By.CSS_SELECTOR, TITLE_SELECTOR)
                             title = title_element.text.strip()
                             
                             # 获取规格信息
-                            spec_element = item.find_element(By.CSS_SELECTOR, 'p[data-reactid*="0.0.1.1"]')
+                            spec_element = item.find_element(By.CSS_SELECTOR, SPEC_SELECTOR)
                             spec = spec_element.text.strip()
 
                             # 获取图片链接
-                            img_element = item.find_element(By.CSS_SELECTOR, '.production-mod__pic___2Wuak img')
+                            img_element = item.find_element(By.CSS_SELECTOR, IMAGE_SELECTOR)
                             img_url = img_element.get_attribute('src')
                             
                             # 获取价格
-                            price_element = item.find_element(By.CSS_SELECTOR, 'p[data-reactid*="1.0.1"]')
+                            price_element = item.find_element(By.CSS_SELECTOR, PRICE_SELECTOR)
                             price = price_element.text.strip()
                             
                             # 获取订单状态 -- 后续提出交易关闭的部分
-                            status_element = item.find_element(By.CSS_SELECTOR, 'td[class*="sol-mod__no-br"] + td + td + td')
+                            status_element = item.find_element(By.CSS_SELECTOR, STATUS_SELECTOR)
                             status = status_element.text.strip()
                             
                             order_info = {
@@ -128,7 +720,9 @@ class TaobaoCrawler:
                                 'specification': spec,
                                 'image_url': img_url,  # 新增图片链接
                                 'price': price,
-                                'status': status
+                                'status': status,
+                                'order_id': order_id,
+                                'order_date': order_date
                             }
                             orders.append(order_info)
                             
@@ -145,13 +739,23 @@ class TaobaoCrawler:
             
         return orders
         
-    def save_to_csv(self, items: List[Dict], output_path: str):
+    def save_to_csv(self, items: List[Dict], output_path: str, append: bool = False):
         """
         将商品信息保存为CSV文件
+        :param append: 追加到已有文件末尾（用于增量抓取）
         """
         import pandas as pd
         df = pd.DataFrame(items)
-        df.to_csv(output_path, index=False, encoding='utf-8-sig')
+        if append and os.path.exists(output_path):
+            existing_columns = list(pd.read_csv(output_path, nrows=0, encoding='utf-8-sig').columns)
+            if existing_columns == list(df.columns):
+                df.to_csv(output_path, mode='a', header=False, index=False, encoding='utf-8')
+            else:
+                # 字段有变化时整体重写，避免列错位
+                existing = pd.read_csv(output_path, encoding='utf-8-sig')
+                pd.concat([existing, df], ignore_index=True).to_csv(output_path, index=False, encoding='utf-8-sig')
+        else:
+            df.to_csv(output_path, index=False, encoding='utf-8-sig')
         print(f"已保存 {len(items)} 条记录到 {output_path}")
         
     def close(self):
@@ -163,16 +767,29 @@ class TaobaoCrawler:
             self.driver = None
 
 def main():
+    # 离线模式：python taobao_crawler.py page.html 直接解析保存的页面
+    if len(sys.argv) > 1:
+        start = time.perf_counter()
+        items = parse_orders_file(sys.argv[1])
+        print(f"离线解析 {len(items)} 条记录，用时 {time.perf_counter() - start:.3f} 秒")
+        if items:
+            crawler = TaobaoCrawler()
+            crawler.save_to_csv(items, "data/taobao_purchases.csv")
+        return
+
     crawler = TaobaoCrawler()
     
     # 登录
     if crawler.login():
-        # 获取最近30天的购买记录
-        items = crawler.get_purchase_history(days=30) # 目前未筛选，仅爬第一页；之后可以补充用日期筛选，爬取多页
+        # 获取最近30天内上次抓取之后的新订单（自动翻页）
+        items = crawler.get_purchase_history(days=30, incremental=True)
         
-        # 保存为CSV
+        # 只把新记录追加到CSV，写入成功后再更新订单号索引
         if items:
-            crawler.save_to_csv(items, "data/taobao_purchases.csv")
+            crawler.save_to_csv(items, "data/taobao_purchases.csv", append=True)
+            crawler.mark_seen(items)
+        else:
+            print("没有新的购买记录")
     
     # 关闭浏览器
     crawler.close()
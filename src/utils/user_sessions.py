@@ -0,0 +1,245 @@
+import os
+import re
+import shutil
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, Optional, Set
+
+import pandas as pd
+
+
+class UserSession:
+    def __init__(self, data_dir: Optional[str] = None):
+        """
+        一个浏览器会话的状态：爬虫、衣橱数据、推荐模式和所选模型
+        :param data_dir: 该会话独占的目录，存放 Chrome 用户数据、登录态和订单号索引
+        """
+        self.data_dir = data_dir
+        self.crawler = None
+        self.data_processor = None
+        self.clothing_data: Optional[pd.DataFrame] = None
+        self.text_description: Optional[str] = None
+        self.mode = "taobao"
+        self.openai_model = "gpt-4.1-mini"
+        self.github_model: Optional[str] = None
+        self.last_used = time.time()
+        # memory_bytes() 的结果，由 UserSessionStore.update() 在数据变化后刷新
+        self.size_bytes = 0
+        # 正在工作线程中运行的爬虫操作数，大于 0 时会话不会被淘汰
+        self._busy = 0
+
+    @contextmanager
+    def busy(self):
+        """
+        标记会话正在登录或爬取，期间不会被淘汰，浏览器和会话目录不会被删除
+        """
+        self._busy += 1
+        try:
+            yield
+        finally:
+            self._busy -= 1
+
+    @property
+    def is_busy(self) -> bool:
+        return self._busy > 0
+
+    def memory_bytes(self) -> int:
+        """
+        估计会话占用的内存（衣橱数据和图片分析文本）
+        """
+        size = 0
+        if self.clothing_data is not None:
+            size += int(self.clothing_data.memory_usage(deep=True).sum())
+        if self.text_description:
+            size += len(self.text_description.encode('utf-8'))
+        return size
+
+    def crawler_paths(self) -> Dict[str, str]:
+        """
+        TaobaoCrawler 的路径参数，每个会话互不共用，避免串号；没有会话目录时使用默认路径
+        """
+        if not self.data_dir:
+            return {}
+        return {
+            'user_data_dir': os.path.join(self.data_dir, "chrome_profile"),
+            'session_path': os.path.join(self.data_dir, "taobao_session.json"),
+            'order_index_path': os.path.join(self.data_dir, "seen_orders.json"),
+        }
+
+    def close_crawler(self):
+        """
+        关闭浏览器，保留登录态文件
+        """
+        if self.crawler is not None:
+            try:
+                self.crawler.close()
+            except Exception as e:
+                print(f"Error closing crawler: {str(e)}")
+            self.crawler = None
+
+    def close(self):
+        """
+        释放会话持有的资源：关闭浏览器并删除会话目录
+        """
+        self.close_crawler()
+        if self.data_dir and os.path.isdir(self.data_dir):
+            shutil.rmtree(self.data_dir, ignore_errors=True)
+
+
+class UserSessionStore:
+    def __init__(self, max_sessions: int = 100, ttl: float = 1800.0, max_bytes: int = 512 * 2**20,
+                 data_dir: Optional[str] = None, sweep_interval: float = 600.0,
+                 factory: Callable[[Optional[str]], UserSession] = UserSession):
+        """
+        按会话 ID 保存每个用户的状态，闲置的会话按 LRU 和 TTL 淘汰
+        :param max_sessions: 最多保留的会话数
+        :param ttl: 闲置超过这么多秒的会话被删除
+        :param max_bytes: 所有会话数据的内存上限，超过时先删最久未用的会话
+        :param data_dir: 各会话目录的上级目录，None 表示会话没有自己的目录
+        :param sweep_interval: 清理无主会话目录的最短间隔（秒），启动时清理一次，之后在创建会话时按间隔清理
+        :param factory: 创建新会话状态的函数，参数为会话目录
+        """
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.data_dir = data_dir
+        self.factory = factory
+        self._lock = threading.Lock()
+        # 会话 ID -> 状态，越靠后越近被使用
+        self._sessions: "OrderedDict[str, UserSession]" = OrderedDict()
+        self.total_bytes = 0
+        self.sweep_interval = sweep_interval
+        self.stats = {'created': 0, 'expired': 0, 'evicted': 0, 'swept': 0}
+        # 关闭浏览器和删除 Chrome 用户目录较慢，在后台线程中依次进行，不阻塞调用者（事件循环）
+        self._closer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="session-close")
+        self._closing: Set[Future] = set()
+        # 页面刷新会换新的会话 ID、进程重启会丢失所有会话，留下的目录只能靠定期清理
+        self._last_sweep = 0.0
+        if data_dir:
+            self.sweep()
+
+    def get(self, session_id: str) -> UserSession:
+        """
+        取得会话状态，不存在时创建；同时淘汰过期和超出上限的其它会话
+        """
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None:
+                session = self.factory(self.session_dir(session_id))
+                self._sessions[session_id] = session
+                self.stats['created'] += 1
+                sweep = self.data_dir and time.time() - self._last_sweep > self.sweep_interval
+            else:
+                sweep = False
+            session.last_used = time.time()
+            self._sessions.move_to_end(session_id)
+            removed = self._evict(keep=session_id)
+        self._close(removed)
+        if sweep:
+            self.sweep()
+        return session
+
+    def session_dir(self, session_id: str) -> Optional[str]:
+        """
+        新会话的目录；带随机后缀，同一个会话 ID 被淘汰后再次使用时不会与尚未删除的旧目录冲突
+        """
+        if not self.data_dir:
+            return None
+        name = re.sub(r'[^0-9A-Za-z_-]', '_', session_id)
+        return os.path.join(self.data_dir, f"{name}-{uuid.uuid4().hex[:8]}")
+
+    def update(self, session_id: str):
+        """
+        会话的衣橱或分析文本变化后调用：重新估计该会话的内存并检查上限
+        """
+        session = self._sessions.get(session_id)
+        if session is None:
+            return
+        size = session.memory_bytes()
+        with self._lock:
+            if self._sessions.get(session_id) is session:
+                self.total_bytes += size - session.size_bytes
+                session.size_bytes = size
+            removed = self._evict(keep=session_id)
+        self._close(removed)
+
+    def _close(self, removed: Iterable[UserSession]):
+        for session in removed:
+            future = self._closer.submit(session.close)
+            self._closing.add(future)
+            future.add_done_callback(self._closing.discard)
+
+    def sweep(self, max_age: Optional[float] = None) -> Future:
+        """
+        在后台线程中删除没有对应会话、超过 max_age 秒未修改的会话目录
+        :param max_age: 目录的最长闲置时间，默认为会话的 TTL
+        :return: 完成时结果为删除的目录数
+        """
+        self._last_sweep = time.time()
+        future = self._closer.submit(self._sweep, self.ttl if max_age is None else max_age)
+        self._closing.add(future)
+        future.add_done_callback(self._closing.discard)
+        return future
+
+    def _sweep(self, max_age: float) -> int:
+        if not self.data_dir or not os.path.isdir(self.data_dir):
+            return 0
+        with self._lock:
+            live = {os.path.abspath(session.data_dir) for session in self._sessions.values() if session.data_dir}
+        now = time.time()
+        removed = 0
+        for entry in os.scandir(self.data_dir):
+            if not entry.is_dir() or os.path.abspath(entry.path) in live:
+                continue
+            # Chrome 在 chrome_profile 下写文件，目录本身的修改时间不一定更新，取其直接子项中最新的
+            try:
+                mtime = max([entry.stat().st_mtime] + [child.stat().st_mtime for child in os.scandir(entry.path)])
+            except FileNotFoundError:
+                continue
+            if now - mtime > max_age:
+                shutil.rmtree(entry.path, ignore_errors=True)
+                removed += 1
+        with self._lock:
+            self.stats['swept'] += removed
+        return removed
+
+    def wait_closed(self, timeout: Optional[float] = None):
+        """
+        等待已淘汰会话的后台关闭完成
+        """
+        wait(list(self._closing), timeout=timeout)
+
+    def _evict(self, keep: str):
+        removed = []
+        now = time.time()
+        # 按最近使用排序，过期的会话都在最前面；正在爬取的会话跳过，等爬取结束后再淘汰
+        for session_id, session in list(self._sessions.items()):
+            if now - session.last_used <= self.ttl:
+                break
+            if session_id != keep and not session.is_busy:
+                removed.append(self._pop(session_id))
+                self.stats['expired'] += 1
+
+        for session_id, session in list(self._sessions.items()):
+            if len(self._sessions) <= self.max_sessions and self.total_bytes <= self.max_bytes:
+                break
+            if session_id == keep or session.is_busy:
+                continue
+            removed.append(self._pop(session_id))
+            self.stats['evicted'] += 1
+        return removed
+
+    def _pop(self, session_id: str) -> UserSession:
+        session = self._sessions.pop(session_id)
+        self.total_bytes -= session.size_bytes
+        return session
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def __contains__(self, session_id: str) -> bool:
+        return session_id in self._sessions
@@ -0,0 +1,229 @@
+import random
+import sys
+import time
+from pathlib import Path
+
+import pandas as pd
+
+# 添加项目根目录到 Python 路径
+sys.path.append(str(Path(__file__).parent.parent))
+
+import tempfile
+
+from src.utils.data_processor import DataProcessor, WardrobeStore, WardrobeDB
+
+COLORS = ['白色', '黑色', '浆果玫红', '雾霾蓝', '杏色', '灰色【加绒】', '卡其色,偏深']
+SIZES = ['S', 'M', 'L', 'XL', 'M[【建议100--109斤】]', '均码(90-130斤)']
+
+
+def make_specs(rows: int, unique: bool = False, seed: int = 0) -> pd.Series:
+    """生成合成的规格列，unique=True 时每行规格都不同"""
+    rng = random.Random(seed)
+    specs = []
+    for i in range(rows):
+        color_key = rng.choice(['颜色分类', '主要颜色'])
+        spec = f"{color_key}：{rng.choice(COLORS)}尺码：{rng.choice(SIZES)}"
+        if unique:
+            spec += f"-{i}"
+        specs.append(spec if rng.random() > 0.02 else None)
+    return pd.Series(specs)
+
+
+def timed(label: str, func, rows: int):
+    start = time.perf_counter()
+    result = func()
+    elapsed = time.perf_counter() - start
+    print(f"{label:<28} {elapsed:8.3f} 秒  {rows / elapsed:12,.0f} 行/秒")
+    return result
+
+
+def bench_extract_color_size(rows: int = 1_000_000, unique: bool = False):
+    print(f"\n=== extract_color_size（{rows:,} 行，{'每行不同' if unique else '规格重复'}）===")
+    processor = DataProcessor("data")
+    specs = make_specs(rows, unique=unique)
+
+    row_wise = timed("逐行 apply", lambda: pd.DataFrame(
+        specs.apply(processor.extract_color_size).tolist(),
+        columns=['color', 'size']
+    ), rows)
+    vectorized = timed("整列 str.extract", lambda: processor.extract_color_size_columns(specs), rows)
+    assert row_wise.equals(vectorized)
+
+
+def make_wardrobe(rows: int, seed: int = 0) -> pd.DataFrame:
+    """生成合成的已处理衣橱数据"""
+    rng = random.Random(seed)
+    return pd.DataFrame({
+        'title': [f"合成商品标题{rng.randrange(rows)}女夏季新款" for _ in range(rows)],
+        'specification': make_specs(rows, seed=seed).fillna(''),
+        'image_url': [f"https://img.alicdn.com/imgextra/i1/{i}.jpg_640x640.jpg" for i in range(rows)],
+        'price': [f"￥{rng.randint(10, 500)}.00" for _ in range(rows)],
+        'status': [rng.choice(['退款/退换货\n投诉商家', '申请售后', '查看退款']) for _ in range(rows)],
+        'type': [rng.choice(['上衣', '下装', '连衣裙/裤', '配饰']) for _ in range(rows)],
+        'style': [rng.choice(['通勤', '运动', '复古', 'unknown']) for _ in range(rows)],
+        'exposure_level': [rng.choice(['high', 'medium', 'low', 'unknown']) for _ in range(rows)],
+        'color': [rng.choice(['白色', '黑色', '浆果玫红', '灰色']) for _ in range(rows)],
+        'size': [rng.choice(['S', 'M', 'L', 'XL']) for _ in range(rows)],
+        'is_clothing': True,
+    })
+
+
+def bench_wardrobe_load(rows: int = 1_000_000):
+    print(f"\n=== 衣橱读取（{rows:,} 行）===")
+    wardrobe = make_wardrobe(rows)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        csv_path = f"{tmp_dir}/wardrobe.csv"
+        wardrobe.to_csv(csv_path, index=False, encoding='utf-8-sig')
+        store = WardrobeStore(f"{tmp_dir}/wardrobe.parquet")
+        store.save(wardrobe)
+
+        from_csv = timed("CSV 全量读取", lambda: pd.read_csv(csv_path), rows)
+        from_store = timed("Parquet 全量读取", store.load, rows)
+        timed("Parquet 上衣 + 3 列", lambda: store.load(
+            columns=['title', 'color', 'image_url'], filters=[('type', '==', '上衣')]
+        ), rows)
+    print(f"内存占用：CSV {from_csv.memory_usage(deep=True).sum() / 2**20:.1f} MB，"
+          f"Parquet {from_store.memory_usage(deep=True).sum() / 2**20:.1f} MB")
+
+
+def bench_process_data_parallel(rows: int = 1_000_000):
+    import os
+    workers = os.cpu_count() or 1
+    print(f"\n=== process_data 串行 vs {workers} 进程（{rows:,} 行）===")
+    processor = DataProcessor("data")
+    raw = make_wardrobe(rows)[['title', 'specification', 'image_url', 'price', 'status']]
+
+    serial_start = time.perf_counter()
+    serial = timed("串行 process_data", lambda: processor.process_data(raw.copy()), rows)
+    serial_elapsed = time.perf_counter() - serial_start
+
+    parallel_start = time.perf_counter()
+    parallel = timed("多进程 process_data", lambda: processor.process_data_parallel(raw.copy(), workers), rows)
+    parallel_elapsed = time.perf_counter() - parallel_start
+
+    assert serial.equals(parallel)
+    print(f"加速比 {serial_elapsed / parallel_elapsed:.2f}x")
+
+
+def bench_wardrobe_db(rows: int = 1_000_000):
+    users = max(rows // 1000, 1)
+    print(f"\n=== 候选条目查询（{rows:,} 行，{users:,} 个用户）===")
+    rng = random.Random(0)
+    wardrobe = make_wardrobe(rows).assign(
+        user=[f"user{rng.randrange(users)}" for _ in range(rows)],
+        order_id=[str(i) for i in range(rows)],
+        order_date=[f"2024-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}" for _ in range(rows)],
+    )
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db = WardrobeDB(f"{tmp_dir}/wardrobe.db")
+        by_user = dict(tuple(wardrobe.groupby('user')))
+        timed("SQLite 批量写入", lambda: [db.upsert(df.drop(columns='user'), user) for user, df in by_user.items()], rows)
+
+        def scan():
+            mask = ((wardrobe['user'] == 'user0') & (wardrobe['type'] == '上衣')
+                    & (wardrobe['color'] == '白色') & (wardrobe['order_date'] >= '2024-06-01'))
+            return wardrobe[mask]
+
+        def indexed():
+            return db.query('user0', type='上衣', color='白色', since='2024-06-01')
+
+        scanned = timed("DataFrame 全表扫描", scan, rows)
+        queried = timed("SQLite 索引查询", indexed, rows)
+        assert len(scanned) == len(queried)
+
+
+TITLE_WORDS = ['法式', '复古', '碎花', '宽松', '显瘦', '高腰', '百搭', '小个子', '韩版', '纯棉', '冰丝', '针织',
+               '气质', '通勤', '学院风', '辣妹', '设计感', '小众', 'oversize', '重磅', '新款', '夏季', '秋冬',
+               '春秋', '简约', '休闲', '运动', 'v领', '圆领', '方领', '泡泡袖', '收腰', '阔腿', '直筒', '垂感']
+TITLE_TYPES = ['连衣裙', 'T恤', '衬衫', '半身裙', '阔腿裤', '卫衣', '外套', '背心', '短裤', '牛仔裤']
+
+
+def make_titles(count: int, seed: int = 0) -> list:
+    """生成合成标题，约三成是前面某个标题加减一个词的近似重复"""
+    rng = random.Random(seed)
+    titles = []
+    for i in range(count):
+        if titles and rng.random() < 0.3:
+            words = rng.choice(titles).split(' ')
+            if rng.random() < 0.5:
+                words.insert(rng.randrange(len(words)), rng.choice(TITLE_WORDS))
+            else:
+                words.pop(rng.randrange(len(words) - 1))
+        else:
+            words = rng.sample(TITLE_WORDS, 6) + [rng.choice(TITLE_TYPES) + '女']
+        titles.append(' '.join(words))
+    return titles
+
+
+def bench_title_dedup(sizes=(2_000, 5_000, 50_000)):
+    print("\n=== 近似重复标题分组：两两比较 vs MinHash/LSH ===")
+    processor = DataProcessor("data")
+    dedup = processor.deduplicator
+    for count in sizes:
+        titles = make_titles(count)
+        groups = timed(f"LSH 分组 {count:,} 个标题", lambda: dedup.group(titles), count)
+        if count <= 5_000:
+            def all_pairs():
+                shingles = [dedup.shingles(title) for title in titles]
+                return sum(dedup.jaccard(shingles[i], shingles[j]) >= dedup.threshold
+                           for i in range(count) for j in range(i))
+            timed(f"两两比较 {count:,} 个标题", all_pairs, count)
+        print(f"{count:,} 个标题 -> {len(set(groups)):,} 组")
+
+
+def bench_consolidate(rows: int = 1_000_000):
+    import json
+    print(f"\n=== 合并重复记录（{rows:,} 行）===")
+    rng = random.Random(0)
+    titles = make_titles(max(rows // 20, 1))
+    processor = DataProcessor("data")
+    raw = pd.DataFrame({
+        'title': [rng.choice(titles) for _ in range(rows)],
+        'specification': make_specs(rows).fillna(''),
+        'image_url': [f"https://img.alicdn.com/imgextra/i1/{i}.jpg_640x640.jpg" for i in range(rows)],
+        'price': '￥99.00',
+        'status': '',
+    })
+    processed = processor.process_data(raw)
+    merged = timed("consolidate", lambda: processor.consolidate(processed), len(processed))
+    sample = merged.head(1000)
+    before = len(json.dumps(processed.head(sample['purchase_count'].sum()).to_dict('records'), ensure_ascii=False))
+    after = len(json.dumps(sample.drop(columns='variants').to_dict('records'), ensure_ascii=False))
+    print(f"{len(processed):,} 条 -> {len(merged):,} 款；"
+          f"前 1000 款的提示词 JSON（不含 variants）{after:,} 字符，对应原始记录约 {before:,} 字符")
+
+
+def bench_select_candidates(sizes=(100, 1_000, 10_000, 100_000)):
+    import json
+    print("\n=== 候选筛选前后的提示词大小 ===")
+    processor = DataProcessor("data")
+    for count in sizes:
+        raw = pd.DataFrame({
+            'title': make_titles(count),
+            'specification': make_specs(count).fillna(''),
+            'image_url': [f"https://img.alicdn.com/imgextra/i1/{i}.jpg_640x640.jpg" for i in range(count)],
+            'price': '￥99.00',
+            'status': '',
+        })
+        wardrobe = processor.process_data(raw)
+        selected = timed(f"select_candidates {len(wardrobe):,} 件",
+                         lambda: processor.select_candidates(wardrobe, "sporty", temperature=28), len(wardrobe))
+        before = len(json.dumps(wardrobe.to_dict('records'), ensure_ascii=False, indent=2))
+        after = len(json.dumps(selected.to_dict('records'), ensure_ascii=False, indent=2))
+        print(f"提示词 JSON：{before:,} 字符 -> {after:,} 字符")
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    bench_extract_color_size(rows)
+    bench_extract_color_size(rows, unique=True)
+    bench_wardrobe_load(rows)
+    bench_process_data_parallel(rows)
+    bench_wardrobe_db(rows)
+    bench_title_dedup()
+    bench_consolidate(rows)
+    bench_select_candidates()
+
+
+if __name__ == "__main__":
+    main()
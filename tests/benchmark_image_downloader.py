@@ -0,0 +1,82 @@
+import asyncio
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import requests
+
+# 添加项目根目录到 Python 路径
+sys.path.append(str(Path(__file__).parent.parent))
+
+from src.utils.image_cache import ImageCache
+from src.utils.image_downloader import download_images
+from tests.image_server import ImageServer, jpeg_bytes
+
+
+def timed(label: str, func, count: int):
+    start = time.perf_counter()
+    result = func()
+    elapsed = time.perf_counter() - start
+    print(f"{label:<28} {elapsed:8.3f} 秒  {count / elapsed:10,.1f} 张/秒")
+    return result
+
+
+def download_sequential(urls, output_dir: str):
+    """原来的做法：逐个 requests.get，不复用连接"""
+    for url in urls:
+        response = requests.get(url, timeout=10)
+        if response.status_code == 200:
+            filename = os.path.join(output_dir, f"{hash(url)}.jpg")
+            with open(filename, "wb") as f:
+                f.write(response.content)
+
+
+def bench_download(count: int = 200, latency: float = 0.05):
+    print(f"\n=== 图片下载（{count} 张，每个请求延迟 {latency * 1000:.0f} ms）===")
+    with ImageServer(latency=latency) as server, tempfile.TemporaryDirectory() as tmp_dir:
+        urls = [server.url(f"/img/{i}.jpg") for i in range(count)]
+        timed("逐个 requests.get", lambda: download_sequential(urls, tmp_dir), count)
+
+        cache_dir = os.path.join(tmp_dir, "images")
+        paths = timed("异步并发 16", lambda: download_images(urls, cache_dir, concurrency=16, per_host=16), count)
+        assert all(paths.values())
+        requests_before = sum(server.requests.values())
+        timed("重复运行（全部命中）", lambda: download_images(urls, cache_dir), count)
+        assert sum(server.requests.values()) == requests_before
+
+
+def load_in_browser(urls, connections: int = 6) -> int:
+    """模拟浏览器加载画廊：每个域名 6 个连接，返回传输的字节数"""
+    session = requests.Session()
+    with ThreadPoolExecutor(max_workers=connections) as executor:
+        return sum(executor.map(lambda url: len(session.get(url, timeout=10).content), urls))
+
+
+def bench_gallery(count: int = 300, latency: float = 0.05):
+    print(f"\n=== 画廊加载（{count} 件，每个请求延迟 {latency * 1000:.0f} ms）===")
+    with ImageServer(latency=latency, jpeg=True) as server, tempfile.TemporaryDirectory() as tmp_dir:
+        urls = [server.url(f"/img/{i}.jpg_640x640.jpg") for i in range(count)]
+        # 预先生成服务器端图片，计时只包含传输和缩放
+        for i in range(count):
+            jpeg_bytes(f"{i}.jpg_640x640.jpg")
+            jpeg_bytes(f"{i}.jpg_300x300.jpg")
+        remote_bytes = timed("浏览器加载远程原图", lambda: load_in_browser(urls), count)
+
+        cache = ImageCache(tmp_dir)
+        timed("首次生成缩略图", lambda: asyncio.run(cache.thumbnails(urls)), count)
+        thumbs = timed("缩略图缓存命中", lambda: asyncio.run(cache.thumbnails(urls)), count)
+        thumb_bytes = sum(os.path.getsize(path) for path in thumbs)
+        print(f"传输量：原图 {remote_bytes / 2**20:.1f} MB，缩略图 {thumb_bytes / 2**20:.1f} MB")
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    bench_download(count)
+    bench_gallery(count)
+
+
+if __name__ == "__main__":
+    main()
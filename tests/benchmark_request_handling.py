@@ -0,0 +1,72 @@
+import asyncio
+import statistics
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import httpx
+
+# 添加项目根目录到 Python 路径
+sys.path.append(str(Path(__file__).parent.parent))
+
+from src.utils.request_limiter import RequestLimiter
+from tests.image_server import ImageServer
+
+
+def report(label: str, latencies, elapsed: float):
+    latencies = sorted(latencies)
+    p95 = latencies[int(len(latencies) * 0.95) - 1]
+    print(f"{label:<32} {elapsed:7.2f} 秒  {len(latencies) / elapsed:7.1f} 请求/秒  "
+          f"p50 {statistics.median(latencies):6.2f} 秒  p95 {p95:6.2f} 秒")
+
+
+def old_wrapper(url: str, submitted: float) -> float:
+    """原来的做法：每次点击新建事件循环，连接随循环一起丢弃"""
+    async def call_model():
+        async with httpx.AsyncClient() as client:
+            (await client.get(url)).raise_for_status()
+
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    loop.run_until_complete(call_model())
+    loop.close()
+    return time.perf_counter() - submitted
+
+
+def bench_old(url: str, users: int, workers: int):
+    """Gradio 在线程池中调用同步处理函数，workers 即事件的 concurrency_limit"""
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        latencies = list(executor.map(lambda _: old_wrapper(url, start), range(users)))
+    report(f"新建事件循环（并发 {workers}）", latencies, time.perf_counter() - start)
+
+
+async def bench_native(url: str, users: int, concurrency: int):
+    """原生协程处理函数：共用服务器的事件循环和连接池，由 RequestLimiter 限流"""
+    limiter = RequestLimiter(concurrency=concurrency, queue_depth=users)
+    async with httpx.AsyncClient(limits=httpx.Limits(max_connections=concurrency)) as client:
+        async def handler(submitted: float) -> float:
+            async with limiter.slot():
+                (await client.get(url)).raise_for_status()
+            return time.perf_counter() - submitted
+
+        start = time.perf_counter()
+        latencies = await asyncio.gather(*(handler(start) for _ in range(users)))
+        report(f"原生协程（并发 {concurrency}）", latencies, time.perf_counter() - start)
+
+
+def main():
+    users = int(sys.argv[1]) if len(sys.argv) > 1 else 64
+    latency = 0.2
+    print(f"=== {users} 个用户同时点击推荐，模型调用耗时 {latency * 1000:.0f} ms ===")
+    with ImageServer(latency=latency, image_size=4 * 1024) as server:
+        url = server.url("/img/reply.jpg")
+        bench_old(url, users, workers=1)
+        bench_old(url, users, workers=8)
+        asyncio.run(bench_native(url, users, concurrency=8))
+        asyncio.run(bench_native(url, users, concurrency=32))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,194 @@
+"""
+测试用的 WebDriver 替身，在保存的页面上模拟已买到的宝贝页面，不需要 Chrome
+
+页面约定：
+    pages     每页的 HTML，点击未禁用的 li.pagination-next 时切换到下一页，旧页面的元素随之失效
+    responses 每页的订单列表接口响应，加载该页时出现在 performance 日志中
+    session_cookies  登录态有效所需的 cookies，浏览器缺少时打开订单页会被重定向到登录页
+"""
+import json
+from typing import Dict, List, Optional
+
+from bs4 import BeautifulSoup
+from selenium.common.exceptions import NoSuchElementException, StaleElementReferenceException
+from selenium.webdriver.common.by import By
+
+from src.utils.taobao_crawler import BOUGHT_ITEMS_URL, _element_text
+
+LOGIN_URL = 'https://login.taobao.com/member/login.jhtml'
+
+# 翻页时浏览器请求的订单列表接口
+ASYNC_BOUGHT_URL = 'https://buyertrade.taobao.com/trade/itemlist/asyncBought.htm'
+
+# element_sample.html 中的订单号和下单日期，拼页面时替换
+SAMPLE_ORDER_ID = '4308453648207015347'
+SAMPLE_ORDER_DATE = '2025-04-20'
+
+
+def orders_page(sample_html: str, orders: List[tuple], has_next: bool) -> str:
+    """
+    用样例订单拼出一页
+    :param sample_html: 单个订单容器的 HTML（element_sample.html）
+    :param orders: (订单号, 下单日期) 列表，按页面顺序
+    :param has_next: "下一页"按钮是否可用
+    """
+    containers = ''.join(
+        sample_html.replace(SAMPLE_ORDER_ID, order_id).replace(SAMPLE_ORDER_DATE, order_date)
+        for order_id, order_date in orders
+    )
+    pagination = 'pagination-next' if has_next else 'pagination-next pagination-disabled'
+    return f'<html><body>{containers}<ul><li class="{pagination}"><a>下一页</a></li></ul></body></html>'
+
+
+def _find(root, by: str, value: str):
+    if by == By.CLASS_NAME:
+        return root.find_all(class_=value)
+    if by == By.CSS_SELECTOR:
+        return root.select(value)
+    if by == By.TAG_NAME:
+        return root.find_all(value)
+    raise ValueError(f"不支持的定位方式: {by}")
+
+
+class FakeElement:
+    def __init__(self, driver: "FakeDriver", node, page: int):
+        self.driver = driver
+        self.node = node
+        self.page = page
+
+    def _check(self):
+        if self.page != self.driver.page:
+            raise StaleElementReferenceException("页面已切换")
+
+    @property
+    def text(self) -> str:
+        self._check()
+        return _element_text(self.node)
+
+    def get_attribute(self, name: str):
+        self._check()
+        value = self.node.get(name)
+        if isinstance(value, list):
+            return ' '.join(value)
+        # 与浏览器一致，返回补全协议后的地址
+        if name == 'src' and value and value.startswith('//'):
+            return 'https:' + value
+        return value
+
+    def is_enabled(self) -> bool:
+        self._check()
+        return True
+
+    def click(self):
+        self._check()
+        if 'pagination-next' in self.node.get('class', []):
+            self.driver.page += 1
+            self.driver.clicks += 1
+
+    def find_element(self, by: str, value: str) -> "FakeElement":
+        elements = self.find_elements(by, value)
+        if not elements:
+            raise NoSuchElementException(value)
+        return elements[0]
+
+    def find_elements(self, by: str, value: str) -> List["FakeElement"]:
+        self._check()
+        return [FakeElement(self.driver, node, self.page) for node in _find(self.node, by, value)]
+
+
+class FakeDriver:
+    def __init__(self, pages: List[str], responses: Optional[List[str]] = None,
+                 session_cookies: Optional[Dict[str, str]] = None):
+        self.pages = pages
+        self.responses = responses or []
+        self.session_cookies = session_cookies or {}
+        # 浏览器中的 cookies：名字 -> 值；added 按顺序记录写入过的值
+        self.cookies: Dict[str, str] = {}
+        self.added: List[str] = []
+        self.page = 0
+        self.clicks = 0
+        self.current_url = BOUGHT_ITEMS_URL
+        self._soups = {}
+        # 已通过 get_log 读出的页数，与浏览器一样每条日志只返回一次
+        self._logged_pages = 0
+
+    @property
+    def page_source(self) -> str:
+        return self.pages[self.page]
+
+    def _root(self):
+        if self.current_url != BOUGHT_ITEMS_URL:
+            return BeautifulSoup('', 'lxml')
+        if self.page not in self._soups:
+            self._soups[self.page] = BeautifulSoup(self.pages[self.page], 'lxml')
+        return self._soups[self.page]
+
+    def find_element(self, by: str, value: str) -> FakeElement:
+        elements = self.find_elements(by, value)
+        if not elements:
+            raise NoSuchElementException(value)
+        return elements[0]
+
+    def find_elements(self, by: str, value: str) -> List[FakeElement]:
+        return [FakeElement(self, node, self.page) for node in _find(self._root(), by, value)]
+
+    def execute_script(self, script: str, container_class: str, selectors: Dict[str, str]) -> List[Dict]:
+        """
+        按 EXTRACT_ORDERS_SCRIPT 的逻辑在当前页提取订单（innerText 用 WebElement.text 的规则近似）
+        """
+        orders = []
+        for container in self._root().find_all(class_=container_class):
+            trade_order = container.select_one('[data-id]')
+            order_date = container.select_one(selectors['date'])
+            for item in container.find_all('tbody')[1:]:
+                fields = {name: item.select_one(selectors[name])
+                          for name in ('title', 'spec', 'image', 'price', 'status')}
+                if not all(fields.values()):
+                    continue
+                orders.append({
+                    'title': _element_text(fields['title']),
+                    'specification': _element_text(fields['spec']),
+                    'image_url': FakeElement(self, fields['image'], self.page).get_attribute('src'),
+                    'price': _element_text(fields['price']),
+                    'status': _element_text(fields['status']),
+                    'order_id': trade_order.get('data-id', '') if trade_order else '',
+                    'order_date': _element_text(order_date) if order_date else '',
+                })
+        return orders
+
+    def get_log(self, log_type: str) -> List[Dict]:
+        """
+        返回上次读取之后加载的页面产生的网络日志：每页一条图片请求和一条订单列表响应
+        """
+        entries = []
+        for page in range(self._logged_pages, min(self.page + 1, len(self.responses))):
+            url = BOUGHT_ITEMS_URL if page == 0 else ASYNC_BOUGHT_URL
+            for request_id, response_url in ((f"img-{page}", "https://img.alicdn.com/a.jpg"), (str(page), url)):
+                message = {'method': 'Network.responseReceived',
+                           'params': {'requestId': request_id, 'response': {'url': response_url}}}
+                entries.append({'message': json.dumps({'message': message})})
+        self._logged_pages = max(self._logged_pages, self.page + 1)
+        return entries
+
+    def execute_cdp_cmd(self, cmd: str, params: Dict) -> Dict:
+        if cmd == 'Network.getResponseBody':
+            return {'body': self.responses[int(params['requestId'])], 'base64Encoded': False}
+        if cmd == 'Network.clearBrowserCookies':
+            self.cookies.clear()
+        return {}
+
+    def get(self, url: str):
+        logged_in = all(self.cookies.get(name) == value for name, value in self.session_cookies.items())
+        self.current_url = LOGIN_URL if url == BOUGHT_ITEMS_URL and not logged_in else url
+        self.page = 0
+
+    def add_cookie(self, cookie: Dict):
+        self.cookies[cookie['name']] = cookie['value']
+        self.added.append(cookie['value'])
+
+    def get_cookies(self) -> List[Dict]:
+        return [{'name': name, 'value': value, 'domain': '.taobao.com', 'path': '/'}
+                for name, value in self.cookies.items()]
+
+    def delete_all_cookies(self):
+        self.cookies.clear()
@@ -0,0 +1,134 @@
+"""
+测试和基准用的本地图片服务器，代替淘宝图片 CDN
+
+路径约定：
+    /img/<name>.jpg        正常返回，内容由 name 决定，支持 Range
+                           jpeg=True 时返回真实的 JPEG，name 带 _WxH.jpg 后缀时按该尺寸生成
+    /flaky/<name>.jpg      前 fail_times 次返回 503
+    /truncate/<name>.jpg   第一次只发送一半内容就断开连接
+    其它路径              返回 404
+"""
+import hashlib
+import io
+import random
+import re
+import threading
+import time
+from collections import Counter
+from functools import lru_cache
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from PIL import Image
+
+SIZE_SUFFIX_PATTERN = re.compile(r'_(\d+)x(\d+)\.jpg$')
+
+
+def image_bytes(name: str, size: int = 32 * 1024) -> bytes:
+    """
+    根据名字生成固定的图片内容
+    """
+    seed = hashlib.sha256(name.encode('utf-8')).digest()
+    return (seed * (size // len(seed) + 1))[:size]
+
+
+@lru_cache(maxsize=1024)
+def jpeg_bytes(name: str, default_size: int = 640) -> bytes:
+    """
+    根据名字生成固定的 JPEG 图片，模拟 CDN 的尺寸后缀
+    """
+    match = SIZE_SUFFIX_PATTERN.search(name)
+    width, height = (int(match.group(1)), int(match.group(2))) if match else (default_size, default_size)
+    seed = hashlib.sha256(SIZE_SUFFIX_PATTERN.sub('', name).encode('utf-8')).digest()
+    noise = random.Random(seed).randbytes(width * height)
+    img = Image.frombytes('L', (width, height), noise).convert('RGB')
+    img = Image.blend(img, Image.new('RGB', (width, height), tuple(seed[:3])), 0.7)
+    buffer = io.BytesIO()
+    img.save(buffer, 'JPEG', quality=90)
+    return buffer.getvalue()
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            server.requests[self.path] += 1
+            count = server.requests[self.path]
+        if server.latency:
+            time.sleep(server.latency)
+
+        kind, _, name = self.path.strip('/').partition('/')
+        if kind not in ('img', 'flaky', 'truncate') or not name:
+            return self._send(404, b'')
+        if kind == 'flaky' and count <= server.fail_times:
+            return self._send(503, b'')
+
+        body = jpeg_bytes(name) if server.jpeg else image_bytes(name, server.image_size)
+        start = 0
+        range_header = self.headers.get('Range')
+        if range_header and range_header.startswith('bytes='):
+            start = int(range_header[len('bytes='):].split('-')[0])
+            if start >= len(body):
+                return self._send(416, b'')
+
+        status = 206 if start else 200
+        self.send_response(status)
+        self.send_header('Content-Type', 'image/jpeg')
+        self.send_header('Content-Length', str(len(body) - start))
+        if start:
+            self.send_header('Content-Range', f'bytes {start}-{len(body) - 1}/{len(body)}')
+        self.end_headers()
+        if kind == 'truncate' and count == 1:
+            self.wfile.write(body[:len(body) // 2])
+            self.wfile.flush()
+            self.close_connection = True
+            return
+        self.wfile.write(body[start:])
+
+    def _send(self, status: int, body: bytes):
+        self.send_response(status)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class ImageServer:
+    def __init__(self, latency: float = 0.0, fail_times: int = 2, image_size: int = 32 * 1024,
+                 jpeg: bool = False):
+        """
+        在后台线程中运行的图片服务器，可用作上下文管理器
+        :param latency: 每个请求的固定延迟秒数
+        :param fail_times: /flaky/ 路径返回 503 的次数
+        :param image_size: 每张图片的字节数
+        :param jpeg: 是否返回真实的 JPEG 图片
+        """
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', 0), _Handler)
+        self.httpd.daemon_threads = True
+        self.httpd.lock = threading.Lock()
+        self.httpd.requests = Counter()
+        self.httpd.latency = latency
+        self.httpd.fail_times = fail_times
+        self.httpd.image_size = image_size
+        self.httpd.jpeg = jpeg
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    @property
+    def requests(self) -> Counter:
+        return self.httpd.requests
+
+    def url(self, path: str) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}{path}"
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.httpd.shutdown()
+        self.httpd.server_close()
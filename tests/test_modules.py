@@ -1,15 +1,43 @@
+import asyncio
+import importlib
+import json
 import os
 import sys
+import types
 from pathlib import Path
 
+import pytest
+
 # 添加项目根目录到 Python 路径
 sys.path.append(str(Path(__file__).parent.parent))
 
 # from src.utils.data_processor import DataProcessor
+from src.utils.image_downloader import ImageDownloader
+from src.utils.image_cache import ImageCache
+from src.utils.recommendation_cache import RecommendationCache
+from src.utils.request_limiter import QueueFullError, RequestLimiter
+from src.utils.streaming_reply import PENDING_REASON, streamed_images, streamed_reason
+from src.utils.user_sessions import UserSession, UserSessionStore
+from src.agents.wardrobe_serializer import WardrobeSerializer
+from tests.image_server import ImageServer, image_bytes
+from tests.fake_driver import FakeDriver, orders_page
 # from src.models.clothing_analyzer import ClothingAnalyzer
 # from src.rules.fashion_rules import FashionRulesEngine, Style, ClothingItem
 # from src.agents.fashion_agent import FashionAgent
-from src.utils.taobao_crawler import TaobaoCrawler
+from src.utils.taobao_crawler import (
+    TaobaoCrawler, OrderIndex, SessionStore,
+    parse_bought_items_response, parse_cookie_string, parse_orders_file
+)
+from src.utils.crawler_pool import CrawlerPool
+from src.utils.data_processor import DataProcessor, WardrobeStore, WardrobeDB
+
+SAMPLE_HTML = Path(__file__).parent.parent / "element_sample.html"
+FIXTURES_DIR = Path(__file__).parent / "fixtures"
+
+def sample_items(repeat: int = 1):
+    """样例页面和接口响应中的购买记录，重复 repeat 次"""
+    body = (FIXTURES_DIR / "bought_items_response.json").read_text(encoding="utf-8")
+    return (parse_orders_file(str(SAMPLE_HTML)) + parse_bought_items_response(body)) * repeat
 
 def test_taobao_crawler():
     print("\n=== Testing Taobao Crawler ===")
@@ -41,6 +69,947 @@ def test_taobao_crawler():
         print("2. 指定时间范围内没有购买记录")
         print("3. 网页结构可能发生变化")
 
+def test_parse_orders_html():
+    print("\n=== Testing Offline Order Parser ===")
+    items = parse_orders_file(str(SAMPLE_HTML))
+    assert items == [{
+        'title': '灰色运动短裤女居家松紧带热裤 [交易快照]',
+        'specification': '颜色分类：白色尺寸：M[【建议100--109斤】]',
+        'image_url': 'https://img.alicdn.com/imgextra/i1/2874814717/O1CN01FsIfaq1kiRAC9cob4_!!2874814717.jpg_80x80.jpg',
+        'price': '￥39.80',
+        'status': '退款/退换货\n投诉商家',
+        'order_id': '4308453648207015347',
+        'order_date': '2025-04-20'
+    }]
+
+def test_order_index(tmp_path):
+    print("\n=== Testing Order Index ===")
+    index_path = str(tmp_path / "seen_orders.json")
+    index = OrderIndex(index_path)
+    assert "4308453648207015347" not in index
+
+    index.add(parse_orders_file(str(SAMPLE_HTML)))
+    index.save()
+
+    reloaded = OrderIndex(index_path)
+    assert "4308453648207015347" in reloaded
+    assert "" not in reloaded
+    assert len(reloaded) == 1
+
+def test_session_store(tmp_path):
+    print("\n=== Testing Session Store ===")
+    cookies = parse_cookie_string('t=abc; _tb_token_=11105e3e9ed5; sn=; uc3=vt3=F8dD&lg2=VT5L')
+    assert [c['name'] for c in cookies] == ['t', '_tb_token_', 'sn', 'uc3']
+    assert cookies[3]['value'] == 'vt3=F8dD&lg2=VT5L'
+    assert all(c['domain'] == '.taobao.com' for c in cookies)
+
+    store = SessionStore(str(tmp_path / "session.json"))
+    assert store.load() == []
+    store.save(cookies)
+    assert store.load() == cookies
+    store.clear()
+    assert store.load() == []
+
+def test_parse_bought_items_response():
+    print("\n=== Testing Network Response Parser ===")
+    body = (FIXTURES_DIR / "bought_items_response.json").read_text(encoding="utf-8")
+    items = parse_bought_items_response(body)
+    assert [item['order_id'] for item in items] == [
+        '4308453648207015347', '4297763016101015347', '4297763016101015347'
+    ]
+
+    # 与页面解析得到的记录字段一致（标题不含[交易快照]链接文字）
+    html_item = parse_orders_file(str(SAMPLE_HTML))[0]
+    html_item['title'] = html_item['title'].replace(' [交易快照]', '')
+    assert items[0] == html_item
+    assert items[2]['status'] == '查看退款'
+
+    # 首页数据内嵌在 JSON.parse('...') 中
+    embedded = "var data = JSON.parse('" + json.dumps(body)[1:-1] + "');"
+    assert parse_bought_items_response(embedded) == items
+
+def fake_crawler(tmp_path, pages, responses=None, **kwargs):
+    """接上 FakeDriver、路径都在 tmp_path 下的爬虫"""
+    crawler = TaobaoCrawler(cookie="", user_data_dir=str(tmp_path / "chrome_profile"),
+                            session_path=str(tmp_path / "session.json"),
+                            order_index_path=str(tmp_path / "seen_orders.json"), **kwargs)
+    sample = SAMPLE_HTML.read_text(encoding="utf-8")
+    crawler.driver = FakeDriver([orders_page(sample, orders, i + 1 < len(pages)) for i, orders in enumerate(pages)],
+                                responses)
+    return crawler
+
+def test_iter_purchase_history(tmp_path):
+    print("\n=== Testing Purchase History Pagination ===")
+    from datetime import date, timedelta
+    day = lambda n: (date.today() - timedelta(days=n)).isoformat()
+    pages = [
+        [("1001", day(1)), ("1002", day(2))],
+        [("1003", day(5)), ("1004", day(40))],
+        [("1005", day(50))],
+    ]
+    order_ids = lambda result: [[order['order_id'] for order in page] for page in result]
+
+    # 没有停止条件时逐页产出，直到最后一页
+    crawler = fake_crawler(tmp_path, pages)
+    result = list(crawler.iter_purchase_history(days=365))
+    assert order_ids(result) == [["1001", "1002"], ["1003", "1004"], ["1005"]]
+    assert crawler.driver.clicks == 2 and crawler.pages_crawled == 3
+
+    # 遇到第一个超出天数的订单即停止，不再点击下一页
+    crawler = fake_crawler(tmp_path, pages)
+    result = list(crawler.iter_purchase_history(days=30))
+    assert order_ids(result) == [["1001", "1002"], ["1003"]]
+    assert crawler.driver.clicks == 1
+
+    # html 方式与逐个元素查找结果一致（它先翻页再解析，停止时会多加载一页）
+    crawler = fake_crawler(tmp_path, pages)
+    assert list(crawler.iter_purchase_history(days=30, mode="html")) == result
+    assert crawler.driver.clicks == 2
+
+    # 增量抓取：遇到第一个已保存的订单号即停止
+    crawler = fake_crawler(tmp_path, pages)
+    crawler.mark_seen([{'order_id': "1003"}])
+    result = list(crawler.iter_purchase_history(days=365, incremental=True))
+    assert order_ids(result) == [["1001", "1002"]]
+    assert crawler.driver.clicks == 1
+
+    # 达到 max_pages 时不再翻页
+    crawler = fake_crawler(tmp_path / "fresh", pages)
+    assert order_ids(crawler.iter_purchase_history(days=365, max_pages=1)) == [["1001", "1002"]]
+    assert crawler.driver.clicks == 0
+
+def test_purchase_history_modes(tmp_path):
+    print("\n=== Testing Script and Network Extraction ===")
+    from datetime import date, timedelta
+    day = lambda n: (date.today() - timedelta(days=n)).isoformat()
+    pages = [[("1001", day(1)), ("1002", day(2))], [("1003", day(5))]]
+
+    # 注入脚本一次取回整页，结果与逐个元素查找一致
+    expected = list(fake_crawler(tmp_path, pages).iter_purchase_history(mode="selenium"))
+    assert [len(page) for page in expected] == [2, 1]
+    crawler = fake_crawler(tmp_path, pages)
+    assert list(crawler.iter_purchase_history(mode="script")) == expected
+    assert [stat['mode'] for stat in crawler.extraction_stats] == ["script", "script"]
+
+    # 网络方式读取每页的订单列表响应：首页数据内嵌在页面中，翻页后来自 asyncBought 接口
+    body = (FIXTURES_DIR / "bought_items_response.json").read_text(encoding="utf-8")
+    second = json.loads(body)
+    for main_order in second['mainOrders']:
+        main_order['id'] = "9" + main_order['id']
+    responses = ["var data = JSON.parse('" + json.dumps(body)[1:-1] + "');", json.dumps(second)]
+    crawler = fake_crawler(tmp_path, pages, responses, capture_network=True)
+    result = list(crawler.iter_purchase_history(days=3650, mode="network"))
+    assert result == [parse_bought_items_response(body), parse_bought_items_response(responses[1])]
+    assert result[1][0]['order_id'] == "94308453648207015347"
+
+    # 没有开启网络日志时不能使用网络方式
+    with pytest.raises(ValueError):
+        list(fake_crawler(tmp_path, pages, responses).iter_purchase_history(mode="network"))
+
+def test_restore_session(tmp_path):
+    print("\n=== Testing Session Restore ===")
+    good = [{'name': 't', 'value': 'good', 'domain': '.taobao.com', 'path': '/'}]
+    stale = [{'name': 't', 'value': 'stale', 'domain': '.taobao.com', 'path': '/'}]
+
+    def crawler_with(saved, cookie, profile_logged_in=False):
+        crawler = fake_crawler(tmp_path, [[("1001", "2025-04-20")]])
+        crawler.driver.session_cookies = {'t': 'good'}
+        if profile_logged_in:
+            crawler.driver.cookies['t'] = 'good'
+        crawler.cookie = cookie
+        crawler.session_store.clear()
+        if saved:
+            crawler.session_store.save(saved)
+        crawler.login_with_qr_code = lambda: "qr"
+        return crawler
+
+    # Chrome 用户目录中的登录态有效时不写入任何 cookie
+    crawler = crawler_with(stale, "t=bad", profile_logged_in=True)
+    assert crawler.restore_session() and crawler.driver.added == []
+
+    # 其次是会话文件，有效时不再使用 Cookie 字符串，并刷新会话文件
+    crawler = crawler_with(good, "t=bad")
+    assert crawler.login() is True
+    assert crawler.driver.added == ["good"]
+    assert crawler.session_store.load()[0]['value'] == "good"
+
+    # 会话文件失效时删除它，改用 Cookie 字符串，成功后保存为新的会话文件
+    crawler = crawler_with(stale, "t=good")
+    assert crawler.restore_session()
+    assert crawler.driver.added == ["stale", "good"]
+    assert crawler.session_store.load()[0]['value'] == "good"
+
+    # 都失效时 login() 退回扫码登录
+    crawler = crawler_with(stale, "t=bad")
+    assert crawler.login() == "qr"
+    assert crawler.driver.added == ["stale", "bad"]
+    assert crawler.session_store.load() == []
+    crawler = crawler_with(None, None)
+    assert not crawler.restore_session() and crawler.driver.added == []
+
+    # 切换账号：清除浏览器 cookies，换用该账号的会话文件和订单号索引
+    crawler = crawler_with(good, None)
+    assert crawler.restore_session()
+    crawler.mark_seen([{'order_id': "1001"}])
+    crawler.switch_account("t=other", session_path=str(tmp_path / "other_session.json"),
+                           order_index_path=str(tmp_path / "other_seen.json"))
+    assert crawler.driver.cookies == {} and crawler.cookie == "t=other"
+    assert crawler.session_store.load() == [] and "1001" not in crawler.order_index
+    assert not crawler.restore_session() and crawler.driver.added[-1] == "other"
+
+class FakeCrawler:
+    """不启动浏览器的爬虫替身，每次抓取计一页"""
+    def __init__(self, slot):
+        self.slot = slot
+        self.pages_crawled = 0
+        self.closed = False
+        self.cookie = None
+
+    def start(self):
+        pass
+
+    def is_healthy(self):
+        return not self.closed
+
+    def switch_account(self, cookie=None, **kwargs):
+        self.cookie = cookie
+
+    def restore_session(self):
+        return self.cookie is not None
+
+    def get_purchase_history(self, days=30, mode="html", incremental=False):
+        self.pages_crawled += 1
+        return [{'title': self.cookie, 'order_id': str(self.slot)}]
+
+    def close(self):
+        self.closed = True
+
+
+def test_crawler_pool():
+    print("\n=== Testing Crawler Pool ===")
+    accounts = {'alice': 'a', 'bob': 'b', 'carol': None, 'dave': 'd'}
+    with CrawlerPool(size=2, recycle_after_pages=2, crawler_factory=FakeCrawler) as pool:
+        results = pool.crawl_accounts(accounts)
+    assert [items[0]['title'] for items in (results['alice'], results['bob'], results['dave'])] == ['a', 'b', 'd']
+    # 没有登录态的账号失败，不影响其它账号
+    assert results['carol'] == []
+    assert pool.stats['jobs'] == 4 and pool.stats['failed'] == 1
+    assert pool.stats['recycled'] >= 1
+
+def test_crawler_pool_factory_failure():
+    print("\n=== Testing Crawler Pool Factory Failure ===")
+    def broken_factory(slot):
+        raise RuntimeError("chrome failed to start")
+
+    with CrawlerPool(size=2, crawler_factory=broken_factory) as pool:
+        # 创建浏览器失败的次数超过池大小后，新任务仍然能拿到空位
+        results = pool.crawl_accounts({f"user{i}": "c" for i in range(4)})
+    assert all(items == [] for items in results.values())
+    assert pool.stats['jobs'] == 4 and pool.stats['failed'] == 4
+
+def test_crawler_pool_mark_seen(tmp_path):
+    print("\n=== Testing Crawler Pool Order Index ===")
+    pool = CrawlerPool(size=1, data_dir=str(tmp_path), crawler_factory=FakeCrawler)
+    # 抓取本身不更新索引，保存成功后才由调用方写入
+    items = pool.submit('alice', 'a', incremental=True).result()
+    assert not (tmp_path / "alice" / "seen_orders.json").exists()
+    pool.mark_seen('alice', items)
+    assert items[0]['order_id'] in OrderIndex(str(tmp_path / "alice" / "seen_orders.json"))
+    pool.close()
+
+def test_title_classifier():
+    print("\n=== Testing Title Classifier ===")
+    import pandas as pd
+    processor = DataProcessor("data")
+    titles = pd.Series([
+        '法式复古吊带裙女夏',      # 吊带（上衣）优先于吊带裙
+        '灰色运动短裤女居家松紧带热裤',
+        '羊毛手套装饰款',          # 手套/套装首尾相接
+        '高腰半身裙通勤',
+        '帆布包',
+        '无关商品',
+    ], index=[3, 3, 1, 0, 2, 5])
+    labels = processor.classifier.classify(titles)
+    assert list(labels.index) == list(titles.index)
+    assert list(labels['type']) == ['上衣', '下装', '连衣裙/裤', '下装', '配饰', '未知']
+    assert list(labels['exposure_level']) == ['high', 'medium', 'unknown', 'unknown', 'unknown', 'unknown']
+    assert list(labels['style']) == ['复古', '运动', 'unknown', '通勤', 'unknown', 'unknown']
+    for title, row in zip(titles, labels.itertuples()):
+        assert row.exposure_level == processor.estimate_exposure(title)
+        assert row.style == processor.extract_style(title)
+
+def test_garment_attributes(tmp_path):
+    print("\n=== Testing Garment Attributes ===")
+    import sqlite3
+    import pandas as pd
+    raw = pd.DataFrame({
+        'title': ['冬季加厚羊毛外套女', '夏季冰丝短袖T恤女薄款', '春秋中厚牛仔长裤女', '运动短裤女宽松夏'],
+        'specification': '颜色分类：黑色尺码：M',
+        'image_url': '', 'price': '', 'status': '',
+    })
+    processor = DataProcessor(str(tmp_path))
+    df = processor.process_data(raw)
+    assert df['material'].tolist() == ['羊毛', '冰丝', '牛仔', 'unknown']
+    assert df['thickness'].tolist() == ['thick', 'thin', 'medium', 'unknown']
+    assert df['sleeve_length'].tolist() == ['long', 'short', 'unknown', 'unknown']
+    assert df['leg_length'].tolist() == ['unknown', 'unknown', 'long', 'short']
+    assert df['season'].tolist() == ['winter', 'summer', 'spring_autumn', 'summer']
+    assert df['warmth'].iloc[0] > df['warmth'].iloc[2] > df['warmth'].iloc[1]
+    for title, row in zip(df['title'], df.itertuples()):
+        for column in ['material', 'thickness', 'sleeve_length', 'leg_length', 'season']:
+            assert getattr(row, column) == processor.classifier.match(column, title)
+
+    assert processor.filter_by_temperature(df, 30)['title'].tolist() == df['title'].tolist()[1:]
+    assert processor.filter_by_temperature(df, 5)['title'].tolist() == df['title'].tolist()[:1] + df['title'].tolist()[2:3]
+    assert len(processor.filter_by_temperature(df, 20)) == len(df)
+    # 旧数据没有属性列时从标题提取
+    legacy = df[['title', 'type']]
+    assert processor.filter_by_temperature(legacy, 30)['title'].tolist() == df['title'].tolist()[1:]
+
+    # 旧版本的数据库自动补上新增字段
+    with sqlite3.connect(processor.metadata_db) as conn:
+        conn.execute("CREATE TABLE items (item_key TEXT PRIMARY KEY, user TEXT NOT NULL, title TEXT, "
+                     "type TEXT, analysis TEXT, updated_at TEXT NOT NULL)")
+    processor.save_metadata(df)
+    warm = processor.load_metadata(min_warmth=df['warmth'].iloc[2], columns=['title', 'warmth'])
+    assert set(warm['title']) == {'冬季加厚羊毛外套女', '春秋中厚牛仔长裤女'}
+
+def test_select_candidates():
+    print("\n=== Testing Candidate Selection ===")
+    import pandas as pd
+    titles = ['冬季加厚羊毛外套女', '运动速干短袖T恤女', '法式碎花衬衫女', '运动短裤女宽松夏',
+              '高腰直筒长裤女', '法式碎花连衣裙女夏', '帆布包', '运动卫衣女春秋']
+    raw = pd.DataFrame({'title': titles, 'specification': '颜色分类：黑色尺码：M',
+                        'image_url': '', 'price': '', 'status': ''})
+    processor = DataProcessor("data")
+    df = processor.process_data(raw)
+
+    selected = processor.select_candidates(df, "sporty", temperature=30, top_k=2)
+    # 羊毛外套按温度剔除，配饰不参与，运动风的单品排在前面
+    assert selected['title'].tolist() == ['运动速干短袖T恤女', '运动卫衣女春秋', '运动短裤女宽松夏',
+                                          '高腰直筒长裤女', '法式碎花连衣裙女夏']
+    assert processor.select_candidates(df, "法式", top_k=1)['title'].tolist() == [
+        '法式碎花衬衫女', '运动短裤女宽松夏', '法式碎花连衣裙女夏']
+    assert processor.style_keywords("碎花 长裙") == ['碎花', '长裙']
+
+def test_process_csv_chunked(tmp_path):
+    print("\n=== Testing Chunked CSV Processing ===")
+    import pandas as pd
+    items = sample_items(5)
+    input_path = tmp_path / "taobao_purchases.csv"
+    pd.DataFrame(items).to_csv(input_path, index=False, encoding='utf-8-sig')
+
+    processor = DataProcessor(str(tmp_path))
+    rows = processor.process_csv(str(input_path), str(tmp_path / "single.csv"))
+    chunked_rows = processor.process_csv(str(input_path), str(tmp_path / "chunked.csv"), chunksize=3)
+    assert rows == chunked_rows == 10
+    assert (tmp_path / "single.csv").read_bytes() == (tmp_path / "chunked.csv").read_bytes()
+
+def test_wardrobe_store(tmp_path):
+    print("\n=== Testing Wardrobe Store ===")
+    import pandas as pd
+    items = sample_items(5)
+    input_path = tmp_path / "taobao_purchases.csv"
+    pd.DataFrame(items).to_csv(input_path, index=False, encoding='utf-8-sig')
+
+    processor = DataProcessor(str(tmp_path))
+    store_path = str(tmp_path / "wardrobe.parquet")
+    assert processor.process_csv(str(input_path), store_path, chunksize=4) == 10
+    processor.process_csv(str(input_path), str(tmp_path / "processed.csv"))
+
+    store = WardrobeStore(store_path)
+    wardrobe = store.load()
+    expected = pd.read_csv(tmp_path / "processed.csv", dtype=str, keep_default_na=False)
+    assert wardrobe['type'].dtype == 'category'
+    assert list(wardrobe['title']) == list(expected['title'])
+
+    tops = store.load(columns=['title', 'color'], filters=[('type', '==', '上衣')])
+    assert list(tops.columns) == ['title', 'color']
+    assert set(tops['title']) == {'法式复古短袖衬衫女夏季新款'}
+    assert len(tops) == 5
+
+    store.append(wardrobe.head(1))
+    assert len(store.load(columns=['title'])) == 11
+
+def test_process_data_parallel():
+    print("\n=== Testing Parallel Data Processor ===")
+    import pandas as pd
+    items = sample_items(7)
+    raw = pd.DataFrame(items, index=range(100, 100 + len(items)))
+
+    processor = DataProcessor("data")
+    serial = processor.process_data(raw.copy())
+    by_rows = processor.process_data_parallel(raw.copy(), workers=2)
+    by_order = processor.process_data_parallel(raw.copy(), workers=2, partition_by='order_id')
+    pd.testing.assert_frame_equal(by_rows, serial)
+    pd.testing.assert_frame_equal(by_order, serial)
+
+def test_consolidate():
+    print("\n=== Testing Duplicate Consolidation ===")
+    import pandas as pd
+    dress = "夏季新款法式复古碎花连衣裙女"
+    rows = [
+        (dress, "颜色分类：白色尺码：M", "a.jpg"),
+        (dress, "颜色分类：白色尺码：M", "a2.jpg"),
+        (dress, "颜色分类：黑色尺码：M", "b.jpg"),
+        (dress + "小个子", "颜色分类：蓝色尺码：S", "c.jpg"),
+        ("运动短裤女宽松夏季", "颜色分类：灰色尺码：L", "d.jpg"),
+        ("纯棉短袖T恤女宽松夏季", "颜色分类：灰色尺码：L", "e.jpg"),
+    ]
+    raw = pd.DataFrame(rows, columns=["title", "specification", "image_url"]).assign(price="￥1.00", status="")
+    processor = DataProcessor("data")
+    merged = processor.consolidate(processor.process_data(raw))
+
+    assert merged['title'].tolist() == [dress, "运动短裤女宽松夏季", "纯棉短袖T恤女宽松夏季"]
+    assert merged['purchase_count'].tolist() == [4, 1, 1]
+    variants = merged['variants'].iloc[0]
+    assert [(v['color'], v['count']) for v in variants] == [("白色", 2), ("黑色", 1), ("蓝色", 1)]
+    assert variants[0]['image_url'] == "a.jpg"
+
+    # 完全不同的标题不会被合并
+    titles = [f"{i}号{chr(0x4e00 + i)}款{chr(0x5000 + i)}式上衣" for i in range(200)]
+    groups = processor.deduplicator.group(titles)
+    assert len(set(groups)) == 200
+
+def test_wardrobe_db(tmp_path):
+    print("\n=== Testing Wardrobe DB ===")
+    import sqlite3
+    import pandas as pd
+    items = sample_items()
+    processed = DataProcessor(str(tmp_path)).process_data(pd.DataFrame(items))
+
+    processor = DataProcessor(str(tmp_path))
+    assert processor.save_metadata(processed, user="alice") == len(processed)
+    db = WardrobeDB(processor.metadata_db)
+    assert db.count("alice") == len(processed)
+    assert db.count("bob") == 0
+
+    # 再次写入同样的条目只更新，分析结果不会被覆盖
+    analysed = processed.head(1).assign(analysis=[{"material": "棉"}])
+    db.upsert(analysed, user="alice")
+    db.upsert(processed, user="alice")
+    assert db.count("alice") == len(processed)
+    loaded = processor.load_metadata("alice")
+    assert loaded['analysis'].dropna().tolist() == [{"material": "棉"}]
+
+    tops = db.query("alice", type="上衣", columns=["title", "type"])
+    assert len(tops) == (processed['type'] == "上衣").sum()
+    assert set(tops['type']) <= {"上衣"}
+    dated = processed['order_date'].replace('', None).dropna()
+    if len(dated):
+        since = dated.max()
+        assert len(db.query("alice", since=since)) == (processed['order_date'] >= since).sum()
+
+    with sqlite3.connect(processor.metadata_db) as conn:
+        assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+        indexes = {row[1] for row in conn.execute("PRAGMA index_list(items)")}
+        assert {"idx_items_user_type", "idx_items_user_style", "idx_items_user_color",
+                "idx_items_user_order_date"} <= indexes
+
+def test_image_downloader(tmp_path):
+    print("\n=== Testing Image Downloader ===")
+    import asyncio
+    import hashlib
+    with ImageServer(fail_times=2) as server:
+        urls = [server.url(f"/img/{i}.jpg") for i in range(10)]
+        flaky = server.url("/flaky/a.jpg")
+        truncated = server.url("/truncate/b.png")
+        missing = server.url("/missing/c.jpg")
+        all_urls = urls + [urls[0], flaky, truncated, missing]
+
+        downloader = ImageDownloader(str(tmp_path), concurrency=4, per_host=2, backoff=0.01)
+        paths = asyncio.run(downloader.download(all_urls))
+        assert paths[missing] is None
+        assert downloader.stats == {'downloaded': 12, 'skipped': 0, 'resumed': 1, 'retried': 3, 'failed': 1,
+                                    'coalesced': 0}
+        # 文件名是内容的 sha256
+        content = image_bytes("b.png")
+        assert open(paths[truncated], 'rb').read() == content
+        assert os.path.basename(paths[truncated]) == hashlib.sha256(content).hexdigest() + ".png"
+        assert not list(tmp_path.glob("*.part"))
+
+        # 重新运行时不再请求已下载的图片
+        requests_before = sum(server.requests.values())
+        rerun = ImageDownloader(str(tmp_path), backoff=0.01)
+        again = asyncio.run(rerun.download(urls + [flaky, truncated]))
+        assert rerun.stats['skipped'] == 12
+        assert sum(server.requests.values()) == requests_before
+        assert again[urls[3]] == paths[urls[3]]
+
+def test_image_downloader_overlapping_calls(tmp_path):
+    print("\n=== Testing Overlapping Image Downloads ===")
+    import asyncio
+    with ImageServer(latency=0.02) as server:
+        urls = [server.url(f"/img/{i}.jpg") for i in range(10)]
+        downloader = ImageDownloader(str(tmp_path), concurrency=4, per_host=2)
+
+        async def run():
+            return await asyncio.gather(*(downloader.download(urls) for _ in range(3)))
+
+        results = asyncio.run(run())
+        # 三个调用共用同一批下载，每个链接只请求一次
+        assert results[0] == results[1] == results[2]
+        assert all(results[0].values())
+        assert sum(server.requests.values()) == 10
+        assert downloader.stats['coalesced'] == 20
+
+def test_image_downloader_cancelled_caller(tmp_path):
+    print("\n=== Testing Cancelled Image Download ===")
+    import asyncio
+    with ImageServer(latency=0.05) as server:
+        urls = [server.url(f"/img/{i}.jpg") for i in range(8)]
+        downloader = ImageDownloader(str(tmp_path), concurrency=4, per_host=4)
+
+        async def run():
+            first = asyncio.ensure_future(downloader.download(urls))
+            await asyncio.sleep(0.01)
+            second = asyncio.ensure_future(downloader.download(urls))
+            await asyncio.sleep(0.01)
+            first.cancel()
+            try:
+                # 第一个调用被取消后，共用的下载和客户端仍然可用
+                return await second
+            finally:
+                await downloader.aclose()
+
+        paths = asyncio.run(run())
+        assert all(paths.values())
+        assert sum(server.requests.values()) == 8
+        assert downloader.stats['coalesced'] == 8
+
+def test_image_cache(tmp_path):
+    print("\n=== Testing Image Cache ===")
+    import asyncio
+    from PIL import Image
+    with ImageServer(jpeg=True) as server:
+        urls = [server.url(f"/img/{i}.jpg_640x640.jpg") for i in range(6)]
+        cache = ImageCache(str(tmp_path), thumbnail_size=120)
+        thumbs = asyncio.run(cache.thumbnails(urls + [None]))
+        assert thumbs[-1] is None
+        # 缩略图从 CDN 的 300x300 版本生成，不下载原图
+        assert set(server.requests) == {f"/img/{i}.jpg_300x300.jpg" for i in range(6)}
+        for path in thumbs[:-1]:
+            with Image.open(path) as img:
+                assert max(img.size) == 120
+
+        full = asyncio.run(cache.full_size(urls[0]))
+        with Image.open(full) as img:
+            assert img.size == (640, 640)
+        assert asyncio.run(cache.full_size(urls[0])) == full
+        assert server.requests[f"/img/0.jpg_640x640.jpg"] == 1
+
+        # 重启后恢复 LRU 顺序，超过上限时先删除最久未用的文件
+        asyncio.run(cache.thumbnails(urls[:1]))
+        reopened = ImageCache(str(tmp_path), thumbnail_size=120)
+        assert reopened.total_bytes == cache.total_bytes
+        reopened.max_bytes = reopened.total_bytes - 1
+        reopened.evict()
+        assert reopened.stats['evicted'] == 1
+        assert os.path.exists(thumbs[0]) and os.path.exists(full)
+        assert reopened.total_bytes <= reopened.max_bytes
+
+def test_recommendation_cache(tmp_path):
+    print("\n=== Testing Recommendation Cache ===")
+    import time
+    import pandas as pd
+    wardrobe = pd.DataFrame({"title": ["白色T恤", "牛仔短裤"], "type": ["上衣", "下装"],
+                             "variants": [[{"color": "白色", "count": 1}], []]})
+    path = str(tmp_path / "recommendations.db")
+    cache = RecommendationCache(max_entries=2, ttl=60, path=path)
+    key = cache.make_key(wardrobe, "Casual 休闲", 22.0, "Happy")
+    assert cache.get(key) is None
+    cache.put(key, "result")
+
+    # 风格写法、同一温度桶和心情大小写不影响命中
+    assert cache.make_key(wardrobe, "  休闲  casual", 23.5, " happy ") == key
+    assert cache.get(cache.make_key(wardrobe, "casual", 23.9, "happy")) == "result"
+    assert cache.make_key(wardrobe, "casual", 24.0, "happy") != key
+    # 温度桶不跨过 TEMPERATURE_RULES 的阈值
+    assert cache.make_key(wardrobe, "casual", 25.0, "") != cache.make_key(wardrobe, "casual", 25.5, "")
+    # 不同的模型服务或模型不共用结果
+    assert cache.make_key(wardrobe, "casual", 22.0, "happy", api_host="github", model="gpt-4o") != \
+        cache.make_key(wardrobe, "casual", 22.0, "happy", api_host="github", model="Mistral-small")
+    assert cache.make_key(wardrobe, "casual", 22.0, "happy", api_host="github", model="gpt-4o") != \
+        cache.make_key(wardrobe, "casual", 22.0, "happy", api_host="azure", model="gpt-4o")
+    # 衣物有任何变化都不会命中旧结果
+    changed = wardrobe.assign(title=["白色T恤", "牛仔长裤"])
+    assert cache.get(cache.make_key(changed, "casual", 22.0, "happy")) is None
+    assert cache.stats['hits'] == 1 and cache.stats['misses'] == 2
+
+    # LRU 淘汰后仍能从磁盘恢复
+    cache.put("b", "b")
+    cache.put("c", "c")
+    assert len(cache) == 2 and cache.stats['evicted'] == 1
+    assert cache.get(key) == "result"
+    assert cache.stats['disk_hits'] == 1
+    cache.close()
+    reopened = RecommendationCache(path=path)
+    assert reopened.get(key) == "result"
+
+    # 过期后不再命中
+    expiring = RecommendationCache(ttl=0.01)
+    expiring.put(key, "result")
+    time.sleep(0.02)
+    assert expiring.get(key) is None
+    assert expiring.stats['expired'] == 1
+    reopened.close()
+
+def test_single_flight():
+    print("\n=== Testing Single Flight ===")
+    import asyncio
+    import pandas as pd
+    calls = []
+
+    async def mock_model(style):
+        # 模拟一次耗时的大模型调用
+        calls.append(style)
+        await asyncio.sleep(0.05)
+        if style == "broken":
+            raise RuntimeError("model error")
+        return f"recommendation for {style}"
+
+    async def run():
+        cache = RecommendationCache()
+        wardrobe = pd.DataFrame({"title": ["白色T恤"], "type": ["上衣"]})
+
+        def request(style, temperature=20.0):
+            key = cache.make_key(wardrobe, style, temperature, "happy")
+            return cache.get_or_compute(key, lambda: mock_model(style))
+
+        # 20 个相同请求同时到达，只调用一次模型
+        results = await asyncio.gather(*(request("casual") for _ in range(20)))
+        assert results == ["recommendation for casual"] * 20
+        assert calls == ["casual"]
+        assert cache.flight.stats == {'calls': 1, 'coalesced': 19}
+
+        # 不同的请求互不等待；之后的相同请求直接命中缓存
+        results = await asyncio.gather(request("formal"), request("casual"), request("formal"))
+        assert results[1] == "recommendation for casual"
+        assert calls == ["casual", "formal"]
+
+        # 出错时所有等待者都收到异常，结果不写入缓存，之后可以重试
+        results = await asyncio.gather(*(request("broken") for _ in range(3)), return_exceptions=True)
+        assert all(isinstance(result, RuntimeError) for result in results)
+        assert calls.count("broken") == 1
+        await asyncio.gather(request("broken"), return_exceptions=True)
+        assert calls.count("broken") == 2
+
+        # 一个等待者被取消不影响其他等待者
+        first = asyncio.ensure_future(request("minimal"))
+        second = asyncio.ensure_future(request("minimal"))
+        await asyncio.sleep(0.01)
+        first.cancel()
+        assert await second == "recommendation for minimal"
+        assert calls.count("minimal") == 1
+
+    asyncio.run(run())
+
+def test_request_limiter():
+    print("\n=== Testing Request Limiter ===")
+    import asyncio
+    peak = []
+
+    async def run():
+        limiter = RequestLimiter(concurrency=2, queue_depth=3)
+
+        async def handle():
+            async with limiter.slot():
+                peak.append(limiter.running)
+                await asyncio.sleep(0.02)
+                return "ok"
+
+        # 2 个处理中，3 个排队，其余直接拒绝
+        results = await asyncio.gather(*(handle() for _ in range(8)), return_exceptions=True)
+        assert results.count("ok") == 5
+        assert sum(isinstance(result, QueueFullError) for result in results) == 3
+        assert max(peak) == 2
+        assert limiter.stats == {'accepted': 5, 'rejected': 3}
+        assert limiter.waiting == 0 and limiter.running == 0
+
+        # 处理完后名额释放
+        assert await handle() == "ok"
+
+    asyncio.run(run())
+
+def test_streaming_reply():
+    print("\n=== Testing Streaming Reply Parser ===")
+    reply = ('{"top": {"image_url": "https://img.alicdn.com/a.jpg", "title": "T恤"}, '
+             '"bottom": {"image_url": "https://img.alicdn.com/b.jpg"}, '
+             '"reason": "白色\\"百搭\\"，\\n适合\\u590f天"}')
+    # 逐个字符截断，任何位置都不会出错，已显示的理由只会变长
+    shown = ""
+    for end in range(len(reply) + 1):
+        reason = streamed_reason(reply[:end])
+        if reason != PENDING_REASON:
+            assert reason.startswith(shown)
+            shown = reason
+    assert shown == '白色"百搭"，\n适合夏天'
+
+    # 还没收到 reason 字段
+    assert streamed_reason('{"top": {"image_url": "https://img') == PENDING_REASON
+    # 只收到一半的转义序列时先不显示
+    assert streamed_reason('{"reason": "白色\\') == "白色"
+    assert streamed_reason('{"reason": "适合\\u59') == "适合"
+    # 完整的反斜杠转义保留
+    assert streamed_reason('{"reason": "a\\\\') == "a\\"
+    assert streamed_reason('{"reason": "a\\\\u59') == "a\\u59"
+
+    # 图片链接只在右引号到达后出现
+    assert streamed_images('{"top": {"image_url": "https://img.alicdn.com/a.jp') == []
+    assert streamed_images('{"top": {"image_url": "https://img.alicdn.com/a.jpg') == []
+    assert streamed_images(reply[:reply.index('b.jpg') + 6]) == [
+        "https://img.alicdn.com/a.jpg", "https://img.alicdn.com/b.jpg"
+    ]
+    # 模型仍在输出编号（如 "c3）时不当作图片
+    assert streamed_images('{"top": {"image_url": "c3') == []
+
+def test_user_sessions(tmp_path):
+    print("\n=== Testing User Sessions ===")
+    import time
+    import pandas as pd
+    closed = []
+
+    class FakeCrawler:
+        def __init__(self, name):
+            self.name = name
+
+        def close(self):
+            closed.append(self.name)
+
+    store = UserSessionStore(max_sessions=2, ttl=60)
+    alice = store.get("alice")
+    alice.mode = "physical"
+    alice.crawler = FakeCrawler("alice")
+    bob = store.get("bob")
+    # 每个会话的状态互不影响
+    assert bob.mode == "taobao" and bob.crawler is None
+    assert store.get("alice") is alice and alice.mode == "physical"
+
+    # 超过会话数时删除最久未用的会话，并关闭它的浏览器
+    store.get("carol")
+    assert "bob" not in store and "alice" in store
+    assert store.stats == {'created': 3, 'expired': 0, 'evicted': 1, 'swept': 0}
+
+    # 闲置超过 TTL 的会话被删除，浏览器在后台线程中关闭
+    alice.last_used = time.time() - 61
+    store.get("dave")
+    store.wait_closed()
+    assert "alice" not in store and closed == ["alice"]
+    assert store.stats['expired'] == 1
+
+    # 正在爬取的会话不会被淘汰，爬取结束后再淘汰
+    store = UserSessionStore(max_sessions=1, ttl=60)
+    erin = store.get("erin")
+    erin.crawler = FakeCrawler("erin")
+    with erin.busy():
+        erin.last_used = time.time() - 61
+        store.get("frank")
+        assert "erin" in store
+    store.get("frank")
+    store.wait_closed()
+    assert "erin" not in store and closed == ["alice", "erin"]
+
+    # 每个会话的浏览器数据、登录态和订单号索引在各自的目录，会话删除时一并删除
+    store = UserSessionStore(max_sessions=1, data_dir=str(tmp_path))
+    alice = store.get("alice/..")
+    paths = alice.crawler_paths()
+    assert os.path.dirname(paths['session_path']) == alice.data_dir
+    assert os.path.basename(alice.data_dir).startswith("alice___-")
+    os.makedirs(paths['user_data_dir'])
+    assert paths != store.get("bob").crawler_paths()
+    store.wait_closed()
+    assert not os.path.exists(alice.data_dir)
+    # 同一个会话 ID 重新创建时使用新目录，不会被旧会话的后台删除波及
+    assert store.get("alice/..").data_dir != alice.data_dir
+
+    # 页面刷新或重启后留下的无主目录超过 TTL 后被清理，仍在使用的会话目录保留
+    stale, fresh = tmp_path / "stale-1" / "chrome_profile", tmp_path / "fresh-1"
+    stale.mkdir(parents=True)
+    fresh.mkdir()
+    live = store.get("alice/..")
+    os.makedirs(live.data_dir)
+    old = time.time() - 3600
+    for path in (stale, stale.parent, live.data_dir):
+        os.utime(path, (old, old))
+    store.ttl = 60
+    assert store.sweep().result() == 1
+    assert not stale.parent.exists() and fresh.exists() and os.path.exists(live.data_dir)
+    assert store.stats['swept'] == 1
+
+    # 内存超过上限时删除其它会话，当前会话保留
+    wardrobe = pd.DataFrame({"title": ["纯棉短袖T恤女宽松夏季"] * 1000})
+    store = UserSessionStore(max_sessions=10, max_bytes=int(wardrobe.memory_usage(deep=True).sum() * 1.5))
+    store.get("alice").clothing_data = wardrobe
+    store.update("alice")
+    assert store.total_bytes == store.get("alice").size_bytes > 0
+    store.get("bob").clothing_data = wardrobe
+    store.update("bob")
+    assert "alice" not in store and "bob" in store
+    assert store.total_bytes == store.get("bob").size_bytes
+    assert isinstance(store.get("bob"), UserSession)
+
+def test_wardrobe_serializer():
+    print("\n=== Testing Wardrobe Serializer ===")
+    import pandas as pd
+    df = pd.DataFrame({
+        'title': ['夏季新款法式复古碎花连衣裙女小个子显瘦长裙', '纯棉短袖T恤女宽松夏季', '运动短裤女宽松夏季'],
+        'type': ['连衣裙/裤', '上衣', '下装'],
+        'color': ['白色', '黑|灰', None],
+        'size': ['M', 'L', 'S'],
+        'warmth': [1.5, 1.0, float('nan')],
+        'image_url': ['https://img/a.jpg', 'https://img/b.jpg', 'https://img/c.jpg'],
+    }, index=[7, 3, 5])
+
+    # 预算充足时保留全部字段，图片链接换成编号
+    text, ids = WardrobeSerializer(token_budget=10000).serialize(df)
+    lines = text.split("\n")
+    assert lines[0] == "id|type|title|color|warmth|size"
+    assert lines[2] == "c2|上衣|纯棉短袖T恤女宽松夏季|黑/灰|1|L"
+    assert lines[3].endswith("|||S")
+    assert ids == {'c1': 'https://img/a.jpg', 'c2': 'https://img/b.jpg', 'c3': 'https://img/c.jpg'}
+
+    # 超出预算时先按 PROMPT_DROP_ORDER 删列
+    serializer = WardrobeSerializer(token_budget=60)
+    text, ids = serializer.serialize(df)
+    assert text.split("\n")[0] == "id|type|title"
+    assert len(ids) == 3 and serializer.estimate_tokens(text) <= 60
+
+    # 再截短标题
+    text, ids = WardrobeSerializer(token_budget=50, short_title=6).serialize(df)
+    assert text.split("\n")[1] == "c1|连衣裙/裤|夏季新款法式"
+    assert len(ids) == 3
+
+    # 最后从件数最多的类型里删掉排在最后的
+    many = pd.concat([df.head(1)] * 4 + [df.iloc[1:]], ignore_index=True)
+    serializer = WardrobeSerializer(token_budget=60, short_title=6)
+    text, ids = serializer.serialize(many)
+    assert list(ids) == ['c1', 'c2', 'c5', 'c6']
+    assert serializer.estimate_tokens(text) <= 60
+
+    # 压缩前的基准：不生成 JSON 也能估出原始写法的 token 数
+    wardrobe = pd.DataFrame(sample_items(20))
+    full_json = json.dumps(wardrobe.to_dict('records'), ensure_ascii=False, indent=2, default=str)
+    baseline = WardrobeSerializer.estimate_json_tokens(wardrobe)
+    assert abs(baseline - WardrobeSerializer.estimate_tokens(full_json)) <= 0.1 * baseline
+    text, _ = WardrobeSerializer(token_budget=10000).serialize(wardrobe)
+    assert WardrobeSerializer.estimate_tokens(text) < baseline / 2
+
+    # 只替换 image_url 字段里的编号
+    reply = '{"top": {"image_url": "c2", "title": "c2 款"}, "bottom": {"image_url": "c9"}, "reason": "c2 百搭"}'
+    restored = WardrobeSerializer.restore_urls(reply, ids)
+    assert restored == ('{"top": {"image_url": "https://img/a.jpg", "title": "c2 款"}, '
+                        '"bottom": {"image_url": "c9"}, "reason": "c2 百搭"}')
+
+# fashion_agent 依赖的 autogen / azure 模块，未安装时用空壳代替，只为能导入 AgentPool
+AUTOGEN_MODULES = {
+    'autogen': [],
+    'autogen_agentchat': [],
+    'autogen_agentchat.agents': ['AssistantAgent'],
+    'autogen_agentchat.base': ['Response'],
+    'autogen_agentchat.messages': ['ModelClientStreamingChunkEvent', 'TextMessage'],
+    'autogen_core': ['CancellationToken'],
+    'autogen_ext': [],
+    'autogen_ext.models': [],
+    'autogen_ext.models.openai': ['AzureOpenAIChatCompletionClient', 'OpenAIChatCompletionClient'],
+    'azure': [],
+    'azure.identity': [],
+}
+
+class FakeModelClient:
+    """记录参数的模型客户端替身"""
+    def __init__(self, **kwargs):
+        self.kwargs = kwargs
+
+class FakeAssistantAgent:
+    """记录对话和重置次数的智能体替身"""
+    def __init__(self, name, model_client, system_message, model_client_stream=False):
+        self.model_client = model_client
+        self.stream = model_client_stream
+        self.messages = []
+        self.resets = 0
+
+    async def on_reset(self, cancellation_token):
+        self.messages.clear()
+        self.resets += 1
+
+@pytest.fixture
+def fashion_agent_module(monkeypatch):
+    """导入 fashion_agent，模型客户端和智能体换成替身，不需要安装 autogen 也不会访问网络"""
+    for name, attrs in AUTOGEN_MODULES.items():
+        try:
+            importlib.import_module(name)
+        except ImportError:
+            module = types.ModuleType(name)
+            for attr in attrs:
+                setattr(module, attr, type(attr, (), {}))
+            monkeypatch.setitem(sys.modules, name, module)
+    monkeypatch.delitem(sys.modules, "src.agents.fashion_agent", raising=False)
+    module = importlib.import_module("src.agents.fashion_agent")
+    monkeypatch.setattr(module, "OpenAIChatCompletionClient", FakeModelClient)
+    monkeypatch.setattr(module, "AssistantAgent", FakeAssistantAgent)
+    monkeypatch.setenv("GITHUB_TOKEN", "test-token")
+    yield module
+    sys.modules.pop("src.agents.fashion_agent", None)
+
+def test_agent_pool(fashion_agent_module):
+    print("\n=== Testing Agent Pool ===")
+    pool = fashion_agent_module.AgentPool()
+
+    # 客户端按 (API_HOST, 模型) 复用
+    client = pool.client("github", "gpt-4o")
+    assert pool.client("github", "gpt-4o") is client
+    assert client.kwargs['model'] == "gpt-4o" and client.kwargs['api_key'] == "test-token"
+    assert pool.client("github", "gpt-4o-mini") is not client
+    assert pool.stats['clients_created'] == 2
+    with pytest.raises(ValueError):
+        pool.client("unknown", "gpt-4o")
+
+    # FashionAgent 从池中取客户端，不会每次新建
+    agent = fashion_agent_module.FashionAgent(api_host="github", model="gpt-4o", pool=pool)
+    assert agent.client is client and pool.stats['clients_created'] == 2
+
+    async def run():
+        # 用完后清空对话记录放回池中，下一个请求复用同一个智能体
+        async with pool.agent("github", "gpt-4o") as first:
+            first.messages.append("上一个请求")
+            # 同时进行的请求各用一个智能体，共用同一个客户端
+            async with pool.agent("github", "gpt-4o") as second:
+                assert second is not first and second.model_client is first.model_client is client
+        assert first.resets == 1 and first.messages == []
+        async with pool.agent("github", "gpt-4o") as again:
+            assert again in (first, second)
+
+        # 流式和非流式的智能体分开缓存
+        async with pool.agent("github", "gpt-4o", stream=True) as streaming:
+            assert streaming.stream and streaming not in (first, second)
+
+        # 请求出错时智能体同样被重置并放回
+        with pytest.raises(RuntimeError):
+            async with pool.agent("github", "gpt-4o") as failed:
+                failed.messages.append("出错的请求")
+                raise RuntimeError("模型调用失败")
+        assert failed.messages == []
+        async with pool.agent("github", "gpt-4o") as reused:
+            assert reused in (first, second)
+
+    asyncio.run(run())
+    assert pool.stats == {'clients_created': 2, 'agents_created': 3, 'agents_reused': 3}
+
+def test_fashion_agent_loads_processed_wardrobe(tmp_path, fashion_agent_module):
+    print("\n=== Testing Fashion Agent Wardrobe Input ===")
+    import pandas as pd
+    input_path = tmp_path / "taobao_purchases.csv"
+    pd.DataFrame(sample_items(5)).to_csv(input_path, index=False, encoding='utf-8-sig')
+    # data_processor 命令行的输出（分块写入的多个分片）可以直接作为 FashionAgent 的默认输入
+    output_path = tmp_path / os.path.basename(fashion_agent_module.DEFAULT_WARDROBE_PATH)
+    rows = DataProcessor(str(tmp_path)).process_csv(str(input_path), str(output_path), chunksize=3)
+    agent = fashion_agent_module.FashionAgent(str(output_path), api_host="github", model="gpt-4o",
+                                              pool=fashion_agent_module.AgentPool())
+    assert agent.input_type == "parquet_path"
+    expected = WardrobeStore(str(output_path)).load()
+    assert len(agent.clothing_data) == rows == 10
+    assert agent.clothing_data['title'].tolist() == expected['title'].tolist()
+
 # def test_data_processor():
 #     print("\n=== Testing Data Processor ===")
 #     processor = DataProcessor("data")
@@ -153,6 +1122,7 @@ def main():
     
     # 运行测试
     test_taobao_crawler()  # 先测试爬虫
+    test_parse_orders_html()
     # test_data_processor()
     # test_clothing_analyzer()
     # test_fashion_rules()